@@ -1,70 +1,21 @@
+# Until the doors are locked only what is needed to lock them is imported, the rest is
+# imported where it is used. See --startup-profile.
+from dumb_waiter.startup import StartupTimer
+STARTUP = StartupTimer()
+
 import asyncio
 import logging
 import argparse
+import os
 import sys
-from typing import Callable
-from signal import pause
-
-from gpiozero import DigitalInputDevice, OutputDevice, Button
-
-from dumb_waiter.logic import LiftLogicMachine, LiftLogicModel
-from dumb_waiter.io import Input,Output
-from dumb_waiter.util import ainput
-
-
-class OutPin(Output):
-    def __init__(self, pin, initial_value=False, active_high=True):
-        self.dev = OutputDevice(pin=pin, initial_value=initial_value, active_high=active_high)
-
-    @property
-    def value(self):
-        return self.dev.value
-
-    def on(self):
-        self.dev.on()
-
-    def off(self):
-        self.dev.off()
-
-class InPin(Input):
-    def __init__(self, pin, pull_up = False):
-        self.dev = Button(pin=pin, bounce_time=0.01, pull_up=pull_up)
-        self.main_loop = asyncio.get_running_loop()
-
-    def __call__(self):
-        return self.dev.value
-
-    @property
-    def falling_edge_callback(self):
-        return self.dev.when_deactivated
-
-    @falling_edge_callback.setter
-    def falling_edge_callback(self, value: Callable):
-        
-        # If the callback is set, we need to store it somewhere, and then setup the gpio device
-        # to fire a callback when the event occurs. But gpio creates a new thread which executes 
-        # the callback. I want the callback to occur in the main thread.
-        self.callable_to_fire_on_falling_edge = value
-        self.dev.when_deactivated = self._falling_call_soon_wrapper
 
-    def _falling_call_soon_wrapper(self):
-        self.main_loop.call_soon_threadsafe(self.callable_to_fire_on_falling_edge)
+from dumb_waiter.input_state import cache_inputs
+from dumb_waiter.logic import LiftLogicMachine
+from dumb_waiter.logs import start_logging
+from dumb_waiter.notify import sd_notify
+from dumb_waiter.pins import LiftPins
+STARTUP.mark('imports')
 
-    @property
-    def rising_edge_callback(self):
-        return self.dev.when_activated
-
-    @rising_edge_callback.setter
-    def rising_edge_callback(self, value: Callable):
-        
-        # If the callback is set, we need to store it somewhere, and then setup the gpio device
-        # to fire a callback when the event occurs. But gpio creates a new thread which executes 
-        # the callback. I want the callback to occur in the main thread.
-        self.callable_to_fire_on_rising_edge = value
-        self.dev.when_activated = self._rising_call_soon_wrapper
-
-    def _rising_call_soon_wrapper(self):
-        self.main_loop.call_soon_threadsafe(self.callable_to_fire_on_rising_edge)
 
 async def main(argv):
 
@@ -73,73 +24,237 @@ async def main(argv):
     parser.add_argument('--safety-timer', action='store_true', default=23)
     parser.add_argument('--check-io', action='store_true', default=False,
         help="""Before starting the logic to drive the lift prompt the user and check each input""")
+    parser.add_argument('--latency-stats', type=float, default=None, metavar='SECONDS',
+        help="""Time each input edge from the gpio thread to the relays, and log the latencies every SECONDS""")
+    parser.add_argument('--compiled', action='store_true', default=False,
+        help="""Drive the lift with the table driven CompiledLiftLogic rather than LiftLogicMachine""")
+    parser.add_argument('--reconcile-inputs', type=float, default=1.0, metavar='SECONDS',
+        help="""How often to check the cached input levels against the pins, in case an edge was missed""")
+    parser.add_argument('--io-backend', choices=('gpiozero', 'lgpio-group'), default='gpiozero',
+        help="""How to talk to the pins. lgpio-group reads all the inputs in one go, and switches the relays a
+        transition changes together""")
+    parser.add_argument('--poll-interval', type=float, default=0.001, metavar='SECONDS',
+        help="""How often the lgpio-group backend reads the inputs. Each read costs CPU whether anything changed
+        or not, so a longer interval is cheaper, and slower to notice an edge""")
+    parser.add_argument('--debounce', action='store_true', default=False,
+        help="""Debounce the inputs on the event loop, with a window for each input, rather than in gpiozero's
+        threads, and treat call presses less than a second apart as one""")
+    parser.add_argument('--mqtt-broker', default=None,
+        help="""Host name of the MQTT broker to publish to""")
+    parser.add_argument('--spool-dir', default=None,
+        help="""Keep messages that can't be published, because the broker is down, in this directory until
+        it is back""")
+    parser.add_argument('--remote-commands', action='store_true', default=False,
+        help="""Take call and stop commands from the MQTT broker""")
+    parser.add_argument('--command-max-age', type=float, default=500, metavar='MS',
+        help="""Ignore remote commands sent more than this many milliseconds ago""")
+    parser.add_argument('--telemetry-rate', type=float, default=20.0, metavar='MESSAGES',
+        help="""Publish no more than this many telemetry messages a second, keeping only the latest value of
+        each when the broker can't keep up""")
+    parser.add_argument('--registered-calls', type=float, default=None, metavar='SECONDS',
+        help="""Rather than stopping the car, remember a call made while it is moving and send it back once it
+        has arrived and been held SECONDS for loading""")
+    parser.add_argument('--learn-trip-times', default=None, metavar='DIRECTORY',
+        help="""Time each trip, and once enough have been timed use a shorter safety timer for each direction,
+        based on how long trips take. What has been learnt is kept in DIRECTORY, in a file for each lift""")
+    parser.add_argument('--idle-parking', type=float, default=None, metavar='SECONDS',
+        help="""Once the car has been idle for SECONDS with the doors closed, send it to the floor that is most
+        likely to call next, going by the calls made at this time of day""")
+    parser.add_argument('--call-history', default=None, metavar='DIRECTORY',
+        help="""Keep the calls learnt for --idle-parking in DIRECTORY, in a file for each lift, so they
+        survive a restart""")
+    parser.add_argument('--flight-recorder', default=None, metavar='DIRECTORY',
+        help="""Keep the last few thousand input edges, transitions and relay changes of each lift in memory,
+        and write them to DIRECTORY on a safety timeout, an estop, or a SIGUSR1. Read them with decode_flight.py""")
+    parser.add_argument('--journald', action='store_true', default=False,
+        help="""Log to journald, with the lift, state and event as fields of their own, rather than to stderr.
+        Needs python-systemd""")
+    parser.add_argument('--startup-profile', action='store_true', default=False,
+        help="""Log how long each phase of starting up took, from the process starting""")
+    parser.add_argument('--lag-threshold', type=float, default=1.0, metavar='SECONDS',
+        help="""Only pet the watchdogs while the event loop runs things less than SECONDS late""")
+    parser.add_argument('--heartbeat-pin', default=None, metavar='PIN',
+        help="""Toggle PIN (e.g. BOARD36) every half second while the event loop is keeping up, for an external
+        watchdog relay that drops the motor power when it stops""")
+    parser.add_argument('--realtime', action='store_true', default=False,
+        help="""Pin the lift to one CPU, run it SCHED_FIFO and lock it in memory, as far as we are allowed to,
+        so a busy pi delays it less""")
+    parser.add_argument('--realtime-cpu', type=int, default=None, metavar='CPU',
+        help="""The CPU for --realtime, by default the highest numbered one""")
+    parser.add_argument('--realtime-priority', type=int, default=50, metavar='PRIORITY',
+        help="""The SCHED_FIFO priority for --realtime, 1 to 99""")
+    parser.add_argument('--realtime-test', type=float, default=None, metavar='SECONDS',
+        help="""Don't run the lift, measure how late sleeps wake up for SECONDS, then again for SECONDS with
+        --realtime, and print both""")
+    parser.add_argument('--config', default=None,
+        help="""Run every lift in this TOML file (see dumb_waiter.site.load_config), rather than the one lift
+        wired to the pins in pins.py""")
     args = parser.parse_args(argv[1:])
+    if args.config is not None and (args.check_io or args.debounce or args.io_backend != 'gpiozero'):
+        parser.error('--check-io, --debounce and --io-backend only work with a single lift, not --config')
+
+    # Records are written from a thread, so the lift logic never waits for the disk or journald.
+    start_logging(logging.DEBUG if args.debug else logging.INFO, journald=args.journald)
+    STARTUP.mark('arguments and logging')
+
+    if args.realtime_test is not None:
+        from dumb_waiter.realtime import self_test
+        result = self_test(args.realtime_test, cpu=args.realtime_cpu, priority=args.realtime_priority)
+        steps = ', '.join(f"{step} {'ok' if ok else 'failed'}" for step, ok in result['steps'].items())
+        print(f"Real time steps: {steps}")
+        for name in ('before', 'after'):
+            s = result[name]
+            print(f"{name:>6}: p50 {s['p50_us']:.0f}us p99 {s['p99_us']:.0f}us max {s['max_us']:.0f}us late")
+        return
+    if args.realtime:
+        # Here so the gpio threads are real time too, but not the logging thread.
+        from dumb_waiter.realtime import enter_realtime
+        enter_realtime(cpu=args.realtime_cpu, priority=args.realtime_priority)
+        STARTUP.mark('realtime')
+
+    monitor = None
+    if args.latency_stats:
+        from dumb_waiter.latency import LatencyMonitor
+        monitor = LatencyMonitor()
+    if args.config is not None:
+        from dumb_waiter.site import Site, load_config
+        site = Site(load_config(args.config), compiled=args.compiled, monitor=monitor,
+            hold_time=args.registered_calls)
+        site.start()
+        asyncio.create_task(site.reconcile_forever(args.reconcile_inputs))
+        lifts = [(lift.machine, lift.pins) for lift in site.lifts.values()]
+    else:
+        lifts = [await start_lift(args, monitor)]
+    machines = [llm for llm, _ in lifts]
+    STARTUP.mark('lift logic initialised')
+    sd_notify('READY=1', 'STATUS=Doors locked')
+
+    # Pets systemd's watchdog, if the service has one, while the loop keeps up.
+    from dumb_waiter.watchdog import LoopLagMonitor
+    heartbeat = None
+    if args.heartbeat_pin is not None:
+        from dumb_waiter.pins import OutPin
+        heartbeat = OutPin(args.heartbeat_pin)
+    lag_monitor = LoopLagMonitor(threshold=args.lag_threshold, heartbeat=heartbeat)
+    asyncio.create_task(lag_monitor.run())
+    logging.info("Ready %.0f ms after starting", STARTUP.since_start('lift logic initialised') * 1000)
+
+    if args.flight_recorder is not None:
+        import signal
+        from dumb_waiter.pins import INPUT_PINS
+        from dumb_waiter.recorder import FlightRecorder
+        os.makedirs(args.flight_recorder, exist_ok=True)
+        recorders = []
+        for llm, pins in lifts:
+            recorder = FlightRecorder(llm.model.name, directory=args.flight_recorder)
+            recorder.attach(llm, {name: getattr(pins, name) for name in INPUT_PINS if hasattr(pins, name)})
+            recorders.append(recorder)
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1,
+            lambda: [recorder.dump_soon('signal') for recorder in recorders])
+
+    if args.learn_trip_times is not None:
+        from dumb_waiter.trip_times import TripTimes
+        os.makedirs(args.learn_trip_times, exist_ok=True)
+        for llm in machines:
+            path = os.path.join(args.learn_trip_times, f'{llm.model.name}.json')
+            llm.add_listener(TripTimes(llm.model, path))
+
+    if args.idle_parking is not None:
+        from dumb_waiter.parking import CallHistory, IdleParking
+        if args.call_history is not None:
+            os.makedirs(args.call_history, exist_ok=True)
+        for llm, pins in lifts:
+            path = None
+            if args.call_history is not None:
+                path = os.path.join(args.call_history, f'{llm.model.name}.json')
+            parking = IdleParking(llm, CallHistory(path), idle_time=args.idle_parking)
+            # With --debounce the call buttons are already debounced, but the lift logic also
+            # takes presses within CALL_HOLDOFF of each other as one call, so the history does too.
+            call_holdoff = 0
+            if args.debounce:
+                from dumb_waiter.debounce import CALL_HOLDOFF
+                call_holdoff = CALL_HOLDOFF
+            asyncio.create_task(parking.watch_calls(pins.call_pb_top, pins.call_pb_bottom, call_holdoff))
+
+    # Only once the doors are locked do we worry about talking to the outside world.
+    comms = None
+    if args.mqtt_broker is not None:
+        from dumb_waiter.comms import Comms
+        from dumb_waiter.telemetry import start_site_telemetry
+        spool = None
+        if args.spool_dir is not None:
+            from dumb_waiter.spool import Spool
+            spool = Spool(args.spool_dir)
+        comms = Comms(args.mqtt_broker, spool=spool)
+        asyncio.create_task(comms.connect())
+        start_site_telemetry(machines, comms, rate=args.telemetry_rate)
+        if args.remote_commands:
+            from dumb_waiter.commands import CommandChannel
+            for llm in machines:
+                CommandChannel(llm, max_age=args.command_max_age / 1000).subscribe(comms)
+
+    if monitor is not None:
+        asyncio.create_task(monitor.report_forever(args.latency_stats, comms=comms))
+        asyncio.create_task(lag_monitor.report_forever(args.latency_stats))
+
+    STARTUP.mark('everything else')
+    if args.startup_profile:
+        STARTUP.log()
+
+    while True:
+        await asyncio.sleep(10)
 
-    if args.debug:
-        logging.basicConfig(level=logging.DEBUG)
+
+async def start_lift(args, monitor):
+    '''Set up the one lift wired to the pins in pins.py, returning its lift logic and pins
+    once the doors are locked'''
+    if args.io_backend == 'lgpio-group':
+        from dumb_waiter.lgpio_group import GroupLiftPins
+        pins = GroupLiftPins(poll_interval=args.poll_interval)
     else:
-        logging.basicConfig(level=logging.INFO)
-
-    
-    # Output pins
-    pinO_drive_lift_up = OutPin("BOARD7", active_high=False)
-    pinO_drive_lift_down = OutPin("BOARD11", active_high=False)
-    pinO_lock_door_top = OutPin("BOARD31", active_high=False)
-    pinO_lock_door_bottom = OutPin("BOARD33", active_high=False)
-
-
-    # Input pins
-    pinI_call_pb_top = InPin("BOARD13", pull_up=True)
-    pinI_call_pb_bottom = InPin("BOARD38", pull_up=True)
-    pinI_lower_limit = InPin("BOARD15", pull_up=True)
-    pinI_upper_limit = InPin("BOARD16", pull_up=True)
-    pinI_door_closed_level1 = InPin("BOARD18", pull_up=True)
-    pinI_door_closed_ground = InPin("BOARD22", pull_up=True)
-    pinI_estop_top = InPin("BOARD29", pull_up=True)
-    pinI_estop_bottom = InPin("BOARD40", pull_up=True)
+        pins = LiftPins(monitor=monitor, bounce_time=None if args.debounce else 0.01)
+    STARTUP.mark('pins')
+    if args.debounce:
+        from dumb_waiter.debounce import debounce_inputs
+        debounce_inputs(pins)
 
     if args.check_io:
+        from dumb_waiter.util import ainput
 
         print("For this test both doors will be unlocked")
-        pinO_lock_door_top.off()
-        pinO_lock_door_bottom.off()
+        pins.lock_door_top.off()
+        pins.lock_door_bottom.off()
         answer = await ainput('Please confirm both doors are unlocked: (Enter "y" or "n"):')
         if answer.lower() not in ('y', 'yes'):
             raise SystemExit('Abandoning --check-io run')
 
-        input_was_activated = False
-        def input_fired():
-            nonlocal input_was_activated
-            input_was_activated = True
         print("Let's check all the inputs")
 
         inputs = [
-            (pinI_estop_top, "EStop top"),
-            (pinI_call_pb_top, "Call button top"),
-            (pinI_upper_limit, "Upper Limit"),
-            (pinI_door_closed_level1, "Door Closed Level 1"),
-            (pinI_estop_bottom, "EStop bottom"),
-            (pinI_call_pb_bottom, "Call button bottom"),
-            (pinI_lower_limit, "Lower Limit"),
-            (pinI_door_closed_ground, "Door Closed Ground"),
+            (pins.estop_top, "EStop top"),
+            (pins.call_pb_top, "Call button top"),
+            (pins.upper_limit, "Upper Limit"),
+            (pins.door_closed_level1, "Door Closed Level 1"),
+            (pins.estop_bottom, "EStop bottom"),
+            (pins.call_pb_bottom, "Call button bottom"),
+            (pins.lower_limit, "Lower Limit"),
+            (pins.door_closed_ground, "Door Closed Ground"),
         ]
 
         for (pin, message) in inputs:
-            pin.falling_edge_callback = input_fired
             print(f'Please activate and then deactivate {message}')
-            while not input_was_activated:
-                # TODO: It would be nice if the input_fired() interrupted this sleep. Then I 
-                # could make the sleep longer, and each time through the loop post a new message so
-                # the operator knows the script is still running.
-                await asyncio.sleep(0.5)
-            pin.falling_edge_callback = None
-            input_was_activated = False
+            while True:
+                try:
+                    await asyncio.wait_for(pin.wait_for_edge(rising=False), timeout=10)
+                    break
+                except asyncio.TimeoutError:
+                    print(f'Still waiting for {message} to be activated and deactivated')
 
         print("We will soon check the motor.")
-        while pinI_door_closed_ground() == False:
+        while pins.door_closed_ground() == False:
             print("Please shut the ground door")
             await asyncio.sleep(3.5)
-        while pinI_door_closed_level1() == False:
+        while pins.door_closed_level1() == False:
             print("Please shut the level 1 door")
             await asyncio.sleep(3.5)
 
@@ -154,61 +269,61 @@ async def main(argv):
         print(f"About to move lift {direction}")
         await asyncio.sleep(motor_check_duration)
         if direction == 'up':
-            pinO_drive_lift_up.on()
+            pins.drive_lift_up.on()
             await asyncio.sleep(motor_check_duration)
-            pinO_drive_lift_up.off()
+            pins.drive_lift_up.off()
         else:
-            pinO_drive_lift_down.on()
+            pins.drive_lift_down.on()
             await asyncio.sleep(motor_check_duration)
-            pinO_drive_lift_down.off()
+            pins.drive_lift_down.off()
 
         print("Now we will move the lift in the other direction for a short time")
         direction = 'up' if direction == 'down' else 'down'
         print(f"Move lift {direction}")
         await asyncio.sleep(motor_check_duration)
         if direction == 'up':
-            pinO_drive_lift_up.on()
+            pins.drive_lift_up.on()
             await asyncio.sleep(motor_check_duration)
-            pinO_drive_lift_up.off()
+            pins.drive_lift_up.off()
         else:
-            pinO_drive_lift_down.on()
+            pins.drive_lift_down.on()
             await asyncio.sleep(motor_check_duration)
-            pinO_drive_lift_down.off()
+            pins.drive_lift_down.off()
 
         print("Testing finished, exiting")
         raise SystemExit()
 
-    model = LiftLogicModel(
-        estop1=pinI_estop_top,
-        estop2=pinI_estop_bottom,
-        lower_limit=pinI_lower_limit,
-        upper_limit=pinI_upper_limit,
-        upper_door_closed=pinI_door_closed_level1,
-        lower_door_closed=pinI_door_closed_ground,
-        raise_lift=pinO_drive_lift_up,
-        lower_lift=pinO_drive_lift_down,
-        lock_door_top=pinO_lock_door_top,
-        lock_door_bottom=pinO_lock_door_bottom,
-        #TODO: use argparser paramter
-        safety_time=args.safety_timer,
-    )
-    llm = LiftLogicMachine(model)
-    
-    # Wire up the triggers to the lift logic
-    pinI_call_pb_top.falling_edge_callback = lambda: llm.call()
-    pinI_call_pb_bottom.falling_edge_callback = lambda: llm.call()
-    pinI_lower_limit.rising_edge_callback = lambda: llm.stop_lowering()
-    pinI_upper_limit.rising_edge_callback = lambda: llm.stop_rising()
-    pinI_door_closed_level1.falling_edge_callback = lambda: llm.door_opens()
-    pinI_door_closed_ground.falling_edge_callback = lambda: llm.door_opens()
-    pinI_estop_top.rising_edge_callback = lambda: llm.estop_pressed()
-    pinI_estop_bottom.rising_edge_callback = lambda: llm.estop_pressed()
+    model = pins.model(safety_time=args.safety_timer)
+    # The lift logic reads the inputs from here, rather than going to the pins every time.
+    input_state = cache_inputs(model)
+    if args.compiled:
+        # Compiling the table takes a while, on a pi most of a second, so the doors are
+        # locked first rather than waiting for the compiled logic to lock them.
+        model.lock_door_top.on()
+        model.lock_door_bottom.on()
+        STARTUP.mark('doors locked')
+        from dumb_waiter.compiled import CompiledLiftLogic
+        llm = CompiledLiftLogic(model)
+    else:
+        # Entering its first state locks the doors.
+        llm = LiftLogicMachine(model)
+        STARTUP.mark('doors locked')
+
+    calls = None
+    if args.registered_calls is not None:
+        from dumb_waiter.calls import RegisteredCalls
+        calls = RegisteredCalls(llm, hold_time=args.registered_calls)
+
+    if args.debounce:
+        from dumb_waiter.debounce import CALL_HOLDOFF
+        pins.wire_up(llm, call_holdoff=CALL_HOLDOFF, calls=calls)
+    else:
+        pins.wire_up(llm, calls=calls)
 
     llm.initialise()
-    
+    asyncio.create_task(input_state.reconcile_forever(args.reconcile_inputs))
 
-    while True:
-        await asyncio.sleep(10)
+    return llm, pins
 
 
 if __name__ == '__main__':
@@ -1,6 +1,9 @@
 # Vendored the async_paho_mqtt_client.py from https://github.com/mortbauer/async-paho-mqtt-client
+# Changed so connecting never blocks the event loop, and reconnects back off exponentially.
 
 import json
+import random
+import threading
 import time
 from time import strftime, localtime
 import asyncio
@@ -19,6 +22,8 @@ class AsyncClient:
         username=None,
         password: str = None,
         reconnect_interval=5,
+        max_reconnect_interval=300,
+        connect_timeout=10,
         keepalive=60,
         tls=False,
         tls_insecure=False,
@@ -39,6 +44,11 @@ class AsyncClient:
         self._stop = False
         self.loop = loop or asyncio.get_event_loop()
         self.reconnect_interval = reconnect_interval
+        self.max_reconnect_interval = max_reconnect_interval
+        self.connect_timeout = connect_timeout
+        self._reconnect_attempts = 0
+        self._connect_attempt = None
+        self._loop_thread = None
         self._reconnector_loop = None
         self.client_id = client_id or None
         self.client = client or paho.Client(self.client_id)
@@ -64,13 +74,34 @@ class AsyncClient:
             json.dumps({"connected": False}),
             retain=True,
         )
-        self.client.on_socket_open = self._on_socket_open
-        self.client.on_socket_close = self._on_socket_close
-        self.client.on_socket_register_write = self._on_socket_register_write
-        self.client.on_socket_unregister_write = self._on_socket_unregister_write
+        # paho calls these from whichever thread is calling into it, which while connecting is
+        # not the event loop's.
+        self.client.on_socket_open = self._in_loop(self._on_socket_open)
+        self.client.on_socket_close = self._in_loop(self._on_socket_close)
+        self.client.on_socket_register_write = self._in_loop(self._on_socket_register_write)
+        self.client.on_socket_unregister_write = self._in_loop(self._on_socket_unregister_write)
+        if hasattr(self.client, "connect_timeout"):
+            self.client.connect_timeout = connect_timeout
         self.client.on_connect = self._handle_on_connect
         self.client.on_disconnect = self._handle_on_disconnect
 
+    def _in_loop(self, callback):
+        """wrap callback so it always runs in the event loop's thread"""
+        def wrapper(*args):
+            if self._loop_thread in (None, threading.get_ident()):
+                callback(*args)
+            else:
+                self.loop.call_soon_threadsafe(callback, *args)
+        return wrapper
+
+    def reconnect_delay(self):
+        """exponential backoff, with jitter so many clients don't all retry together"""
+        delay = min(
+            self.max_reconnect_interval,
+            self.reconnect_interval * 2 ** self._reconnect_attempts,
+        )
+        return delay / 2 + random.uniform(0, delay / 2)
+
     def _handle_on_connect(self, *args, **kwargs):
         for on_connect_handler in self.on_connect:
             try:
@@ -107,6 +138,7 @@ class AsyncClient:
         self.loop.add_reader(sock, cb)
         self._misc_loop = self.loop.create_task(self._create_misc_loop())
         self.connected = True
+        self._reconnect_attempts = 0
 
     def _on_socket_close(self, client, userdata, sock):
         self.logger.debug("MQTT socket closed")
@@ -115,12 +147,9 @@ class AsyncClient:
         if self._misc_loop is not None and not self._misc_loop.done():
             self._misc_loop.cancel()
         if not self._stop:
-            self.loop.create_task(
-                self.start_reconnect_delayed(delay=self.reconnect_interval)
-            )
-            self.logger.info(
-                "Scheduled reconnect in %s seconds", self.reconnect_interval
-            )
+            delay = self.reconnect_delay()
+            self.loop.create_task(self.start_reconnect_delayed(delay=delay))
+            self.logger.info("Scheduled reconnect in %.1f seconds", delay)
 
     async def start_reconnect_delayed(self, delay=10):
         await asyncio.sleep(delay)
@@ -155,22 +184,44 @@ class AsyncClient:
         self.logger.debug("MQTT starting reconnect loop to %s:%s", self.host, self.port)
         while not self._stop:
             try:
-                self.logger.warning(
-                    "MQTT connecting if no broker listens this will block for about a minute"
-                )
-                self.client.connect(self.host, port=self.port, keepalive=self.keepalive)
+                self.logger.info("MQTT connecting to %s:%s", self.host, self.port)
+                await self._connect()
                 break
             except asyncio.CancelledError:
                 break
             except Exception as error:
+                delay = self.reconnect_delay()
+                self._reconnect_attempts += 1
                 self.logger.warning(
-                    "MQTT connect failed, sleeping %s", self.reconnect_interval
+                    "MQTT connect failed (%r), retrying in %.1f seconds", error, delay
                 )
-                await asyncio.sleep(self.reconnect_interval)
+                await asyncio.sleep(delay)
         self.logger.info("MQTT finished reconnect loop")
 
+    async def _connect(self):
+        """paho's connect() blocks until the broker answers or the OS gives up, so it is run
+        in a thread. If it takes longer than connect_timeout we stop waiting, but the attempt
+        can't be stopped, so the next try waits on the same attempt rather than starting another."""
+        if self._connect_attempt is None or self._connect_attempt.done():
+            self._connect_attempt = asyncio.ensure_future(
+                asyncio.to_thread(
+                    self.client.connect, self.host, port=self.port, keepalive=self.keepalive
+                )
+            )
+            # An attempt can fail after we stopped waiting for it, which is fine.
+            self._connect_attempt.add_done_callback(
+                lambda attempt: attempt.cancelled() or attempt.exception()
+            )
+        try:
+            await asyncio.wait_for(
+                asyncio.shield(self._connect_attempt), self.connect_timeout
+            )
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"no answer from {self.host}:{self.port} in {self.connect_timeout}s")
+
     async def start(self):
         self.loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
         if self._reconnector_loop is None or self._reconnector_loop.done():
             self._reconnector_loop = self.loop.create_task(self.reconnect_loop())
 
@@ -0,0 +1,65 @@
+'''Compare the time LiftLogicMachine and CompiledLiftLogic take to handle an event.'''
+import argparse
+import asyncio
+import logging
+import sys
+import time
+
+from dumb_waiter.compiled import CompiledLiftLogic
+from dumb_waiter.fake import FakeLift
+from dumb_waiter.logic import LiftLogicMachine
+from dumb_waiter.virtual_time import VirtualTimeLoop
+
+
+def trip(lift):
+    '''Down to the bottom, and back up to the top. The inputs are set without firing their
+    edges, so only the events we send here are counted.'''
+    llm = lift.machine
+    inputs = lift.inputs
+    llm.call()
+    inputs['lower_limit'].var = True
+    llm.stop_lowering()
+    llm.call()
+    inputs['lower_limit'].var = False
+    inputs['upper_limit'].var = True
+    llm.stop_rising()
+    llm.estop_pressed()
+    llm.door_opens()
+    llm.call()
+    inputs['upper_limit'].var = False
+    llm.safety_timeout()
+
+EVENTS_PER_TRIP = 8
+
+
+async def measure(compiled: bool, trips: int) -> float:
+    lift = FakeLift(compiled=compiled)
+    lift.close_doors()
+    lift.machine.initialise()
+    trip(lift)
+
+    started = time.perf_counter()
+    for _ in range(trips):
+        trip(lift)
+    elapsed = time.perf_counter() - started
+    lift.model.scheduler.cancel_all()
+    return elapsed / (trips * EVENTS_PER_TRIP)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='bench_dispatch', description=__doc__)
+    parser.add_argument('--trips', type=int, default=5000)
+    args = parser.parse_args(argv[1:])
+
+    logging.basicConfig(level=logging.WARNING)
+    with asyncio.Runner(loop_factory=VirtualTimeLoop) as runner:
+        statemachine = runner.run(measure(False, args.trips))
+        compiled = runner.run(measure(True, args.trips))
+
+    print(f"{'LiftLogicMachine':<20} {statemachine * 1e6:8.2f} us per event")
+    print(f"{'CompiledLiftLogic':<20} {compiled * 1e6:8.2f} us per event")
+    print(f"Speedup: {statemachine / compiled:.1f}x")
+
+
+if __name__ == '__main__':
+    main(sys.argv)
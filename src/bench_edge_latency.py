@@ -0,0 +1,218 @@
+'''Measure the time from an input edge to the relay changing, through the real InPin/OutPin
+classes and LiftLogicMachine, using gpiozero's mock pins.
+
+The mock pins run edge callbacks in whichever thread drives them, so the edges are driven
+from a separate thread, the same way gpiozero's own threads deliver them on the pi.'''
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import sys
+import time
+
+from gpiozero import Device
+from gpiozero.pins.mock import MockFactory
+
+from dumb_waiter.input_state import cache_inputs
+from dumb_waiter.io import Output
+from dumb_waiter.logic import LiftLogicMachine
+from dumb_waiter.pins import LiftPins
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_edge_latency_baseline.json')
+
+
+class _TimedRelay(Output):
+    '''An OutPin that remembers when (on the monotonic clock) it last changed'''
+
+    def __init__(self, pin):
+        self.pin = pin
+        self.changed = 0.0
+
+    @property
+    def value(self):
+        return self.pin.value
+
+    def on(self):
+        if not self.pin.value:
+            self.pin.on()
+            self.changed = time.monotonic()
+
+    def off(self):
+        if self.pin.value:
+            self.pin.off()
+            self.changed = time.monotonic()
+
+
+def _mock(pin):
+    return pin.dev.pin
+
+def _activate(pin):
+    # All the inputs are pulled up, so active is low.
+    _mock(pin).drive_low()
+
+def _deactivate(pin):
+    _mock(pin).drive_high()
+
+def _press(pin):
+    _activate(pin)
+    _deactivate(pin)
+
+def _wait_for(relay, value, since, timeout=2.0):
+    '''Wait for the relay to change to value, returning when (on the monotonic clock) it did.'''
+    give_up = time.monotonic() + timeout
+    while relay.value != value or relay.changed < since:
+        if time.monotonic() > give_up:
+            raise TimeoutError(f'{relay.pin.dev.pin} did not change to {value}')
+        time.sleep(0.00005)
+    return relay.changed
+
+
+def drive(pins: LiftPins, samples: int) -> dict[str, list[float]]:
+    '''Run the lift up and down with the limit switches, and stop it with the estop. Runs in
+    its own thread.'''
+    results = {'lower_limit_stop': [], 'upper_limit_stop': [], 'estop': []}
+
+    def measure(name, pin, relay):
+        t0 = time.monotonic()
+        _activate(pin)
+        t1 = _wait_for(relay, False, t0)
+        results[name].append(t1 - t0)
+
+    for _ in range(samples):
+        t = time.monotonic()
+        _press(pins.call_pb_top)
+        _wait_for(pins.drive_lift_down, True, t)
+        measure('lower_limit_stop', pins.lower_limit, pins.drive_lift_down)
+
+        t = time.monotonic()
+        _press(pins.call_pb_bottom)
+        _wait_for(pins.drive_lift_up, True, t)
+        _deactivate(pins.lower_limit)
+        measure('upper_limit_stop', pins.upper_limit, pins.drive_lift_up)
+
+        t = time.monotonic()
+        _press(pins.call_pb_top)
+        _wait_for(pins.drive_lift_down, True, t)
+        _deactivate(pins.upper_limit)
+        measure('estop', pins.estop_top, pins.drive_lift_down)
+        _deactivate(pins.estop_top)
+    return results
+
+
+async def background_load(period=0.001, payload_size=200):
+    '''Stand in for MQTT traffic and logging: every period publish a message over a socket
+    and write a log line.'''
+    logger = logging.getLogger('bench.load')
+    loop = asyncio.get_running_loop()
+    tx, rx = socket.socketpair()
+    tx.setblocking(False)
+    rx.setblocking(False)
+    payload = b'x' * payload_size
+
+    async def consume():
+        while True:
+            await loop.sock_recv(rx, 65536)
+
+    consumer = asyncio.create_task(consume())
+    count = 0
+    try:
+        while True:
+            message = json.dumps({'count': count, 'payload': payload.decode()}).encode()
+            await loop.sock_sendall(tx, message)
+            logger.info("Published message %s", count)
+            count += 1
+            await asyncio.sleep(period)
+    finally:
+        consumer.cancel()
+        tx.close()
+        rx.close()
+
+
+async def run(samples: int, load: bool) -> dict[str, list[float]]:
+    Device.pin_factory = MockFactory()
+    try:
+        pins = LiftPins()
+        _activate(pins.door_closed_level1)
+        _activate(pins.door_closed_ground)
+        pins.drive_lift_up = _TimedRelay(pins.drive_lift_up)
+        pins.drive_lift_down = _TimedRelay(pins.drive_lift_down)
+
+        model = pins.model(safety_time=60)
+        cache_inputs(model)
+        llm = LiftLogicMachine(model)
+        pins.wire_up(llm)
+        llm.initialise()
+
+        load_task = asyncio.create_task(background_load()) if load else None
+        try:
+            return await asyncio.to_thread(drive, pins, samples)
+        finally:
+            if load_task is not None:
+                load_task.cancel()
+    finally:
+        Device.pin_factory.close()
+        Device.pin_factory = None
+
+
+def summarise(latencies: list[float]) -> dict[str, float]:
+    ordered = sorted(latencies)
+    def percentile(p):
+        return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+    return {
+        'p50': percentile(0.50),
+        'p99': percentile(0.99),
+        'max': ordered[-1],
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='bench_edge_latency', description=__doc__)
+    parser.add_argument('--samples', type=int, default=200, help='Trips to measure for each scenario')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--update-baseline', action='store_true',
+        help='Save these results as the new baseline rather than comparing against it')
+    parser.add_argument('--tolerance', type=float, default=2.0,
+        help='Fail if a p99 is more than this many times the baseline p99')
+    args = parser.parse_args(argv[1:])
+
+    # Logging to a file, so the load is real I/O, but doesn't drown the results.
+    logging.basicConfig(level=logging.INFO, filename=os.devnull)
+
+    summary = {}
+    for load in (False, True):
+        results = asyncio.run(run(args.samples, load))
+        for name, latencies in results.items():
+            summary[f"{name}{'_under_load' if load else ''}"] = summarise(latencies)
+
+    print(f"{'scenario':<30} {'p50 us':>10} {'p99 us':>10} {'max us':>10}")
+    for name, stats in summary.items():
+        print(f"{name:<30} {stats['p50'] * 1e6:>10.0f} {stats['p99'] * 1e6:>10.0f} {stats['max'] * 1e6:>10.0f}")
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(summary, f, indent=1)
+            f.write('\n')
+        print(f"Saved baseline to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --update-baseline to make one")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = [
+        f"{name}: p99 {summary[name]['p99'] * 1e6:.0f} us, baseline {stats['p99'] * 1e6:.0f} us"
+        for name, stats in baseline.items()
+        if name in summary and summary[name]['p99'] > stats['p99'] * args.tolerance
+    ]
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
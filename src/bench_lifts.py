@@ -0,0 +1,93 @@
+'''Measure how event throughput and latency hold up as more lifts share one process, one
+event loop, one EdgeDispatcher and one LiftScheduler, using fake I/O.
+
+A driver thread stands in for gpiozero's threads: it posts the edges of a trip for every
+lift to the dispatcher, then waits for the loop to have handled them all before the next step.
+Latency is from posting an edge to the lift logic having finished with it.'''
+import argparse
+import asyncio
+import logging
+import sys
+import threading
+import time
+
+from dumb_waiter.dispatcher import EdgeDispatcher
+from dumb_waiter.fake import FakeLift
+from dumb_waiter.scheduler import LiftScheduler
+
+# Each step is the edges to post to every lift, and the state every lift should then be in.
+# A trip starts and finishes with the lift lowering from the top.
+START = ((('call_top', True), ('call_top', False)), 'lowering')
+TRIP = (
+    ((('lower_limit', True),), 'stopped_at_bottom'),
+    ((('call_bottom', True), ('call_bottom', False)), 'rising'),
+    ((('lower_limit', False), ('upper_limit', True)), 'stopped_at_top'),
+    ((('call_top', True), ('call_top', False)), 'lowering'),
+    ((('upper_limit', False),), 'lowering'),
+)
+
+
+def drive(dispatcher: EdgeDispatcher, lifts: list[FakeLift], trips: int) -> tuple[list[float], int]:
+    latencies = []
+
+    def edge(posted, fake_input, value):
+        if value:
+            fake_input.on()
+        else:
+            fake_input.off()
+        latencies.append(time.perf_counter() - posted)
+
+    events = 0
+    for edges, state in (START, *TRIP * trips):
+        for lift in lifts:
+            for name, value in edges:
+                dispatcher.post(edge, time.perf_counter(), lift.inputs[name], value)
+                events += 1
+        done = threading.Event()
+        dispatcher.post(done.set)
+        done.wait()
+        wrong = [lift.model.name for lift in lifts if lift.state != state]
+        if wrong:
+            raise RuntimeError(f'{wrong} not {state}')
+    return latencies, events
+
+
+async def run(count: int, trips: int) -> dict:
+    loop = asyncio.get_running_loop()
+    dispatcher = EdgeDispatcher(loop)
+    scheduler = LiftScheduler()
+    lifts = [FakeLift(name=f'lift{n}', scheduler=scheduler, safety_time=3600) for n in range(count)]
+    for lift in lifts:
+        lift.close_doors()
+        lift.machine.initialise()
+
+    started = time.perf_counter()
+    latencies, events = await asyncio.to_thread(drive, dispatcher, lifts, trips)
+    elapsed = time.perf_counter() - started
+    scheduler.cancel_all()
+
+    latencies.sort()
+    return {
+        'events_per_second': events / elapsed,
+        'p50': latencies[len(latencies) // 2],
+        'p99': latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)],
+        'edges_per_wakeup': dispatcher.dispatched / dispatcher.wakeups,
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='bench_lifts', description=__doc__)
+    parser.add_argument('--lifts', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--trips', type=int, default=20)
+    args = parser.parse_args(argv[1:])
+
+    logging.basicConfig(level=logging.WARNING)
+    print(f"{'lifts':>6} {'events/s':>10} {'p50 us':>8} {'p99 us':>8} {'edges/wakeup':>13}")
+    for count in args.lifts:
+        result = asyncio.run(run(count, args.trips))
+        print(f"{count:>6} {result['events_per_second']:>10.0f} {result['p50'] * 1e6:>8.0f} "
+              f"{result['p99'] * 1e6:>8.0f} {result['edges_per_wakeup']:>13.1f}")
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,89 @@
+'''Measure how long the lift logic's log calls hold up the event loop, with the records
+written straight to a slow log (like journald on a busy SD card) and through start_logging()'s
+queue. Each cycle calls the car and stops it by opening a door, two transitions, each logged
+at INFO.'''
+import argparse
+import asyncio
+import atexit
+import logging
+import sys
+import time
+
+from dumb_waiter.fake import FakeLift
+from dumb_waiter.logs import start_logging
+
+
+class SlowStream:
+    '''A stream that takes delay seconds for each write'''
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.writes = 0
+
+    def write(self, text):
+        time.sleep(self.delay)
+        self.writes += 1
+
+    def flush(self):
+        pass
+
+
+async def _cycles(count, compiled) -> list[float]:
+    lift = FakeLift(compiled=compiled)
+    lift.close_doors()
+    lift.machine.initialise()
+    door = lift.inputs['upper_door_closed']
+    times = []
+    for _ in range(count):
+        started = time.perf_counter()
+        lift.press('call_top')
+        door.off()
+        door.on()
+        times.append(time.perf_counter() - started)
+    lift.model.scheduler.cancel_all()
+    return sorted(times)
+
+
+def cycles(count, compiled) -> list[float]:
+    # The lift logic needs a running loop for its safety timer.
+    return asyncio.run(_cycles(count, compiled))
+
+
+def report(name, times):
+    mean = sum(times) / len(times)
+    print(f"{name:>24}: mean {mean * 1e6:8.1f} us, p99 {times[int(len(times) * 0.99)] * 1e6:8.1f} us, "
+          f"max {times[-1] * 1e6:8.1f} us")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='bench_logging', description=__doc__)
+    parser.add_argument('--cycles', type=int, default=2000)
+    parser.add_argument('--write-time', type=float, default=0.5, metavar='MS',
+        help='How long the slow log takes for each record')
+    parser.add_argument('--compiled', action='store_true', help='Use CompiledLiftLogic')
+    args = parser.parse_args(argv[1:])
+    root = logging.getLogger()
+
+    root.setLevel(logging.WARNING)
+    report('INFO not logged', cycles(args.cycles, args.compiled))
+
+    stream = SlowStream(args.write_time / 1000)
+    handler = logging.StreamHandler(stream)
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
+    report('written on the loop', cycles(args.cycles, args.compiled))
+    root.removeHandler(handler)
+
+    stream = SlowStream(args.write_time / 1000)
+    listener = start_logging(logging.INFO, stream=stream)
+    times = cycles(args.cycles, args.compiled)
+    report('through the queue', times)
+    started = time.perf_counter()
+    atexit.unregister(listener.stop)
+    listener.stop()
+    print(f"The queue's thread had {time.perf_counter() - started:.2f}s of writing left at the end, "
+          f"{stream.writes} records in all")
+
+
+if __name__ == '__main__':
+    main(sys.argv)
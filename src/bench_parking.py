@@ -0,0 +1,149 @@
+'''Measure how much idle parking cuts how long people wait for the car.
+
+Orders come in at random through the day, most of them at the bottom (the kitchen). For each
+one, whoever has the order calls the car if it isn't already at their floor, loads it, and
+sends it to the other floor, where it is unloaded and left. The wait is from the order
+coming in to the car being at the caller's floor, including waiting behind earlier orders.
+
+The car is a LiftSimulator's on a VirtualTimeLoop, so days go by in seconds.'''
+import argparse
+import asyncio
+import logging
+import random
+import sys
+import time
+
+from dumb_waiter.fake import FakeLift
+from dumb_waiter.parking import CallHistory, IdleParking
+from dumb_waiter.simulator import LiftPhysics, LiftSimulator
+from dumb_waiter.virtual_time import VirtualTimeLoop
+
+# Midnight, local time, for the clock the call history sees
+MIDNIGHT = time.mktime((2024, 1, 1, 0, 0, 0, 0, 1, -1))
+DAY = 24 * 3600
+HEADING = {'rising': 'top', 'lowering': 'bottom'}
+
+
+def make_orders(rng: random.Random, days: int, per_hour: float, bottom_share: float,
+                open_hours=(7, 22)) -> list[tuple[float, str]]:
+    orders = []
+    for day in range(days):
+        t = day * DAY + open_hours[0] * 3600
+        while True:
+            t += rng.expovariate(per_hour / 3600)
+            if t >= day * DAY + open_hours[1] * 3600:
+                break
+            orders.append((t, 'bottom' if rng.random() < bottom_share else 'top'))
+    return orders
+
+
+class _Changes:
+    def __init__(self):
+        self.event = asyncio.Event()
+
+    def after_transition(self):
+        self.event.set()
+
+    async def wait(self):
+        self.event.clear()
+        await self.event.wait()
+
+
+class Kitchen:
+    def __init__(self, lift: FakeLift, physics: LiftPhysics):
+        self.lift = lift
+        self.physics = physics
+        self.changes = _Changes()
+        lift.machine.add_listener(self.changes)
+        self.waits: list[tuple[float, float]] = []
+
+    async def fetch(self, floor: str):
+        '''Call the car to floor, and wait for it to get there'''
+        while self.lift.state != f'stopped_at_{floor}':
+            heading = HEADING.get(self.lift.state)
+            if heading is None:
+                self.lift.press(f'call_{floor}')
+            elif heading != floor:
+                # Going the wrong way, stop it and call it again.
+                self.lift.press(f'call_{floor}')
+                continue
+            await self.changes.wait()
+
+    async def use_door(self, floor: str):
+        door = 'upper_door_closed' if floor == 'top' else 'lower_door_closed'
+        await asyncio.sleep(self.physics.door_open_delay)
+        self.lift.inputs[door].off()
+        await asyncio.sleep(self.physics.load_time)
+        self.lift.inputs[door].on()
+        await asyncio.sleep(self.physics.call_delay)
+
+    async def serve(self, orders: list[tuple[float, str]]):
+        loop = asyncio.get_running_loop()
+        for when, floor in orders:
+            if loop.time() < when:
+                await asyncio.sleep(when - loop.time())
+            await self.fetch(floor)
+            self.waits.append((when, loop.time() - when))
+            await self.use_door(floor)
+            # Send it to the other floor, with the button where the car is.
+            other = 'bottom' if floor == 'top' else 'top'
+            self.lift.press(f'call_{floor}')
+            await self.fetch(other)
+            await self.use_door(other)
+
+
+async def simulate(orders, idle_time, warmup_days) -> dict:
+    loop = asyncio.get_running_loop()
+    physics = LiftPhysics()
+    lift = FakeLift(safety_time=23)
+    lift.close_doors()
+    lift.machine.initialise()
+    sim = LiftSimulator(lift, physics)
+    sim.start()
+    kitchen = Kitchen(lift, physics)
+    await kitchen.fetch('bottom')
+
+    parking = None
+    if idle_time is not None:
+        parking = IdleParking(lift.machine, CallHistory(), idle_time, clock=lambda: MIDNIGHT + loop.time())
+        watching = asyncio.create_task(parking.watch_calls(lift.inputs['call_top'], lift.inputs['call_bottom']))
+    await kitchen.serve(orders)
+    if parking is not None:
+        watching.cancel()
+    lift.model.scheduler.cancel_all()
+
+    waits = sorted(wait for when, wait in kitchen.waits if when >= warmup_days * DAY)
+    return {
+        'orders': len(waits),
+        'mean': sum(waits) / len(waits),
+        'p95': waits[int(len(waits) * 0.95)],
+        'waited': sum(1 for wait in waits if wait > 0.5) / len(waits),
+        'parked': parking.parked if parking is not None else 0,
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='bench_parking', description=__doc__)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--warmup-days', type=int, default=1,
+        help='Days to learn the calls in before measuring')
+    parser.add_argument('--orders-per-hour', type=float, default=6)
+    parser.add_argument('--bottom-share', type=float, default=0.9,
+        help='Share of orders loaded at the bottom')
+    parser.add_argument('--idle-time', type=float, nargs='+', default=[30, 60, 300])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv[1:])
+
+    logging.basicConfig(level=logging.WARNING)
+    orders = make_orders(random.Random(args.seed), args.days, args.orders_per_hour, args.bottom_share)
+    print(f"{'parking':>12} {'orders':>7} {'mean wait':>10} {'p95':>6} {'waited':>7} {'parked':>7}")
+    for idle_time in (None, *args.idle_time):
+        with asyncio.Runner(loop_factory=VirtualTimeLoop) as runner:
+            result = runner.run(simulate(orders, idle_time, args.warmup_days))
+        name = 'off' if idle_time is None else f'after {idle_time:g}s'
+        print(f"{name:>12} {result['orders']:>7} {result['mean']:>9.1f}s {result['p95']:>5.1f}s "
+              f"{result['waited']:>6.0%} {result['parked']:>7}")
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,55 @@
+'''Measure what the flight recorder costs for each thing it records, on its own and as a share
+of a transition of the lift logic.'''
+import argparse
+import sys
+import time
+
+from dumb_waiter.fake import FakeLift
+from dumb_waiter.recorder import EDGE, FlightRecorder
+
+
+def per_call(function, count) -> float:
+    '''Nanoseconds per call of function'''
+    started = time.perf_counter_ns()
+    for _ in range(count):
+        function()
+    return (time.perf_counter_ns() - started) / count
+
+
+def door_cycles(lift: FakeLift, count):
+    door = lift.inputs['upper_door_closed']
+    def cycle():
+        door.off()
+        door.on()
+    return per_call(cycle, count)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='bench_recorder', description=__doc__)
+    parser.add_argument('--count', type=int, default=200_000)
+    parser.add_argument('--compiled', action='store_true', help='Use CompiledLiftLogic')
+    args = parser.parse_args(argv[1:])
+
+    record = FlightRecorder().record
+    code = EDGE << 24
+    print(f"record(): {per_call(lambda: record(code), args.count):.0f} ns")
+
+    # With python-statemachine most of the difference is it calling one more listener.
+    plain = FakeLift(compiled=args.compiled)
+    plain.close_doors()
+    plain.machine.initialise()
+    recorded = FakeLift(compiled=args.compiled)
+    recorded.close_doors()
+    recorded.machine.initialise()
+    recorder = FlightRecorder()
+    recorder.attach(recorded.machine, recorded.inputs)
+    before = recorder.count
+    without = door_cycles(plain, args.count // 10)
+    with_recorder = door_cycles(recorded, args.count // 10)
+    records = (recorder.count - before) / (args.count // 10)
+    print(f"door open and close: {without / 1000:.1f} us, {with_recorder / 1000:.1f} us recorded "
+          f"({records:.0f} records)")
+
+
+if __name__ == '__main__':
+    main(sys.argv)
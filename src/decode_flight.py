@@ -0,0 +1,29 @@
+'''Print what a flight recorder file (see dumb_waiter.recorder) saw, oldest first.'''
+import argparse
+import sys
+import time
+
+from dumb_waiter.recorder import decode
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='decode_flight', description=__doc__)
+    parser.add_argument('files', nargs='+', metavar='FILE')
+    parser.add_argument('--last', type=int, default=None, metavar='N',
+        help='Only print the last N records of each file')
+    args = parser.parse_args(argv[1:])
+
+    for path in args.files:
+        with open(path, 'rb') as f:
+            header, records = decode(f.read())
+        written = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(header['time']))
+        print(f"{path}: {header['name']}, written for {header['reason']} at {written}, "
+              f"{len(records)} of {header['recorded']} records")
+        if args.last is not None:
+            records = records[-args.last:]
+        for record in records:
+            print(f"{record.time:12.6f} {record.kind:<10} {record.description}")
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,87 @@
+import logging
+from typing import Optional
+
+from statemachine.exceptions import TransitionNotAllowed
+
+logger = logging.getLogger(__name__)
+
+FLOORS = ('top', 'bottom')
+
+# Where the car is headed in each moving state, and which floor each stopped state is at
+_HEADING = {'rising': 'top', 'lowering': 'bottom'}
+_AT = {'stopped_at_top': 'top', 'stopped_at_bottom': 'bottom'}
+
+
+class _Listener:
+    # Kept apart from RegisteredCalls so python-statemachine, which looks up callbacks on
+    # listeners by name, can't hook any of its methods by accident.
+    def __init__(self, calls: 'RegisteredCalls'):
+        self.calls = calls
+
+    def after_transition(self, event, source, target):
+        if source.id != target.id:
+            self.calls._moved(event, target.id)
+
+
+class RegisteredCalls:
+    '''Remembers a call made from the other floor while the car is moving, rather than
+    stopping the car between floors, and sends the car back once it has arrived and
+    hold_time seconds have gone by for loading.
+
+    With the car stopped a call goes straight to the lift logic, as it always has. If the
+    car can't move when the hold time is up, because a door is open, the call is tried
+    again every retry seconds. A car that stops between floors, for an estop, a door being
+    opened or the safety timeout, forgets the calls it had, so it never moves off on its own
+    after being stopped.
+
+    Wire the call buttons to press() (see LiftPins.wire_up()).'''
+
+    def __init__(self, machine, hold_time: float = 5.0, retry: float = 1.0):
+        self.machine = machine
+        self.model = machine.model
+        self.hold_time = hold_time
+        self.retry = retry
+        self.registered: set[str] = set()
+        self._key = (self.model.name, 'registered_call')
+        machine.add_listener(_Listener(self))
+
+    def press(self, floor: str):
+        '''The call button at floor was pressed'''
+        state = self.machine.current_state.id
+        heading = _HEADING.get(state)
+        if heading is None:
+            self.machine.call()
+        elif floor == heading:
+            logger.debug("Call from the %s while %s is already on its way there", floor, self.model.name)
+        elif floor not in self.registered:
+            logger.info("Registered a call from the %s for %s, once it gets to the %s", floor, self.model.name, heading)
+            self.registered.add(floor)
+
+    def _moved(self, event, state: str):
+        if state in _HEADING:
+            # Whoever called from where it's going will be served by this trip.
+            self.registered.discard(_HEADING[state])
+            self.model.scheduler.cancel(self._key)
+        elif state in _AT:
+            self.registered.discard(_AT[state])
+            if self.registered:
+                self.model.scheduler.schedule(self._key, self.hold_time, self._serve)
+        elif state == 'stopped' and self.registered:
+            logger.info("Forgetting the calls from the %s for %s, it was stopped by %s",
+                ', '.join(sorted(self.registered)), self.model.name, event)
+            self.registered.clear()
+            self.model.scheduler.cancel(self._key)
+
+    def _serve(self):
+        if not self.registered or self.machine.current_state.id not in _AT:
+            return
+        try:
+            self.machine.call()
+        except TransitionNotAllowed:
+            logger.debug("Can't serve the registered call for %s yet, trying again in %ss", self.model.name, self.retry)
+            self.model.scheduler.schedule(self._key, self.retry, self._serve)
+
+    @property
+    def pending(self) -> Optional[float]:
+        '''Seconds until the car goes back for a registered call, if it is waiting to'''
+        return self.model.scheduler.pending().get(self._key)
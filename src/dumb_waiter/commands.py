@@ -0,0 +1,114 @@
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from statemachine.exceptions import TransitionNotAllowed
+
+from .latency import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+# What each command does to the lift logic. A remote stop is handled just like an estop.
+COMMANDS = {
+    'call': 'call',
+    'stop': 'estop_pressed',
+}
+# Commands that can only make the lift safer, so are never refused: a late or repeated stop
+# still stops the car, and stopping it twice does no harm.
+ALWAYS = ('stop',)
+
+
+class CommandChannel:
+    '''Lets the lift be driven over MQTT, by publishing to <prefix>/<lift name>/command/<command>
+    a JSON payload like {"id": "abc123", "sent_at": 1700000000.123}, where sent_at is the
+    sender's unix time in seconds.
+
+    Commands are refused if they are older than max_age seconds (so ones queued up while we
+    were disconnected don't move the car when we reconnect), if they were sent more than
+    tolerance seconds in the future (so a skewed clock, or a made up sent_at, can't get round
+    max_age), or if a command with the same id has been seen already. This relies on the
+    sender's clock being within tolerance of ours. None of that applies to stop, which is
+    always dispatched, even if its payload can't be read.
+
+    The broker's messages are read on the event loop, so commands are handled there as they
+    arrive. How long that takes, and how old the commands are, is kept in histograms.'''
+
+    def __init__(self, machine, prefix: str = 'dumbwaiter', max_age: float = 0.5,
+                 tolerance: float = 0.1, remember: int = 1024, clock: Callable[[], float] = time.time):
+        self.machine = machine
+        self.topic = f'{prefix}/{machine.model.name}/command'
+        self.max_age = max_age
+        self.tolerance = tolerance
+        self.remember = remember
+        self.clock = clock
+        self._seen: OrderedDict[str, None] = OrderedDict()
+        self.dispatch = LatencyHistogram()
+        self.age = LatencyHistogram()
+        self.results: dict[str, int] = {}
+
+    def subscribe(self, comms):
+        comms.subscribe(f'{self.topic}/+', self.on_message)
+
+    def on_message(self, client, userdata, message):
+        '''paho's message callback'''
+        self.handle(message.topic, message.payload)
+
+    def handle(self, topic: str, payload: bytes) -> str:
+        '''Handle one command, returning what became of it'''
+        started = time.monotonic_ns()
+        result = self._handle(topic, payload)
+        self.dispatch.record(time.monotonic_ns() - started)
+        self.results[result] = self.results.get(result, 0) + 1
+        return result
+
+    def _handle(self, topic: str, payload: bytes) -> str:
+        command = topic.rpartition('/')[2]
+        if topic.rpartition('/')[0] != self.topic or command not in COMMANDS:
+            logger.warning("Ignoring unknown command topic %s", topic)
+            return 'unknown'
+        try:
+            message = json.loads(payload)
+            command_id = str(message['id'])
+            sent_at = float(message['sent_at'])
+        except (ValueError, KeyError, TypeError) as error:
+            if command in ALWAYS:
+                logger.warning("Remote %s command with bad payload %r: %r", command, payload, error)
+                return self._dispatch(command, None)
+            logger.warning("Ignoring %s command with bad payload %r: %r", command, payload, error)
+            return 'invalid'
+
+        age = self.clock() - sent_at
+        self.age.record(max(0, int(age * 1e9)))
+        if command in ALWAYS:
+            return self._dispatch(command, command_id)
+        if age > self.max_age:
+            logger.warning("Ignoring %s command %s, it is %.0fms old", command, command_id, age * 1000)
+            return 'stale'
+        if age < -self.tolerance:
+            logger.warning("Ignoring %s command %s, it was sent %.0fms in the future", command, command_id, -age * 1000)
+            return 'future'
+        if command_id in self._seen:
+            logger.info("Ignoring repeated %s command %s", command, command_id)
+            return 'duplicate'
+        self._seen[command_id] = None
+        if len(self._seen) > self.remember:
+            self._seen.popitem(last=False)
+        return self._dispatch(command, command_id)
+
+    def _dispatch(self, command: str, command_id: Optional[str]) -> str:
+        logger.info("Remote %s command %s", command, command_id)
+        try:
+            getattr(self.machine, COMMANDS[command])()
+        except TransitionNotAllowed as error:
+            logger.info("Remote %s command %s not allowed: %s", command, command_id, error)
+            return 'not_allowed'
+        return 'dispatched'
+
+    def summary(self) -> dict:
+        return {
+            'dispatch': self.dispatch.summary(),
+            'age': self.age.summary(),
+            'results': dict(self.results),
+        }
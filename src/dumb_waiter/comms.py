@@ -1,14 +1,31 @@
 import asyncio
+import logging
+from typing import Optional
+
 import paho.mqtt.client as paho
 from async_paho_mqtt_client import AsyncClient as amqtt
 
+from .spool import Spool
+
+logger = logging.getLogger(__name__)
+
 
 class CommsError(Exception):
     pass
 
 class Comms:
-    def __init__(self, connection_str: str):
+    '''Talks to the MQTT broker. With a Spool, messages sent while the broker isn't connected
+    (or while earlier ones are still waiting in the spool) go to the spool instead of being
+    dropped, and the spool is drained each time the connection comes back. A drain that fails
+    while still connected is tried again, backing off from drain_retry to max_drain_retry
+    seconds, as until the spool is empty everything sent is spooled behind it.'''
+
+    def __init__(self, connection_str: str, spool: Optional[Spool] = None, drain_retry: float = 1.0,
+                 max_drain_retry: float = 60.0):
         self.MQTTS_BROKER = connection_str
+        self.spool = spool
+        self.drain_retry = drain_retry
+        self.max_drain_retry = max_drain_retry
         # For some reason, that I don't understand, when I don't pass a client
         # into amqtt, the paho.Client() __init__ method has a callback_api_version parameter
         # that is None. That causes an exception to be thrown.
@@ -27,6 +44,8 @@ class Comms:
             #notify_birth=self.notify_birth,
         )
         self.client = client
+        if spool is not None:
+            client.on_connect.append(self.drain_spool)
 
     @property
     def connected(self):
@@ -37,7 +56,16 @@ class Comms:
         await self.client.wait_started()
 
 
+    @property
+    def accepting(self):
+        '''Whether a message sent now will get to the broker, sooner or later'''
+        return self.connected or self.spool is not None
+
     async def send(self, topic: str, payload):
+        if self.spool is not None and (not self.connected or len(self.spool)):
+            # Behind whatever is already waiting, so they are published in order.
+            self.spool.append(topic, payload)
+            return
         if not self.connected:
             return
 
@@ -45,5 +73,38 @@ class Comms:
         
         pass
 
+    def subscribe(self, topic: str, callback):
+        '''Call callback(client, userdata, message) with every message on topic. The
+        subscription is made again every time we connect.'''
+        self.client.message_callback_add(topic, callback)
+        self.client.on_connect.append(lambda *args: self.client.subscribe(topic, qos=1))
+        if self.connected:
+            self.client.client.subscribe(topic, qos=1)
+
+    async def drain_spool(self, *args):
+        delay = self.drain_retry
+        while True:
+            try:
+                sent = await self.spool.drain(self._publish_spooled)
+            except Exception as error:
+                if not self.connected:
+                    # The next connect drains it again.
+                    logger.info("Stopped draining the spool, the broker went away: %r", error)
+                    return
+                logger.warning("Draining the spool failed, trying again in %.0fs: %r", delay, error)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_drain_retry)
+                continue
+            if sent:
+                logger.info("Published %d messages from the spool", sent)
+            return
+
+    async def _publish_spooled(self, topic: str, payload):
+        if not self.connected:
+            raise CommsError('Disconnected while draining the spool')
+        await self.client.publish(topic, payload)
+
     def stop(self):
-        self.client.stop()
\ No newline at end of file
+        self.client.stop()
+        if self.spool is not None:
+            self.spool.close()
\ No newline at end of file
@@ -0,0 +1,279 @@
+import inspect
+from collections import deque
+from typing import Callable, Optional
+
+from statemachine.exceptions import TransitionNotAllowed
+
+from .input_state import CachedInput
+from .io import Input
+from .logic import LiftLogicMachine, LiftLogicModel, MODEL_INPUTS
+
+# The model inputs the guards look at, in bit order for the input bitmask.
+INPUTS = MODEL_INPUTS
+STATES = tuple(state.id for state in LiftLogicMachine.states)
+EVENTS = tuple(event.id for event in LiftLogicMachine.events)
+
+_MASKS = 1 << len(INPUTS)
+# The bits of the inputs log_unsafe_to_move() reports
+_SAFETY_BITS = tuple(1 << INPUTS.index(name) for name in ('estop1', 'estop2', 'lower_door_closed', 'upper_door_closed'))
+
+
+class _Probe(LiftLogicMachine):
+    '''A LiftLogicMachine that writes down which actions it would run, instead of running them.'''
+
+    def __init__(self, model, start_value=None):
+        self.actions = []
+        super().__init__(model, start_value=start_value)
+
+    def _record(self, name, *args):
+        self.actions.append((name, self.current_state.id, args))
+
+    def on_enter_state(self, event, state):
+        self._record('on_enter_state')
+
+    def lock_door(self):
+        self._record('lock_door')
+
+    def unlock_door(self):
+        self._record('unlock_door')
+
+    def start_rising(self):
+        self._record('start_rising')
+
+    def start_lowering(self):
+        self._record('start_lowering')
+
+    def stop(self):
+        self._record('stop')
+
+    def log_unsafe_to_move(self):
+        self._record('log_unsafe_to_move')
+
+
+class _ProbeInput(Input):
+    '''An input the probe's guards read, set by _set_inputs(). It never has edges.'''
+
+    def __init__(self):
+        self.var = False
+
+    def __call__(self):
+        return self.var
+
+
+def _probe_model():
+    inputs = {name: _ProbeInput() for name in INPUTS}
+    return LiftLogicModel(raise_lift=None, lower_lift=None, lock_door_top=None, lock_door_bottom=None, **inputs)
+
+def _set_inputs(model, mask):
+    for bit, name in enumerate(INPUTS):
+        getattr(model, name).var = bool(mask & (1 << bit))
+
+
+def _action(name) -> Callable:
+    # Every action is called as action(machine, event, state), so dispatch doesn't have to
+    # care which is which.
+    if name == 'on_enter_state':
+        return lambda machine, event, state: machine.on_enter_state(event, state)
+    method = getattr(LiftLogicMachine, name)
+    return lambda machine, event, state: method(machine)
+
+
+def _split(actions, source, target):
+    '''Split the recorded actions into those run before the state changed, and after'''
+    before, after = [], []
+    for name, state, _ in actions:
+        if source != target and state == target or after:
+            after.append(_action(name))
+        elif source == target and name == 'on_enter_state':
+            after.append(_action(name))
+        else:
+            before.append(_action(name))
+    return tuple(before), tuple(after)
+
+
+def compile_table():
+    '''Run every event, from every state, with every combination of inputs through
+    LiftLogicMachine, and write down where it went and what it did.
+
+    Returns the table, a flat list indexed by ((state * len(EVENTS) + event) << len(INPUTS)) | mask
+    holding (target, actions before the state changes, actions after) or None if the event
+    isn't allowed. Also returns, for each (state, event), whether the result depends on the inputs
+    at all.'''
+    # CompiledLiftLogic's event methods are numbered in this order.
+    if EVENTS != ('initialise', 'call', 'stop_rising', 'stop_lowering', 'door_opens', 'estop_pressed', 'safety_timeout'):
+        raise RuntimeError(f'LiftLogicMachine events have changed to {EVENTS}, CompiledLiftLogic needs updating')
+    table = [None] * (len(STATES) * len(EVENTS) * _MASKS)
+    needs_inputs = [False] * (len(STATES) * len(EVENTS))
+    # Making a state machine is slow, so one probe is moved to each state in turn.
+    model = _probe_model()
+    probe = _Probe(model)
+    for s, state in enumerate(STATES):
+        for e, event in enumerate(EVENTS):
+            key = s * len(EVENTS) + e
+            results = []
+            for mask in range(_MASKS):
+                _set_inputs(model, mask)
+                probe.current_state = LiftLogicMachine.states_map[state]
+                probe.actions = []
+                try:
+                    getattr(probe, event)()
+                except TransitionNotAllowed:
+                    results.append(None)
+                    continue
+                target = probe.current_state.id
+                results.append((STATES.index(target), probe.actions))
+            needs_inputs[key] = any(r != results[0] for r in results)
+            for mask, result in enumerate(results):
+                if result is not None:
+                    target, actions = result
+                    result = (target, *_split(actions, state, STATES[target]))
+                table[(key << len(INPUTS)) | mask] = result
+    return table, needs_inputs
+
+
+def _initial_actions():
+    '''What the machine does when it starts in each state'''
+    actions = []
+    for state in STATES:
+        probe = _Probe(_probe_model(), start_value=state)
+        actions.append(tuple(_action(name) for name, _, _ in probe.actions))
+    return actions
+
+
+_compiled = None
+
+def _get_compiled():
+    global _compiled
+    if _compiled is None:
+        _compiled = (*compile_table(), _initial_actions())
+    return _compiled
+
+
+class CompiledLiftLogic:
+    '''A drop in replacement for LiftLogicMachine that doesn't go through python-statemachine
+    for each event. The transitions and guards of LiftLogicMachine are compiled, the first
+    time one of these is made, into a table of what to do for each state, event and
+    combination of inputs. Each event is then one lookup in that table.
+
+    The actions themselves (locking the doors, driving the motor, ...) are LiftLogicMachine's.'''
+
+    lock_door = LiftLogicMachine.lock_door
+    unlock_door = LiftLogicMachine.unlock_door
+    start_rising = LiftLogicMachine.start_rising
+    start_lowering = LiftLogicMachine.start_lowering
+    stop = LiftLogicMachine.stop
+    log_unsafe_to_move = LiftLogicMachine.log_unsafe_to_move
+    on_enter_state = LiftLogicMachine.on_enter_state
+
+    def __init__(self, model: LiftLogicModel, start_value: Optional[str] = None):
+        self.model = model
+        self._table, self._needs_inputs, initial_actions = _get_compiled()
+        self._inputs = tuple(getattr(model, name) for name in INPUTS)
+        # If the inputs come from cache_inputs() the mask is already there.
+        self._input_state = None
+        if all(isinstance(pin, CachedInput) for pin in self._inputs):
+            state = self._inputs[0].state
+            if all(pin.state is state and pin.bit == 1 << n for n, pin in enumerate(self._inputs)):
+                self._input_state = state
+        self._queue = deque()
+        self._processing = False
+        # The inputs the event being handled was looked up with
+        self._mask = 0
+        self._after_transition: list[tuple[Callable, tuple[str, ...]]] = []
+
+        # As with python-statemachine, a model that already has a state carries on from it,
+        # otherwise the start state is entered.
+        if getattr(model, 'state', None) is not None:
+            self._state = STATES.index(model.state)
+            return
+        self._state = STATES.index(start_value or LiftLogicMachine.initial_state.id)
+        model.state = STATES[self._state]
+        for action in initial_actions[self._state]:
+            action(self, '__initial__', self.current_state)
+
+    @property
+    def current_state(self):
+        return LiftLogicMachine.states_map[STATES[self._state]]
+
+    def add_listener(self, *listeners):
+        '''Like python-statemachine's add_listener, but only a listener's after_transition is
+        called. It's given whichever of event, source and target it asks for.'''
+        for listener in listeners:
+            callback = getattr(listener, 'after_transition', None)
+            if callback is None:
+                continue
+            wants = tuple(p for p in inspect.signature(callback).parameters if p in ('event', 'source', 'target'))
+            self._after_transition.append((callback, wants))
+        return self
+
+    def _sampled_inputs(self) -> tuple:
+        return tuple(bool(self._mask & bit) for bit in _SAFETY_BITS)
+
+    def input_mask(self) -> int:
+        if self._input_state is not None:
+            return self._input_state.mask
+        mask = 0
+        for bit, pin in enumerate(self._inputs):
+            if pin():
+                mask |= 1 << bit
+        return mask
+
+    def initialise(self):
+        self._send(0)
+
+    def call(self):
+        self._send(1)
+
+    def stop_rising(self):
+        self._send(2)
+
+    def stop_lowering(self):
+        self._send(3)
+
+    def door_opens(self):
+        self._send(4)
+
+    def estop_pressed(self):
+        self._send(5)
+
+    def safety_timeout(self):
+        self._send(6)
+
+    def _send(self, event: int):
+        # Like python-statemachine's run to completion model, an event sent while another is
+        # being handled waits until that one is finished.
+        self._queue.append(event)
+        if self._processing:
+            return
+        self._processing = True
+        try:
+            while self._queue:
+                try:
+                    self._dispatch(self._queue.popleft())
+                except Exception:
+                    self._queue.clear()
+                    raise
+        finally:
+            self._processing = False
+
+    def _dispatch(self, event: int):
+        key = self._state * len(EVENTS) + event
+        mask = self._mask = self.input_mask() if self._needs_inputs[key] else 0
+        entry = self._table[(key << len(INPUTS)) | mask]
+        if entry is None:
+            raise TransitionNotAllowed(LiftLogicMachine.events[event], self.current_state)
+
+        target, before, after = entry
+        name = EVENTS[event]
+        for action in before:
+            action(self, name, None)
+        source = self._state
+        self._state = target
+        self.model.state = STATES[target]
+        state = self.current_state
+        for action in after:
+            action(self, name, state)
+        if self._after_transition:
+            arguments = {'event': name, 'source': LiftLogicMachine.states_map[STATES[source]], 'target': state}
+            for callback, wants in self._after_transition:
+                callback(**{p: arguments[p] for p in wants})
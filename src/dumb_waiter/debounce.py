@@ -0,0 +1,130 @@
+import asyncio
+import logging
+from typing import Callable, NamedTuple, Optional
+
+from .io import Input
+
+logger = logging.getLogger(__name__)
+
+
+class Debounce(NamedTuple):
+    '''How to clean up one input.
+
+    window: after an edge is let through, the input is held at its new level for this long,
+    so chatter doesn't become more edges. If the input has ended up somewhere else when the
+    window is over, that edge is let through then.
+
+    glitch: a change has to last this long before it is let through, so a spike on the line
+    doesn't become an edge at all. It delays every edge by this much, so keep it short.'''
+    window: float
+    glitch: float = 0.0
+
+
+# For the pins in pins.INPUT_PINS. The call buttons chatter badly and the doors rattle,
+# the limit switches are clean and need to stop the motor straight away, and nothing
+# should ever hold up an estop.
+DEBOUNCE = {
+    'call_pb_top': Debounce(0.05, glitch=0.005),
+    'call_pb_bottom': Debounce(0.05, glitch=0.005),
+    'door_closed_level1': Debounce(0.05),
+    'door_closed_ground': Debounce(0.05),
+    'lower_limit': Debounce(0.002),
+    'upper_limit': Debounce(0.002),
+    'estop_top': Debounce(0),
+    'estop_bottom': Debounce(0),
+}
+
+# Presses of either call button closer together than this are one call. Without it a double
+# press starts the lift and then stops it again.
+CALL_HOLDOFF = 1.0
+
+
+class DebouncedInput(Input):
+    '''An input cleaned up on the event loop, using the loop's clock. The pin's edges are
+    taken over, and the callbacks set on here are only fired for edges that get through.'''
+
+    def __init__(self, pin: Input, debounce: Debounce, name: Optional[str] = None):
+        self.pin = pin
+        self.debounce = debounce
+        self.name = name or getattr(pin, 'name', None)
+        self.level = bool(pin())
+        self.raw = self.level
+        self.raw_time = 0.0
+        self._held_until = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._falling_edge_callback: Optional[Callable] = None
+        self._rising_edge_callback: Optional[Callable] = None
+        pin.falling_edge_callback = lambda: self._raw_edge(False)
+        pin.rising_edge_callback = lambda: self._raw_edge(True)
+
+    def __call__(self):
+        return self.level
+
+    @property
+    def falling_edge_callback(self):
+        return self._falling_edge_callback
+
+    @falling_edge_callback.setter
+    def falling_edge_callback(self, value: Optional[Callable]):
+        self._falling_edge_callback = value
+
+    @property
+    def rising_edge_callback(self):
+        return self._rising_edge_callback
+
+    @rising_edge_callback.setter
+    def rising_edge_callback(self, value: Optional[Callable]):
+        self._rising_edge_callback = value
+
+    def _raw_edge(self, rising: bool):
+        if rising == self.raw:
+            return
+        self.raw = rising
+        if self.debounce.window or self.debounce.glitch:
+            self.raw_time = asyncio.get_running_loop().time()
+        self._update()
+
+    def _update(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self.raw == self.level:
+            return
+
+        if self.debounce.window or self.debounce.glitch:
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            due = max(self._held_until, self.raw_time + self.debounce.glitch)
+            if now < due:
+                self._timer = loop.call_at(due, self._update)
+                return
+            self._held_until = now + self.debounce.window
+
+        self.level = self.raw
+        self._notify_edge(rising=self.level)
+        callback = self._rising_edge_callback if self.level else self._falling_edge_callback
+        if callback is not None:
+            callback()
+
+
+def debounce_inputs(pins, debounce: dict[str, Debounce] = DEBOUNCE):
+    '''Replace each of the named inputs on pins (a LiftPins) with a DebouncedInput. Needs doing
+    before the model is made from the pins.'''
+    for name, settings in debounce.items():
+        setattr(pins, name, DebouncedInput(getattr(pins, name), settings, name=name))
+
+
+def collapse(callback: Callable, holdoff: float, name: str = 'event') -> Callable:
+    '''Wrap callback so calls closer together than holdoff seconds (on the event loop's clock)
+    only call it once.'''
+    last = None
+
+    def collapsed():
+        nonlocal last
+        now = asyncio.get_running_loop().time()
+        if last is not None and now - last < holdoff:
+            logger.debug("Ignoring %s, %.3fs after the last one", name, now - last)
+            return
+        last = now
+        callback()
+    return collapsed
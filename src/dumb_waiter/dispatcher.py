@@ -0,0 +1,47 @@
+import asyncio
+import threading
+from collections import deque
+from typing import Callable
+
+
+class EdgeDispatcher:
+    '''Hands callbacks from other threads (like gpiozero's, which deliver the edges) to the
+    event loop.
+
+    Every pin of every lift can post to one of these. However many edges arrive while the loop
+    is busy, the loop is only woken once, and then runs them all, in the order they came in.
+    An exception from one callback is passed to the loop's exception handler and doesn't stop
+    the rest, so one lift can't hold up another.'''
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._scheduled = False
+        # How many times the loop was woken, and how many callbacks it ran.
+        self.wakeups = 0
+        self.dispatched = 0
+
+    def post(self, callback: Callable, *args):
+        '''Run callback(*args) on the loop soon. Safe to call from any thread.'''
+        self._pending.append((callback, args))
+        with self._lock:
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self.loop.call_soon_threadsafe(self._run)
+
+    def _run(self):
+        with self._lock:
+            self._scheduled = False
+        self.wakeups += 1
+        while self._pending:
+            callback, args = self._pending.popleft()
+            self.dispatched += 1
+            try:
+                callback(*args)
+            except Exception as exc:
+                self.loop.call_exception_handler({
+                    'message': f'Exception in edge callback {callback!r}',
+                    'exception': exc,
+                })
@@ -0,0 +1,155 @@
+from typing import Callable, Optional
+
+from .io import Input, Output
+from .logic import LiftLogicMachine, LiftLogicModel
+
+
+class FakeDigitalInput(Input):
+    def __init__(self, initial=False):
+        self.var = initial
+
+    def __call__(self):
+        return self.var
+
+
+    # I need a wait to change the fake input, hence below methods.
+    def toggle(self):
+        old_var = self.var
+        self.var = not self.var
+        self._notify_edge(rising=not old_var)
+        if self.falling_edge_callback is not None:
+            if old_var == True:
+                self.falling_edge_callback()
+        if self.rising_edge_callback is not None:
+            if old_var == False:
+                self.rising_edge_callback()
+
+    def on(self):
+        if self.var == True:
+            return
+        self.var = True
+        self._notify_edge(rising=True)
+        if self.rising_edge_callback is not None:
+            self.rising_edge_callback()
+
+    def off(self):
+        if self.var == False:
+            return
+        self.var = False
+        self._notify_edge(rising=False)
+        if self.falling_edge_callback is not None:
+            self.falling_edge_callback()
+
+class FakeDigitalOutput(Output):
+    # Called with no arguments after the output changes, so a simulation can react to it.
+    change_callback: Optional[Callable] = None
+
+    def __init__(self, name):
+        self.name = name
+        self.var = False
+
+    @property
+    def value(self):
+        return self.var
+
+    def on(self):
+        self._set(True)
+
+    def off(self):
+        self._set(False)
+
+    def _set(self, value):
+        if self.var == value:
+            return
+        self.var = value
+        if self.change_callback is not None:
+            self.change_callback()
+
+
+class FakeLift:
+    '''A LiftLogicMachine connected to fake inputs and outputs. The inputs are wired to the
+    events the same way __main__.main() wires up the real pins, so toggling a fake input
+    behaves like the switch on the lift changing.
+
+    With compiled=True the lift is driven by a CompiledLiftLogic instead, and with cached=True
+    the lift logic reads its inputs from an InputState (self.input_state). name and scheduler
+    are passed on to the LiftLogicModel, for running several lifts together. With a hold_time
+    the call buttons go through a RegisteredCalls (self.calls).'''
+
+    input_names = (
+        'estop1',
+        'estop2',
+        'lower_limit',
+        'upper_limit',
+        'upper_door_closed',
+        'lower_door_closed',
+        'call_top',
+        'call_bottom',
+    )
+    output_names = (
+        'raise_lift',
+        'lower_lift',
+        'lock_door_top',
+        'lock_door_bottom',
+    )
+
+    def __init__(self, safety_time=23, compiled=False, cached=False, name='lift', scheduler=None,
+                 hold_time=None):
+        self.inputs = {name: FakeDigitalInput() for name in self.input_names}
+        self.outputs = {name: FakeDigitalOutput(name) for name in self.output_names}
+
+        self.model = LiftLogicModel(
+            estop1=self.inputs['estop1'],
+            estop2=self.inputs['estop2'],
+            lower_limit=self.inputs['lower_limit'],
+            upper_limit=self.inputs['upper_limit'],
+            upper_door_closed=self.inputs['upper_door_closed'],
+            lower_door_closed=self.inputs['lower_door_closed'],
+            raise_lift=self.outputs['raise_lift'],
+            lower_lift=self.outputs['lower_lift'],
+            lock_door_top=self.outputs['lock_door_top'],
+            lock_door_bottom=self.outputs['lock_door_bottom'],
+            safety_time=safety_time,
+            name=name,
+            scheduler=scheduler,
+        )
+        self.input_state = None
+        if cached:
+            from .input_state import cache_inputs
+            self.input_state = cache_inputs(self.model)
+        if compiled:
+            from .compiled import CompiledLiftLogic
+            self.machine = CompiledLiftLogic(self.model)
+        else:
+            self.machine = LiftLogicMachine(self.model)
+        llm = self.machine
+        model = self.model
+
+        self.calls = None
+        if hold_time is None:
+            self.inputs['call_top'].falling_edge_callback = lambda: llm.call()
+            self.inputs['call_bottom'].falling_edge_callback = lambda: llm.call()
+        else:
+            from .calls import RegisteredCalls
+            calls = self.calls = RegisteredCalls(llm, hold_time=hold_time)
+            self.inputs['call_top'].falling_edge_callback = lambda: calls.press('top')
+            self.inputs['call_bottom'].falling_edge_callback = lambda: calls.press('bottom')
+        model.lower_limit.rising_edge_callback = lambda: llm.stop_lowering()
+        model.upper_limit.rising_edge_callback = lambda: llm.stop_rising()
+        model.upper_door_closed.falling_edge_callback = lambda: llm.door_opens()
+        model.lower_door_closed.falling_edge_callback = lambda: llm.door_opens()
+        model.estop1.rising_edge_callback = lambda: llm.estop_pressed()
+        model.estop2.rising_edge_callback = lambda: llm.estop_pressed()
+
+    @property
+    def state(self) -> str:
+        return self.machine.current_state.id
+
+    def close_doors(self):
+        self.inputs['upper_door_closed'].on()
+        self.inputs['lower_door_closed'].on()
+
+    def press(self, name):
+        '''Press and release a button. The call buttons fire on release.'''
+        self.inputs[name].on()
+        self.inputs[name].off()
@@ -0,0 +1,361 @@
+'''A simulator for thousands of lifts at once, for trying out settings (safety_time, how long
+doors are held open, how often people call the lift) across a whole fleet.
+
+It does what LiftSimulator does to one FakeLift, but with NumPy arrays holding every lift's
+state, and LiftLogicMachine's transitions compiled into arrays indexed by state, event and
+inputs. Each lift keeps its own clock: every pass of the main loop moves each lift on to its
+own next event (a limit switch, the safety timeout, or something a person does), so a pass
+costs the same however many lifts there are.
+
+cross_check() runs sampled lifts through LiftSimulator as well, to show the two agree.'''
+import asyncio
+from dataclasses import dataclass, fields
+from typing import Optional
+
+import numpy as np
+from statemachine.exceptions import TransitionNotAllowed
+
+from .compiled import EVENTS, INPUTS, STATES, _Probe, _probe_model, _set_inputs
+from .logic import LiftLogicMachine
+from .simulator import LiftPhysics
+
+_STOPPED = STATES.index('stopped')
+_AT_TOP = STATES.index('stopped_at_top')
+_AT_BOTTOM = STATES.index('stopped_at_bottom')
+_RISING = STATES.index('rising')
+_LOWERING = STATES.index('lowering')
+
+_CALL = EVENTS.index('call')
+_STOP_RISING = EVENTS.index('stop_rising')
+_STOP_LOWERING = EVENTS.index('stop_lowering')
+_DOOR_OPENS = EVENTS.index('door_opens')
+_SAFETY_TIMEOUT = EVENTS.index('safety_timeout')
+
+_LOWER_LIMIT = 1 << INPUTS.index('lower_limit')
+_UPPER_LIMIT = 1 << INPUTS.index('upper_limit')
+_UPPER_DOOR = 1 << INPUTS.index('upper_door_closed')
+_LOWER_DOOR = 1 << INPUTS.index('lower_door_closed')
+
+# What a person does next
+_NOTHING, _OPEN_DOOR, _CLOSE_DOOR, _PRESS_CALL = range(4)
+_BOTTOM, _TOP = 0, 1
+
+# Which way the motor drives the car in each state
+_DIRECTION = np.zeros(len(STATES), dtype=np.int8)
+_DIRECTION[_RISING] = 1
+_DIRECTION[_LOWERING] = -1
+
+
+def transition_arrays() -> tuple[np.ndarray, np.ndarray]:
+    '''LiftLogicMachine as arrays indexed by [state, event, input mask]: the state it goes to
+    (-1 if the event isn't allowed), and whether the state is entered (False for internal
+    transitions, which leave the state without running its enter and exit actions).'''
+    masks = 1 << len(INPUTS)
+    target = np.full((len(STATES), len(EVENTS), masks), -1, dtype=np.int8)
+    enters = np.zeros((len(STATES), len(EVENTS), masks), dtype=bool)
+    model = _probe_model()
+    probe = _Probe(model)
+    for s, state in enumerate(STATES):
+        for e, event in enumerate(EVENTS):
+            for mask in range(masks):
+                _set_inputs(model, mask)
+                probe.current_state = LiftLogicMachine.states_map[state]
+                probe.actions = []
+                try:
+                    getattr(probe, event)()
+                except TransitionNotAllowed:
+                    continue
+                target[s, e, mask] = STATES.index(probe.current_state.id)
+                enters[s, e, mask] = any(name == 'on_enter_state' for name, _, _ in probe.actions)
+    return target, enters
+
+
+@dataclass
+class FleetReport:
+    trips: np.ndarray
+    safety_timeouts: np.ndarray
+    faults: np.ndarray
+    elapsed: float  # Virtual seconds, the same for every lift
+    wait_histogram: np.ndarray  # Count of waits, from a call to the car arriving, in each bin
+    wait_bin: float  # Seconds per bin. The last bin holds everything longer.
+
+    @property
+    def trips_per_hour(self) -> np.ndarray:
+        return self.trips * 3600 / self.elapsed
+
+    def wait_percentile(self, p: float) -> float:
+        '''The wait (rounded up to a whole bin) that p of the calls waited no longer than'''
+        total = self.wait_histogram.sum()
+        if total == 0:
+            return 0.0
+        n = np.searchsorted(np.cumsum(self.wait_histogram), p * total)
+        return float((n + 1) * self.wait_bin)
+
+    def summary(self) -> dict:
+        trips = int(self.trips.sum())
+        timeouts = int(self.safety_timeouts.sum())
+        lift_hours = len(self.trips) * self.elapsed / 3600
+        return {
+            'lifts': len(self.trips),
+            'trips': trips,
+            'trips_per_hour': float(self.trips_per_hour.mean()),
+            'wait_p50': self.wait_percentile(0.50),
+            'wait_p95': self.wait_percentile(0.95),
+            'wait_p99': self.wait_percentile(0.99),
+            'safety_timeouts_per_1000_trips': timeouts * 1000 / trips if trips else float('inf'),
+            'safety_timeouts_per_lift_hour': timeouts / lift_hours,
+            'faults': int(self.faults.sum()),
+        }
+
+
+class FleetSimulator:
+    '''count lifts, all following LiftSimulator's rules. Any field of physics, and
+    safety_time, can be an array with a value for each lift.
+
+    With random_delays the people are less predictable: door_open_delay, load_time,
+    call_delay and recover_delay are the means of exponential distributions rather than
+    fixed times.'''
+
+    def __init__(self, count: int, physics: Optional[LiftPhysics] = None, safety_time=23,
+                 random_delays=False, rng: Optional[np.random.Generator] = None,
+                 max_wait: float = 600, wait_bin: float = 0.5):
+        self.count = count
+        physics = physics or LiftPhysics()
+        self.params = {
+            f.name: np.broadcast_to(np.asarray(getattr(physics, f.name), dtype=float), (count,)).copy()
+            for f in fields(LiftPhysics)
+        }
+        self.params['safety_time'] = np.broadcast_to(np.asarray(safety_time, dtype=float), (count,)).copy()
+        self.random_delays = random_delays
+        self.rng = rng or np.random.default_rng()
+        self.wait_bin = wait_bin
+        self.wait_bins = int(max_wait / wait_bin) + 1
+        self.target, self.enters = transition_arrays()
+
+    def _delay(self, name: str, which: np.ndarray) -> np.ndarray:
+        mean = self.params[name][which]
+        if self.random_delays:
+            return self.rng.exponential(mean)
+        return mean
+
+    def run(self, duration: float) -> FleetReport:
+        '''Simulate duration seconds. Like LiftSimulator.run(), someone calls the lift to the
+        bottom call_delay seconds in.'''
+        n = self.count
+        p = self.params
+        top, overtravel, speed = p['travel'], p['overtravel'], p['speed']
+        everyone = np.arange(n)
+
+        now = np.zeros(n)
+        state = np.full(n, _STOPPED, dtype=np.int8)
+        # The car was at position, at time since, and has been going in direction since.
+        position = p['start_position'].copy()
+        since = np.zeros(n)
+        direction = np.zeros(n, dtype=np.int8)
+        crossing = np.full(n, np.inf)
+        mask = np.full(n, _UPPER_DOOR | _LOWER_DOOR, dtype=np.int64)
+        mask |= np.where(position >= top, _UPPER_LIMIT, 0)
+        mask |= np.where(position <= 0, _LOWER_LIMIT, 0)
+        deadline = np.full(n, np.inf)
+        action_at = self._delay('call_delay', everyone)
+        action = np.full(n, _PRESS_CALL, dtype=np.int8)
+        floor = np.full(n, _BOTTOM, dtype=np.int8)
+        called_at = np.full(n, np.nan)
+
+        trips = np.zeros(n, dtype=np.int64)
+        timeouts = np.zeros(n, dtype=np.int64)
+        faults = np.zeros(n, dtype=np.int64)
+        waits = np.zeros(self.wait_bins, dtype=np.int64)
+
+        def position_at(which, t):
+            moved = position[which] + direction[which] * speed[which] * (t - since[which])
+            return np.clip(moved, -overtravel[which], top[which] + overtravel[which])
+
+        def next_crossing(which):
+            '''When each car next crosses a limit switch or reaches a buffer, as
+            LiftSimulator._time_to_next_boundary() works it out'''
+            pos, d = position[which], direction[which]
+            t_top, ot = top[which], overtravel[which]
+            ahead = np.full(len(which), np.inf)
+            for boundary in (np.zeros(len(which)), t_top, t_top + ot, -ot):
+                distance = np.where(d > 0, boundary - pos, pos - boundary)
+                ahead = np.where((d != 0) & (distance > 0), np.minimum(ahead, distance), ahead)
+            return np.where(np.isfinite(ahead), since[which] + (ahead / speed[which] + 1e-6), np.inf)
+
+        def check_buffers(which):
+            pos, d = position[which], direction[which]
+            hit = ((pos >= top[which] + overtravel[which]) & (d > 0)) | ((pos <= -overtravel[which]) & (d < 0))
+            faults[which[hit]] += 1
+
+        def update_limits(which):
+            '''Work out where the cars are, and when they next cross a switch. Returns the
+            limit switch edges that fire an event.'''
+            position[which] = position_at(which, now[which])
+            since[which] = now[which]
+            crossing[which] = next_crossing(which)
+            check_buffers(which)
+            old = mask[which]
+            new = old & ~(_UPPER_LIMIT | _LOWER_LIMIT)
+            new |= np.where(position[which] >= top[which], _UPPER_LIMIT, 0)
+            new |= np.where(position[which] <= 0, _LOWER_LIMIT, 0)
+            mask[which] = new
+            rose = new & ~old
+            return np.where(rose & _UPPER_LIMIT, _STOP_RISING, np.where(rose & _LOWER_LIMIT, _STOP_LOWERING, -1))
+
+        while True:
+            # On a tie the safety timeout goes first: LiftLogicMachine sets it before starting
+            # the motor, so on the event loop it is due first too.
+            due = np.stack((deadline, crossing, action_at))
+            kind = due.argmin(axis=0)
+            when = due[kind, everyone]
+            live = np.flatnonzero(when <= duration)
+            if len(live) == 0:
+                break
+            now[live] = when[live]
+            kind = kind[live]
+            event = np.full(len(live), -1, dtype=np.int64)
+
+            # The car reaches a switch or a buffer
+            limit = kind == 1
+            if limit.any():
+                event[limit] = update_limits(live[limit])
+
+            # The safety timeout goes off
+            timed_out = kind == 0
+            deadline[live[timed_out]] = np.inf
+            event[timed_out] = _SAFETY_TIMEOUT
+
+            # Someone does something
+            acting = kind == 2
+            if acting.any():
+                which = live[acting]
+                what = action[which]
+                action_at[which] = np.inf
+                action[which] = _NOTHING
+                door = np.where(floor[which] == _TOP, _UPPER_DOOR, _LOWER_DOOR)
+
+                # The door is only opened if the car is there, and it is unlocked.
+                opening = (what == _OPEN_DOOR) & ((state[which] == _AT_TOP) | (state[which] == _AT_BOTTOM))
+                o = which[opening]
+                mask[o] &= ~door[opening]
+                action[o] = _CLOSE_DOOR
+                action_at[o] = now[o] + self._delay('load_time', o)
+                sub = np.flatnonzero(acting)
+                event[sub[opening]] = _DOOR_OPENS
+
+                closing = what == _CLOSE_DOOR
+                c = which[closing]
+                mask[c] |= door[closing]
+                action[c] = _PRESS_CALL
+                action_at[c] = now[c] + self._delay('call_delay', c)
+
+                event[sub[what == _PRESS_CALL]] = _CALL
+
+            # The lift logic
+            has = event >= 0
+            if not has.any():
+                continue
+            which = live[has]
+            e = event[has]
+            old = state[which]
+            target = self.target[old, e, mask[which]]
+            allowed = target >= 0
+            which, e, old, target = which[allowed], e[allowed], old[allowed], target[allowed]
+            entered = self.enters[old, e, mask[which]]
+            state[which] = target
+
+            moved = _DIRECTION[target] != _DIRECTION[old]
+            started = entered & (_DIRECTION[target] != 0)
+            stopped = moved & (_DIRECTION[old] != 0)
+            deadline[which[stopped]] = np.inf
+            s = which[started]
+            deadline[s] = now[s] + p['safety_time'][s]
+            called_at[s] = now[s]
+            m = which[moved]
+            if len(m):
+                position[m] = position_at(m, now[m])
+                since[m] = now[m]
+                direction[m] = _DIRECTION[state[m]]
+                # Starting the motor can't cross a switch, as the car hasn't moved yet.
+                update_limits(m)
+
+            arrived = entered & ((target == _AT_TOP) | (target == _AT_BOTTOM))
+            a = which[arrived]
+            trips[a] += 1
+            waited = now[a] - called_at[a]
+            waited = waited[~np.isnan(waited)]
+            np.add.at(waits, np.minimum((waited / self.wait_bin).astype(np.int64), self.wait_bins - 1), 1)
+            floor[a] = np.where(target[arrived] == _AT_TOP, _TOP, _BOTTOM)
+            action[a] = _OPEN_DOOR
+            action_at[a] = now[a] + self._delay('door_open_delay', a)
+
+            halted = entered & (target == _STOPPED)
+            h = which[halted]
+            timeouts[which[halted & (e == _SAFETY_TIMEOUT)]] += 1
+            floor[h] = _BOTTOM
+            action[h] = _PRESS_CALL
+            action_at[h] = now[h] + self._delay('recover_delay', h)
+
+        return FleetReport(trips, timeouts, faults, duration, waits, self.wait_bin)
+
+
+def sample_physics(count: int, rng: np.random.Generator) -> tuple[LiftPhysics, np.ndarray]:
+    '''count lifts worth of plausible, but random, settings'''
+    physics = LiftPhysics(
+        travel=rng.uniform(2, 5, count),
+        speed=rng.uniform(0.2, 0.5, count),
+        door_open_delay=rng.uniform(0.5, 5, count),
+        load_time=rng.uniform(1, 10, count),
+        call_delay=rng.uniform(0.5, 5, count),
+        recover_delay=rng.uniform(2, 20, count),
+    )
+    physics.start_position = rng.uniform(0.1, physics.travel - 0.1)
+    return physics, rng.uniform(5, 30, count)
+
+
+def _one(physics: LiftPhysics, n: int) -> LiftPhysics:
+    '''The settings of the nth lift'''
+    values = {}
+    for f in fields(LiftPhysics):
+        value = getattr(physics, f.name)
+        values[f.name] = float(value[n]) if np.ndim(value) else value
+    return LiftPhysics(**values)
+
+
+def cross_check(samples: int, duration: float, seed: int = 0) -> list[str]:
+    '''Run samples lifts with random settings through both FleetSimulator and LiftSimulator
+    for duration seconds, returning how any of them disagree.'''
+    from .fake import FakeLift
+    from .simulator import LiftSimulator
+    from .virtual_time import VirtualTimeLoop
+
+    rng = np.random.default_rng(seed)
+    physics, safety_time = sample_physics(samples, rng)
+    fleet = FleetSimulator(samples, physics, safety_time).run(duration)
+
+    def ignore_not_allowed(loop, context):
+        # LiftSimulator can press a switch the lift logic then refuses, when the car gets to a
+        # switch as the safety timeout stops it. FleetSimulator drops those events too.
+        if not isinstance(context.get('exception'), TransitionNotAllowed):
+            loop.default_exception_handler(context)
+
+    async def scalar(physics, safety_time):
+        asyncio.get_running_loop().set_exception_handler(ignore_not_allowed)
+        lift = FakeLift(safety_time=safety_time)
+        lift.close_doors()
+        lift.machine.initialise()
+        sim = LiftSimulator(lift, physics)
+        report = await sim.run(trips=2**62, timeout=duration)
+        lift.model.scheduler.cancel_all()
+        return report
+
+    differences = []
+    for n in range(samples):
+        with asyncio.Runner(loop_factory=VirtualTimeLoop) as runner:
+            report = runner.run(scalar(_one(physics, n), float(safety_time[n])))
+        got = (int(fleet.trips[n]), int(fleet.safety_timeouts[n]), int(fleet.faults[n]))
+        want = (report.trips, report.safety_timeouts, len(report.faults))
+        if got != want:
+            differences.append(f'lift {n} (safety_time={safety_time[n]:.2f}, {_one(physics, n)}): '
+                f'fleet trips, timeouts, faults {got}, LiftSimulator {want}')
+    return differences
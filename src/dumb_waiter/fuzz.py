@@ -0,0 +1,299 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from statemachine.exceptions import TransitionNotAllowed
+
+from .fake import FakeLift
+from .virtual_time import VirtualTimeLoop
+
+logger = logging.getLogger(__name__)
+
+# A step is one of
+#   ('event', name)          fire an event on the LiftLogicMachine directly
+#   ('set', input, value)    drive a model input, which fires its edge callbacks like the real pin
+#   ('wait', seconds)        let time pass, so timers (like the safety timer) can fire
+EVENTS = ('call', 'stop_rising', 'stop_lowering', 'door_opens', 'estop_pressed', 'safety_timeout')
+INPUTS = ('estop1', 'estop2', 'lower_limit', 'upper_limit', 'upper_door_closed', 'lower_door_closed')
+
+
+def _motor_running(lift: FakeLift) -> bool:
+    return lift.outputs['raise_lift'].value or lift.outputs['lower_lift'].value
+
+def raise_and_lower_exclusive(lift: FakeLift) -> Optional[str]:
+    if lift.outputs['raise_lift'].value and lift.outputs['lower_lift'].value:
+        return 'raise_lift and lower_lift are both on'
+
+def no_motor_with_estop(lift: FakeLift) -> Optional[str]:
+    if _motor_running(lift) and (lift.inputs['estop1']() or lift.inputs['estop2']()):
+        return 'motor running with an estop active'
+
+def no_motor_with_door_open(lift: FakeLift) -> Optional[str]:
+    if _motor_running(lift) and not (lift.inputs['upper_door_closed']() and lift.inputs['lower_door_closed']()):
+        return 'motor running with a door open'
+
+def doors_locked_while_moving(lift: FakeLift) -> Optional[str]:
+    if _motor_running(lift) and not (lift.outputs['lock_door_top'].value and lift.outputs['lock_door_bottom'].value):
+        return 'motor running with a door unlocked'
+
+INVARIANTS = (
+    raise_and_lower_exclusive,
+    no_motor_with_estop,
+    no_motor_with_door_open,
+    doors_locked_while_moving,
+)
+
+
+@dataclass
+class Violation:
+    step: int
+    message: str
+
+
+@dataclass
+class SequenceResult:
+    transitions: int = 0
+    violation: Optional[Violation] = None
+
+
+class _TransitionCounter:
+    def __init__(self):
+        self.count = 0
+
+    def after_transition(self):
+        self.count += 1
+
+
+def random_sequence(rng: random.Random, length: int, safety_time: float) -> list[tuple]:
+    waits = (0.01, 0.5, safety_time * 0.5, safety_time * 1.1)
+    steps = []
+    for _ in range(length):
+        kind = rng.random()
+        if kind < 0.4:
+            steps.append(('event', rng.choice(EVENTS)))
+        elif kind < 0.85:
+            steps.append(('set', rng.choice(INPUTS), rng.random() < 0.5))
+        else:
+            steps.append(('wait', rng.choice(waits)))
+    return steps
+
+
+async def run_sequence(steps, safety_time: float, invariants=INVARIANTS) -> SequenceResult:
+    '''Run the steps against a new FakeLift on the running loop, checking the invariants after
+    the lift is initialised and after every step.'''
+    loop = asyncio.get_running_loop()
+    result = SequenceResult()
+    errors = []
+
+    def exception_handler(loop, context):
+        # The safety timer runs as a loop callback, so anything it raises ends up here.
+        error = context.get('exception')
+        if not isinstance(error, TransitionNotAllowed):
+            errors.append(repr(error) if error is not None else context['message'])
+    old_handler = loop.get_exception_handler()
+    loop.set_exception_handler(exception_handler)
+
+    lift = FakeLift(safety_time=safety_time)
+    counter = _TransitionCounter()
+    lift.machine.add_listener(counter)
+    try:
+        lift.machine.initialise()
+        for i, step in enumerate(steps):
+            try:
+                if step[0] == 'event':
+                    getattr(lift.machine, step[1])()
+                elif step[0] == 'set':
+                    if step[2]:
+                        lift.inputs[step[1]].on()
+                    else:
+                        lift.inputs[step[1]].off()
+                elif step[0] == 'wait':
+                    await asyncio.sleep(step[1])
+            except TransitionNotAllowed:
+                pass
+            except Exception as error:
+                errors.append(repr(error))
+            await asyncio.sleep(0)
+
+            if errors:
+                result.violation = Violation(i, f'exception: {errors[0]}')
+                break
+            for invariant in invariants:
+                message = invariant(lift)
+                if message is not None:
+                    result.violation = Violation(i, message)
+                    break
+            if result.violation is not None:
+                break
+    finally:
+        # Don't leave this lift's safety timer behind to fire during the next sequence.
+        lift.model.scheduler.cancel_all()
+        for task in asyncio.all_tasks():
+            if task is not asyncio.current_task():
+                task.cancel()
+        await asyncio.sleep(0)
+        loop.set_exception_handler(old_handler)
+        result.transitions = counter.count
+    return result
+
+
+def check_sequence(steps, safety_time: float, invariants=INVARIANTS) -> SequenceResult:
+    '''Run the steps on a fresh VirtualTimeLoop'''
+    with asyncio.Runner(loop_factory=VirtualTimeLoop) as runner:
+        return runner.run(run_sequence(steps, safety_time, invariants))
+
+
+def shrink(steps, safety_time: float, invariants=INVARIANTS) -> list[tuple]:
+    '''Reduce a failing sequence to a (locally) minimal one that fails with the same message.'''
+    first = check_sequence(steps, safety_time, invariants).violation
+    if first is None:
+        raise ValueError('The sequence does not fail')
+    message = first.message
+
+    def fails(candidate):
+        violation = check_sequence(candidate, safety_time, invariants).violation
+        return violation is not None and violation.message == message
+
+    # Nothing after the failing step matters.
+    steps = list(steps[:first.step + 1])
+
+    # Remove chunks, halving their size each time no chunk can be removed.
+    chunk = max(len(steps) // 2, 1)
+    while chunk >= 1:
+        i = 0
+        removed = False
+        while i < len(steps):
+            candidate = steps[:i] + steps[i + chunk:]
+            if candidate and fails(candidate):
+                steps = candidate
+                removed = True
+            else:
+                i += chunk
+        if not removed:
+            chunk //= 2
+
+    # Then try to make each wait shorter.
+    for i, step in enumerate(steps):
+        if step[0] != 'wait':
+            continue
+        for shorter in (0.0, 0.01, 0.5, safety_time * 1.1):
+            if shorter >= step[1]:
+                break
+            candidate = steps[:i] + [('wait', shorter)] + steps[i + 1:]
+            if fails(candidate):
+                steps = candidate
+                break
+    return steps
+
+
+@dataclass
+class ShardResult:
+    shard: int
+    runs: int = 0
+    transitions: int = 0
+    failures: list[dict] = field(default_factory=list)
+
+
+def run_shard(shard: int, runs: int, length: int, seed: int, safety_time: float,
+              first: Optional[int] = None) -> ShardResult:
+    '''Run `runs` random sequences. Each sequence has its own seed, so a failure can be
+    reproduced on its own: seed plus the number of the run in the campaign, which starts at
+    first (by default shard * runs).'''
+    if first is None:
+        first = shard * runs
+    result = ShardResult(shard)
+
+    async def campaign():
+        for run in range(runs):
+            run_seed = seed + first + run
+            steps = random_sequence(random.Random(run_seed), length, safety_time)
+            sequence = await run_sequence(steps, safety_time)
+            result.runs += 1
+            result.transitions += sequence.transitions
+            if sequence.violation is not None:
+                result.failures.append({
+                    'seed': run_seed,
+                    'message': sequence.violation.message,
+                    'steps': steps,
+                })
+
+    with asyncio.Runner(loop_factory=VirtualTimeLoop) as runner:
+        runner.run(campaign())
+    return result
+
+
+def _quiet_worker():
+    # Keep the fuzzer's own output down, the lift logs every transition. Only in the pool's
+    # worker processes, where nothing else is logging.
+    logging.getLogger().setLevel(logging.WARNING)
+
+
+@dataclass
+class CampaignReport:
+    runs: int = 0
+    transitions: int = 0
+    wall_time: float = 0.0
+    failures: list[dict] = field(default_factory=list)
+
+    @property
+    def transitions_per_second(self) -> float:
+        if self.wall_time == 0:
+            return 0.0
+        return self.transitions / self.wall_time
+
+
+def run_campaign(runs: int, length: int = 50, jobs: Optional[int] = None, seed: int = 0,
+                 safety_time: float = 5, out_dir: Optional[str] = None,
+                 progress: Optional[Callable[[ShardResult], None]] = None) -> CampaignReport:
+    '''Split the runs into shards across a process pool. Failures are shrunk and, if
+    out_dir is set, saved there as JSON.'''
+    jobs = jobs or os.cpu_count() or 1
+    # The first runs % shards shards have one more run than the rest, and there are no
+    # empty shards, so exactly runs are run.
+    shards = min(jobs * 4, runs)
+    per_shard, extra = divmod(runs, shards) if shards else (0, 0)
+    report = CampaignReport()
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_quiet_worker) as pool:
+        futures = [
+            pool.submit(run_shard, shard, per_shard + (shard < extra), length, seed, safety_time,
+                shard * per_shard + min(shard, extra))
+            for shard in range(shards)
+        ]
+        for future in futures:
+            shard = future.result()
+            report.runs += shard.runs
+            report.transitions += shard.transitions
+            report.failures.extend(shard.failures)
+            if progress is not None:
+                progress(shard)
+    report.wall_time = time.perf_counter() - started
+
+    for failure in report.failures:
+        failure['shrunk'] = shrink([tuple(s) for s in failure['steps']], safety_time)
+        if out_dir is not None:
+            save_failure(failure, safety_time, out_dir)
+    return report
+
+
+def save_failure(failure: dict, safety_time: float, out_dir: str) -> str:
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"failure-{failure['seed']}.json")
+    with open(path, 'w') as f:
+        json.dump(dict(failure, safety_time=safety_time), f, indent=1)
+    return path
+
+
+def load_failure(path: str) -> tuple[list[tuple], float]:
+    '''Load a saved failure, returning the shrunk steps and the safety_time to run them with'''
+    with open(path) as f:
+        failure = json.load(f)
+    steps = failure.get('shrunk') or failure['steps']
+    return [tuple(s) for s in steps], failure['safety_time']
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+from typing import Callable, Optional
+
+from .io import Input
+from .logic import LiftLogicModel, MODEL_INPUTS
+
+logger = logging.getLogger(__name__)
+
+
+def _report(exc: Exception):
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        logger.error("Exception in missed edge callback", exc_info=exc)
+        return
+    loop.call_exception_handler({
+        'message': 'Exception in missed edge callback',
+        'exception': exc,
+    })
+
+
+class InputState:
+    '''The last known level of a set of inputs, one bit each in an integer.
+
+    The bits are kept up to date by the inputs' edge callbacks, which run on the event loop
+    between events, so while the lift logic handles an event the mask can't change under it.
+    reconcile() reads the real inputs to catch any edges that went missing. An exception from
+    the callback of a missed edge goes to the event loop's exception handler, so reconciling
+    carries on.'''
+
+    def __init__(self):
+        self.mask = 0
+        self.inputs: list['CachedInput'] = []
+
+    def add(self, name: str, pin: Input) -> 'CachedInput':
+        cached = CachedInput(self, name, 1 << len(self.inputs), pin)
+        self.inputs.append(cached)
+        if pin():
+            self.mask |= cached.bit
+        return cached
+
+    def reconcile(self) -> int:
+        '''Read every input, and fire the callback for any edge we missed. Returns the bits
+        that were wrong.'''
+        wrong = 0
+        for cached in self.inputs:
+            if bool(cached.pin()) != bool(self.mask & cached.bit):
+                wrong |= cached.bit
+                logger.warning("Input %s was %s, but we missed the edge", cached.name,
+                    'on' if cached.pin() else 'off')
+                # The mask is updated before the callback, and one callback the lift logic
+                # won't take (say a limit while stopped) mustn't leave the other inputs stale.
+                try:
+                    cached.missed_edge()
+                except Exception as exc:
+                    _report(exc)
+        return wrong
+
+    async def reconcile_forever(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            self.reconcile()
+
+
+class CachedInput(Input):
+    '''An input read from an InputState rather than from the pin. The pin's edges update the
+    InputState before the callbacks set on here are fired.'''
+
+    def __init__(self, state: InputState, name: str, bit: int, pin: Input):
+        self.state = state
+        self.name = name
+        self.bit = bit
+        self.pin = pin
+        self._falling_edge_callback: Optional[Callable] = None
+        self._rising_edge_callback: Optional[Callable] = None
+        pin.falling_edge_callback = self._falling_edge
+        pin.rising_edge_callback = self._rising_edge
+
+    def __call__(self):
+        return bool(self.state.mask & self.bit)
+
+    @property
+    def falling_edge_callback(self):
+        return self._falling_edge_callback
+
+    @falling_edge_callback.setter
+    def falling_edge_callback(self, value: Optional[Callable]):
+        self._falling_edge_callback = value
+
+    @property
+    def rising_edge_callback(self):
+        return self._rising_edge_callback
+
+    @rising_edge_callback.setter
+    def rising_edge_callback(self, value: Optional[Callable]):
+        self._rising_edge_callback = value
+
+    def _falling_edge(self):
+        self.state.mask &= ~self.bit
+        self._notify_edge(rising=False)
+        if self._falling_edge_callback is not None:
+            self._falling_edge_callback()
+
+    def _rising_edge(self):
+        self.state.mask |= self.bit
+        self._notify_edge(rising=True)
+        if self._rising_edge_callback is not None:
+            self._rising_edge_callback()
+
+    def missed_edge(self):
+        if self.state.mask & self.bit:
+            self._falling_edge()
+        else:
+            self._rising_edge()
+
+
+def cache_inputs(model: LiftLogicModel) -> InputState:
+    '''Replace the model's inputs with ones read from an InputState, with bit n being
+    MODEL_INPUTS[n]. Needs doing before any edge callbacks are set on the model's inputs.'''
+    state = InputState()
+    for name in MODEL_INPUTS:
+        setattr(model, name, state.add(name, getattr(model, name)))
+    return state
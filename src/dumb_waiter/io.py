@@ -1,11 +1,23 @@
 #from typing import Protocol, Callable, Optional
-from typing import Callable, Optional
+import asyncio
+from typing import Callable, NamedTuple, Optional
 from abc import ABC, abstractmethod
 
+
+class Edge(NamedTuple):
+    '''An edge on an input. The time is on the event loop's clock.'''
+    rising: bool
+    time: float
+
+
 class Input(ABC):
     '''Each input needs to be able to fire on edges (though for some, like door closed, we don’t 
     trigger a state transition), and the state machine needs to be able to check each inputs current 
-    value.'''
+    value.
+
+    As well as the one callback for each edge, coroutines can wait for edges with wait_for_edge()
+    or edges(), as many as they like, and tap_edges() is called as each edge happens. Subclasses
+    hand every edge to those with _notify_edge().'''
 
     falling_edge_callback: Optional[Callable] = None
     rising_edge_callback: Optional[Callable] = None
@@ -15,6 +27,75 @@ class Input(ABC):
         '''Return the current value of the input'''
         ...
 
+    async def wait_for_edge(self, rising: Optional[bool] = None) -> Edge:
+        '''Wait for the next edge. If rising is True or False only wait for that kind of edge.'''
+        future = asyncio.get_running_loop().create_future()
+        waiter = (future, rising)
+        waiters = self.__dict__.setdefault('_edge_waiters', [])
+        waiters.append(waiter)
+        try:
+            return await future
+        finally:
+            waiters.remove(waiter)
+
+    def edges(self) -> 'EdgeStream':
+        '''Every edge from now on, to iterate over with async for. Close it (or use it as a
+        context manager) to stop collecting them.'''
+        return EdgeStream(self)
+
+    def tap_edges(self, callback: Callable[[bool], None]):
+        '''Call callback(rising) on every edge, straight away rather than from a task, for
+        things like the FlightRecorder that need to be cheap.'''
+        self.__dict__.setdefault('_edge_taps', []).append(callback)
+
+    def _notify_edge(self, rising: bool, time: Optional[float] = None):
+        '''Hand an edge to everything waiting for one. Has to be called from the event loop's
+        thread. If time isn't given the edge happened now.'''
+        taps = self.__dict__.get('_edge_taps')
+        if taps:
+            for tap in taps:
+                tap(rising)
+        waiters = self.__dict__.get('_edge_waiters')
+        streams = self.__dict__.get('_edge_streams')
+        if not waiters and not streams:
+            return
+        if time is None:
+            time = asyncio.get_running_loop().time()
+        edge = Edge(rising, time)
+        for future, want in waiters or ():
+            if not future.done() and (want is None or want == rising):
+                future.set_result(edge)
+        for stream in streams or ():
+            stream.queue.put_nowait(edge)
+
+
+class EdgeStream:
+    '''The edges on an input, as they happen. Edges are queued from when this is made, so none
+    are missed between making it and starting to iterate.'''
+
+    def __init__(self, input: Input):
+        self.input = input
+        self.queue: asyncio.Queue[Edge] = asyncio.Queue()
+        input.__dict__.setdefault('_edge_streams', []).append(self)
+
+    def close(self):
+        streams = self.input.__dict__.get('_edge_streams', [])
+        if self in streams:
+            streams.remove(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Edge:
+        return await self.queue.get()
+
+
 class Output(ABC):
     '''An Output object is for the lift to have a way to communicate to
     an output pin. I'm trying to make the logic agnostic to where it is running.
@@ -0,0 +1,98 @@
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyHistogram:
+    '''Counts latencies (in nanoseconds) into power of two buckets. Recording is a couple of
+    integer operations, so it is cheap enough to do on every edge.'''
+
+    buckets = 40  # 2**40 ns is about 18 minutes, longer than anything we will see
+
+    def __init__(self):
+        self.counts = [0] * self.buckets
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, ns: int):
+        self.counts[min(ns.bit_length(), self.buckets - 1)] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+    def percentile(self, p: float) -> int:
+        '''An upper bound on the p'th percentile (0 <= p <= 1), in nanoseconds'''
+        if self.count == 0:
+            return 0
+        wanted = p * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= wanted and count:
+                return min(1 << bucket, self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'mean_us': self.total / self.count / 1000 if self.count else 0,
+            'p50_us': self.percentile(0.5) / 1000,
+            'p99_us': self.percentile(0.99) / 1000,
+            'max_us': self.max / 1000,
+        }
+
+
+class LatencyMonitor:
+    '''Tracks, for each input, how long its edges take to get from the gpio thread to the
+    event loop (dispatch), and from the gpio thread to the relay changing (edge_to_output).
+
+    InPin hands each edge to run_edge() with the time the gpio thread saw it, and OutPin calls
+    output_changed() when a relay changes. Any relay that changes while an edge's callback is
+    running was changed because of that edge.'''
+
+    def __init__(self):
+        self.dispatch = defaultdict(LatencyHistogram)
+        self.edge_to_output = defaultdict(LatencyHistogram)
+        self._edge_name: Optional[str] = None
+        self._edge_ns = 0
+
+    def run_edge(self, name: str, edge_ns: int, callback: Callable):
+        self.dispatch[name].record(time.monotonic_ns() - edge_ns)
+        self._edge_name = name
+        self._edge_ns = edge_ns
+        try:
+            callback()
+        finally:
+            self._edge_name = None
+
+    def output_changed(self):
+        if self._edge_name is not None:
+            self.edge_to_output[self._edge_name].record(time.monotonic_ns() - self._edge_ns)
+
+    def summary(self) -> dict:
+        return {
+            'dispatch': {name: h.summary() for name, h in self.dispatch.items()},
+            'edge_to_output': {name: h.summary() for name, h in self.edge_to_output.items()},
+        }
+
+    def log_summary(self):
+        for kind, histograms in (('dispatch', self.dispatch), ('edge_to_output', self.edge_to_output)):
+            for name, h in histograms.items():
+                s = h.summary()
+                logger.info("%s latency for %s: count=%d p50=%.0fus p99=%.0fus max=%.0fus",
+                    kind, name, s['count'], s['p50_us'], s['p99_us'], s['max_us'])
+
+    async def report_forever(self, interval: float, comms=None):
+        '''Log the histograms every interval seconds, and if comms is given publish them too.'''
+        while True:
+            await asyncio.sleep(interval)
+            self.log_summary()
+            if comms is not None:
+                await comms.send('latency', json.dumps(self.summary()))
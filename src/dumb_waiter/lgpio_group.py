@@ -0,0 +1,208 @@
+import asyncio
+import threading
+from typing import Optional
+
+from .io import Input, Output
+from .pins import INPUT_PINS, LOCKS, OUTPUT_PINS, LiftPins
+
+# lgpio talks in broadcom gpio numbers, the pin maps use the header pin numbers.
+BOARD_TO_BCM = {
+    3: 2, 5: 3, 7: 4, 8: 14, 10: 15, 11: 17, 12: 18, 13: 27, 15: 22, 16: 23, 18: 24, 19: 10,
+    21: 9, 22: 25, 23: 11, 24: 8, 26: 7, 27: 0, 28: 1, 29: 5, 31: 6, 32: 12, 33: 13, 35: 19,
+    36: 16, 37: 26, 38: 20, 40: 21,
+}
+
+def bcm(pin: str) -> int:
+    '''"BOARD7" -> 4, "GPIO4" -> 4'''
+    if pin.startswith('BOARD'):
+        return BOARD_TO_BCM[int(pin[len('BOARD'):])]
+    if pin.startswith('GPIO'):
+        return int(pin[len('GPIO'):])
+    return int(pin)
+
+
+class GroupInputs:
+    '''All the inputs, claimed as one lgpio group so they are read with a single group_read.
+
+    A thread polls the group and hands each change to the event loop as one callback, which
+    updates the levels and fires the edges. Reading an input's level uses the last read, so
+    doesn't touch the hardware at all.
+
+    Polling costs one group_read every poll_interval seconds, whether anything changes or not:
+    at the default of 1ms that is 1000 reads a second, a few percent of a pi's core, in
+    exchange for seeing an edge within 1ms (and one call_soon_threadsafe per change). A longer
+    interval (--poll-interval) costs less and reacts more slowly.'''
+
+    def __init__(self, lgpio, handle, gpios: list[int], active_low=True, poll_interval=0.001):
+        self.lgpio = lgpio
+        self.handle = handle
+        self.gpios = gpios
+        self.active_low = active_low
+        self.poll_interval = poll_interval
+        lgpio.group_claim_input(handle, gpios, lgpio.SET_PULL_UP if active_low else 0)
+        self.levels = self._read()
+        self.inputs = [GroupInput(self, 1 << n) for n in range(len(gpios))]
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _read(self) -> int:
+        '''Read the group, with bit n set when input n is active'''
+        _, bits = self.lgpio.group_read(self.handle, self.gpios[0])
+        if self.active_low:
+            bits = ~bits & ((1 << len(self.gpios)) - 1)
+        return bits
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._thread = threading.Thread(target=self._poll, name='lgpio group poll', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _poll(self):
+        last = self.levels
+        while not self._stop.wait(self.poll_interval):
+            levels = self._read()
+            if levels != last:
+                self._loop.call_soon_threadsafe(self.update, levels)
+                last = levels
+
+    def update(self, levels: int):
+        '''Take a new reading of the group, firing the edge callbacks of what changed'''
+        changed = levels ^ self.levels
+        self.levels = levels
+        for group_input in self.inputs:
+            if changed & group_input.bit:
+                # One edge the lift logic won't take mustn't lose the others in this reading.
+                try:
+                    group_input._edge(bool(levels & group_input.bit))
+                except Exception as exc:
+                    asyncio.get_running_loop().call_exception_handler({
+                        'message': 'Exception in edge callback',
+                        'exception': exc,
+                    })
+
+
+class GroupInput(Input):
+    def __init__(self, group: GroupInputs, bit: int):
+        self.group = group
+        self.bit = bit
+
+    def __call__(self):
+        return bool(self.group.levels & self.bit)
+
+    def _edge(self, active):
+        self._notify_edge(rising=active)
+        callback = self.rising_edge_callback if active else self.falling_edge_callback
+        if callback is not None:
+            callback()
+
+
+class GroupOutputs:
+    '''All the outputs, claimed as one lgpio group.
+
+    Changes are collected and written with a single group_write once the current event loop
+    callback has finished, so all the relays one transition changes (like both door locks)
+    switch together. Turning off any of the immediate_off bits (the motor relays) doesn't wait
+    behind the callbacks already queued on the loop: it is written straight away, with
+    whatever else is waiting. Outside an event loop changes are written straight away.
+
+    The initial bits are claimed on, the rest off.'''
+
+    def __init__(self, lgpio, handle, gpios: list[int], active_low=True, immediate_off: int = 0,
+                 initial: int = 0):
+        self.lgpio = lgpio
+        self.handle = handle
+        self.gpios = gpios
+        self.active_low = active_low
+        self.values = initial
+        self.immediate_off = immediate_off
+        self._pending_mask = 0
+        self.writes = 0
+        lgpio.group_claim_output(handle, gpios, [self._level(bool(initial & (1 << n))) for n in range(len(gpios))])
+        self.outputs = [GroupOutput(self, 1 << n) for n in range(len(gpios))]
+
+    def _level(self, value: bool) -> int:
+        return int(value != self.active_low)
+
+    def set(self, bit: int, value: bool):
+        if bool(self.values & bit) == value:
+            return
+        if value:
+            self.values |= bit
+        else:
+            self.values &= ~bit
+        first = self._pending_mask == 0
+        self._pending_mask |= bit
+        if not value and bit & self.immediate_off:
+            self.flush()
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        if first:
+            loop.call_soon(self.flush)
+
+    def flush(self):
+        if self._pending_mask == 0:
+            return
+        bits = self.values
+        if self.active_low:
+            bits = ~bits & ((1 << len(self.gpios)) - 1)
+        self.lgpio.group_write(self.handle, self.gpios[0], bits, self._pending_mask)
+        self._pending_mask = 0
+        self.writes += 1
+
+
+class GroupOutput(Output):
+    def __init__(self, group: GroupOutputs, bit: int):
+        self.group = group
+        self.bit = bit
+
+    @property
+    def value(self):
+        return bool(self.group.values & self.bit)
+
+    def on(self):
+        self.group.set(self.bit, True)
+
+    def off(self):
+        self.group.set(self.bit, False)
+
+
+class GroupLiftPins(LiftPins):
+    '''LiftPins with the inputs read, and the outputs written, as lgpio groups. Needs to be
+    created from the event loop.'''
+
+    def __init__(self, chip=0, output_pins: dict[str, str] = OUTPUT_PINS,
+                 input_pins: dict[str, str] = INPUT_PINS, poll_interval=0.001, lgpio=None):
+        if lgpio is None:
+            import lgpio
+        self.lgpio = lgpio
+        self.handle = lgpio.gpiochip_open(chip)
+
+        motors = sum(1 << n for n, name in enumerate(output_pins) if name in ('drive_lift_up', 'drive_lift_down'))
+        locks = sum(1 << n for n, name in enumerate(output_pins) if name in LOCKS)
+        self.outputs = GroupOutputs(lgpio, self.handle, [bcm(pin) for pin in output_pins.values()],
+            immediate_off=motors, initial=locks)
+        for name, output in zip(output_pins, self.outputs.outputs):
+            setattr(self, name, output)
+
+        self.inputs = GroupInputs(lgpio, self.handle, [bcm(pin) for pin in input_pins.values()],
+            poll_interval=poll_interval)
+        for name, group_input in zip(input_pins, self.inputs.inputs):
+            setattr(self, name, group_input)
+        self.inputs.start()
+
+    def close(self):
+        self.inputs.stop()
+        self.outputs.flush()
+        self.lgpio.group_free(self.handle, self.inputs.gpios[0])
+        self.lgpio.group_free(self.handle, self.outputs.gpios[0])
+        self.lgpio.gpiochip_close(self.handle)
@@ -2,16 +2,16 @@ import logging
 from dataclasses import dataclass
 from typing import Optional
 
-from asyncio import Task, create_task
-
 from statemachine import State
 from statemachine import StateMachine
 
 from .io import Input, Output
-from .util import run_later
+from .scheduler import LiftScheduler
 
 logger = logging.getLogger(__name__)
 
+# The inputs of LiftLogicModel, in the order used wherever they are packed into a bitmask.
+MODEL_INPUTS = ('estop1', 'estop2', 'lower_limit', 'upper_limit', 'upper_door_closed', 'lower_door_closed')
 
 @dataclass
 class LiftLogicModel:
@@ -28,9 +28,18 @@ class LiftLogicModel:
     lock_door_bottom: Output
 
     safety_time: int = 23
+    # If set, used instead of safety_time when going up or down. See trip_times.TripTimes.
+    safety_time_up: Optional[float] = None
+    safety_time_down: Optional[float] = None
+
+    # The lift's deadlines are kept in scheduler under (name, ...). Lifts can share a
+    # scheduler as long as they have different names.
+    name: str = 'lift'
+    scheduler: Optional[LiftScheduler] = None
     
     def __post_init__(self):
-        self.safety_timer=None
+        if self.scheduler is None:
+            self.scheduler = LiftScheduler()
 
 
 class LiftLogicMachine(StateMachine):
@@ -73,7 +82,10 @@ class LiftLogicMachine(StateMachine):
     
 
     def on_enter_state(self, event, state):
-        logging.info(f"Entering '{state.id}' state from '{event}' event.")
+        # This runs on every transition, so nothing is formatted unless it is going to be logged.
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Entering '%s' state from '%s' event.", state.id, event,
+                extra={'lift': self.model.name, 'state': state.id, 'event': event})
 
     def is_top_limit_active(self):
         return self.model.upper_limit()
@@ -82,31 +94,33 @@ class LiftLogicMachine(StateMachine):
         return self.model.lower_limit()
 
     def safe_to_move(self):
-        if self.model.estop1() == True:
-            return False
-        if self.model.estop2() == True:
-            return False
-        if self.model.lower_door_closed() == False:
-            return False
-        if self.model.upper_door_closed() == False:
-            return False
-        return True
+        # All four are read to move, so I keep them for log_unsafe_to_move() rather than
+        # reading the pins again just for the message.
+        model = self.model
+        self._sampled = sampled = (model.estop1(), model.estop2(), model.lower_door_closed(), model.upper_door_closed())
+        return not (sampled[0] == True or sampled[1] == True or sampled[2] == False or sampled[3] == False)
+
+    def _sampled_inputs(self) -> tuple:
+        '''estop1, estop2, lower_door_closed and upper_door_closed, as safe_to_move() last saw them'''
+        return self._sampled
 
     def log_unsafe_to_move(self):
-        logger.info(f"Not safe to move. Estops=[{self.model.estop1()} {self.model.estop2()}] lower_door_closed={self.model.lower_door_closed()}, upper_door_closed={self.model.upper_door_closed()}")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Not safe to move. Estops=[%s %s] lower_door_closed=%s, upper_door_closed=%s",
+                *self._sampled_inputs(), extra={'lift': self.model.name})
 
     def start_rising(self):
-        self.model.safety_timer = create_task(run_later(delay=self.model.safety_time, callback=self.safety_timeout))
+        safety_time = self.model.safety_time_up or self.model.safety_time
+        self.model.scheduler.schedule((self.model.name, 'safety_timeout'), safety_time, self.safety_timeout)
         self.model.raise_lift.on()
 
     def start_lowering(self):
-        self.model.safety_timer = create_task(run_later(delay=self.model.safety_time,callback=self.safety_timeout))
+        safety_time = self.model.safety_time_down or self.model.safety_time
+        self.model.scheduler.schedule((self.model.name, 'safety_timeout'), safety_time, self.safety_timeout)
         self.model.lower_lift.on()
 
     def stop(self):
-        if self.model.safety_timer is not None:
-            self.model.safety_timer.cancel()
-            self.model.safety_timer = None
+        self.model.scheduler.cancel((self.model.name, 'safety_timeout'))
         self.model.lower_lift.off()
         self.model.raise_lift.off()
 
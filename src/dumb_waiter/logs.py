@@ -0,0 +1,94 @@
+'''Logging that keeps the event loop away from the disk, and from journald.
+
+start_logging() puts a queue handler on the root logger, so a log call on the event loop
+only puts the record on a queue. The message is formatted, and written, by a QueueListener's
+thread. On the control path log with %-style arguments, not f-strings, so a message that
+isn't going to be logged is never formatted at all.'''
+import atexit
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Attributes a log call can give in extra, that are sent to journald as fields of their own
+JOURNAL_FIELDS = ('lift', 'state', 'event')
+
+_PRIORITIES = {
+    logging.CRITICAL: 2,
+    logging.ERROR: 3,
+    logging.WARNING: 4,
+    logging.INFO: 6,
+    logging.DEBUG: 7,
+}
+
+
+class LazyQueueHandler(QueueHandler):
+    '''A QueueHandler that leaves formatting the message to the listener's thread.
+
+    The standard one formats the message before queueing it, so the record can be pickled,
+    which is the work we want off the event loop. So the arguments of a log call mustn't be
+    changed after the call.'''
+
+    def prepare(self, record):
+        return record
+
+
+class JournalHandler(logging.Handler):
+    '''Sends records to journald with structured fields: PRIORITY, LOGGER, CODE_FILE and so
+    on, and LIFT, STATE and EVENT if the log call gave them in extra (see JOURNAL_FIELDS).
+
+    Needs python-systemd, unless send (with the signature of systemd.journal.send) is given.'''
+
+    def __init__(self, identifier: str = 'dumb_waiter', send: Optional[Callable] = None):
+        super().__init__()
+        if send is None:
+            from systemd.journal import send
+        self.send = send
+        self.identifier = identifier
+
+    def emit(self, record):
+        try:
+            fields = {name.upper(): str(getattr(record, name)) for name in JOURNAL_FIELDS if hasattr(record, name)}
+            self.send(
+                self.format(record),
+                PRIORITY=str(_PRIORITIES.get(record.levelno, 6)),
+                LOGGER=record.name,
+                CODE_FILE=record.pathname,
+                CODE_LINE=str(record.lineno),
+                CODE_FUNC=record.funcName,
+                THREAD_NAME=record.threadName,
+                SYSLOG_IDENTIFIER=self.identifier,
+                **fields,
+            )
+        except Exception:
+            self.handleError(record)
+
+
+def start_logging(level=logging.INFO, journald: bool = False, stream=None) -> QueueListener:
+    '''Log everything at level or above through a queue, to journald if asked for and
+    python-systemd is installed, otherwise to stream (stderr by default). The listener is
+    stopped, flushing the queue, when the process exits.'''
+    handler = None
+    missing = None
+    if journald:
+        try:
+            handler = JournalHandler()
+        except ImportError as error:
+            missing = error
+    if handler is None:
+        handler = logging.StreamHandler(stream if stream is not None else sys.stderr)
+        handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+
+    records = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(LazyQueueHandler(records))
+    listener = QueueListener(records, handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    if missing is not None:
+        logger.warning("Logging to stderr, python-systemd isn't installed for journald: %r", missing)
+    return listener
@@ -0,0 +1,26 @@
+'''Telling systemd how the lift is getting on, for a service with Type=notify (see
+systemd-user.service). Without python-systemd, as the protocol is one datagram.'''
+import logging
+import os
+import socket
+
+logger = logging.getLogger(__name__)
+
+
+def sd_notify(*messages: str) -> bool:
+    '''Send messages (like 'READY=1') to systemd, returning whether they were sent. Does
+    nothing if we weren't started by systemd with a notify socket.'''
+    address = os.environ.get('NOTIFY_SOCKET')
+    if not address:
+        return False
+    if address.startswith('@'):
+        # An abstract socket
+        address = '\0' + address[1:]
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM | socket.SOCK_CLOEXEC) as sock:
+            sock.connect(address)
+            sock.sendall('\n'.join(messages).encode())
+    except OSError as error:
+        logger.warning("Couldn't notify systemd of %s: %r", ', '.join(messages), error)
+        return False
+    return True
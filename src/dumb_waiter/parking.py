@@ -0,0 +1,169 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Callable, Optional
+
+from statemachine.exceptions import TransitionNotAllowed
+
+from .calls import FLOORS
+from .debounce import collapse
+from .io import Input
+
+logger = logging.getLogger(__name__)
+
+_AT = {'stopped_at_top': 'top', 'stopped_at_bottom': 'bottom'}
+
+
+class CallHistory:
+    '''How often the call button at each floor is pressed, for each hour of the day.
+
+    Each press decays the counts for its hour by decay, so habits that change are followed,
+    and the counts only reflect the last few hundred calls in each hour. With a path the
+    counts are loaded from there if it exists, and saved there save_delay seconds after a
+    call, from a thread, so a busy spell is one write and the lift logic isn't held up by the
+    disk. Calls in the save_delay before a crash are lost.'''
+
+    def __init__(self, path: Optional[str] = None, decay: float = 0.99, min_calls: float = 3,
+                 save_delay: float = 10):
+        self.path = path
+        self.decay = decay
+        self.min_calls = min_calls
+        self.save_delay = save_delay
+        self.counts: dict[str, list[float]] = {floor: [0.0] * 24 for floor in FLOORS}
+        # The task that saves the counts, and whether they have changed since it last did
+        self.writing: Optional[asyncio.Task] = None
+        self._unsaved = False
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def record(self, floor: str, when: float):
+        hour = time.localtime(when).tm_hour
+        for counts in self.counts.values():
+            counts[hour] *= self.decay
+        self.counts[floor][hour] += 1
+        if self.path is not None:
+            self.save_soon()
+
+    def likely(self, when: float) -> Optional[str]:
+        '''The floor most likely to call next at time when, or None if too few calls have been
+        seen around then to say. The hours either side count for half, to smooth out quiet hours.'''
+        hour = time.localtime(when).tm_hour
+        weights = {floor: counts[hour] + (counts[hour - 1] + counts[(hour + 1) % 24]) / 2
+                   for floor, counts in self.counts.items()}
+        if sum(weights.values()) < self.min_calls:
+            return None
+        return max(FLOORS, key=weights.get)
+
+    def save(self):
+        self._write_file(json.dumps(self.counts))
+
+    def save_soon(self):
+        '''Save the counts save_delay seconds from now, unless a save is already waiting. Outside
+        an event loop they are saved straight away.'''
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.save()
+            return
+        self._unsaved = True
+        if self.writing is None or self.writing.done():
+            self.writing = loop.create_task(self._write_unsaved())
+
+    async def _write_unsaved(self):
+        await asyncio.sleep(self.save_delay)
+        loop = asyncio.get_running_loop()
+        while self._unsaved:
+            self._unsaved = False
+            data = json.dumps(self.counts)
+            try:
+                await loop.run_in_executor(None, self._write_file, data)
+            except OSError as error:
+                logger.error("Couldn't save the call history to %s: %r", self.path, error)
+
+    def _write_file(self, data: str):
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as f:
+            f.write(data)
+        os.replace(temporary, self.path)
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                counts = json.load(f)
+            counts = {floor: [float(c) for c in counts[floor]] for floor in FLOORS}
+            if any(len(c) != 24 for c in counts.values()):
+                raise ValueError('Not 24 hours of counts')
+        except (OSError, ValueError, KeyError, TypeError) as error:
+            logger.warning("Ignoring the call history in %s, it couldn't be read: %r", self.path, error)
+            return
+        self.counts = counts
+
+
+class _Listener:
+    # Kept apart from IdleParking so python-statemachine can't hook any of its methods by name.
+    def __init__(self, parking: 'IdleParking'):
+        self.parking = parking
+
+    def after_transition(self, target):
+        self.parking._changed(target.id)
+
+
+class IdleParking:
+    '''Once the car has sat at a floor for idle_time seconds, with the doors closed, sends it
+    to the floor that CallHistory says is most likely to call next, so whoever calls next
+    doesn't have to wait for it.
+
+    The car is moved with the lift logic's call event, so it only goes if it is safe to, just
+    as if someone had pressed the button. Opening a door while it waits starts the wait again.
+    Run watch_calls() with the call buttons to teach the history.'''
+
+    def __init__(self, machine, history: CallHistory, idle_time: float = 60,
+                 clock: Callable[[], float] = time.time):
+        self.machine = machine
+        self.model = machine.model
+        self.history = history
+        self.idle_time = idle_time
+        self.clock = clock
+        self.parked = 0
+        self._key = (self.model.name, 'park')
+        machine.add_listener(_Listener(self))
+
+    def _changed(self, state: str):
+        # This includes a door opening, which leaves the car where it is.
+        if state in _AT:
+            self.model.scheduler.schedule(self._key, self.idle_time, self._park)
+        else:
+            self.model.scheduler.cancel(self._key)
+
+    def _park(self):
+        at = _AT.get(self.machine.current_state.id)
+        if at is None:
+            return
+        if not (self.model.upper_door_closed() and self.model.lower_door_closed()):
+            self.model.scheduler.schedule(self._key, self.idle_time, self._park)
+            return
+        floor = self.history.likely(self.clock())
+        if floor is None or floor == at:
+            return
+        logger.info("Parking %s at the %s", self.model.name, floor)
+        try:
+            self.machine.call()
+        except TransitionNotAllowed as error:
+            logger.info("Couldn't park %s: %s", self.model.name, error)
+            return
+        self.parked += 1
+
+    async def watch_calls(self, call_top: Input, call_bottom: Input, call_holdoff: float = 0):
+        '''Teach the history from the call buttons. Presses of a button within call_holdoff
+        seconds of each other are one call, as they are to the lift logic (see LiftPins.wire_up).'''
+        async def watch(floor, pin):
+            record = collapse(lambda: self.history.record(floor, self.clock()), call_holdoff,
+                name=f'call_{floor}')
+            with pin.edges() as edges:
+                async for edge in edges:
+                    # The buttons call on the falling edge.
+                    if not edge.rising:
+                        record()
+        await asyncio.gather(watch('top', call_top), watch('bottom', call_bottom))
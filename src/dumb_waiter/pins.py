@@ -0,0 +1,184 @@
+import asyncio
+import time
+from typing import TYPE_CHECKING, Callable, Optional
+
+from gpiozero import OutputDevice, Button
+
+from .io import Input, Output
+from .logic import LiftLogicMachine, LiftLogicModel
+
+# Only needed with the options that use them, so they are imported then rather than before
+# the doors are locked. See --startup-profile.
+if TYPE_CHECKING:
+    from .calls import RegisteredCalls
+    from .dispatcher import EdgeDispatcher
+    from .latency import LatencyMonitor
+
+
+class OutPin(Output):
+    def __init__(self, pin, initial_value=False, active_high=True, monitor: Optional['LatencyMonitor'] = None):
+        self.dev = OutputDevice(pin=pin, initial_value=initial_value, active_high=active_high)
+        self.monitor = monitor
+
+    @property
+    def value(self):
+        return self.dev.value
+
+    def on(self):
+        if self.monitor is not None and not self.dev.value:
+            self.dev.on()
+            self.monitor.output_changed()
+            return
+        self.dev.on()
+
+    def off(self):
+        if self.monitor is not None and self.dev.value:
+            self.dev.off()
+            self.monitor.output_changed()
+            return
+        self.dev.off()
+
+class InPin(Input):
+    def __init__(self, pin, pull_up = False, name=None, monitor: Optional['LatencyMonitor'] = None,
+                 bounce_time: Optional[float] = 0.01, dispatcher: Optional['EdgeDispatcher'] = None):
+        # bounce_time=None leaves gpiozero passing on every edge, for debouncing on the event
+        # loop instead (see debounce.py).
+        self.dev = Button(pin=pin, bounce_time=bounce_time, pull_up=pull_up)
+        self.main_loop = asyncio.get_running_loop()
+        # Edges get to the loop through the dispatcher if there is one, shared with other pins.
+        self.post = dispatcher.post if dispatcher is not None else self.main_loop.call_soon_threadsafe
+        self.name = name or str(pin)
+        self.monitor = monitor
+        self._falling_edge_callback: Optional[Callable] = None
+        self._rising_edge_callback: Optional[Callable] = None
+
+        # gpio creates a new thread which executes the callbacks. I want the callbacks, and
+        # anything waiting for an edge, to run in the main thread.
+        self.dev.when_activated = lambda: self._call_soon_wrapper(True)
+        self.dev.when_deactivated = lambda: self._call_soon_wrapper(False)
+
+    def __call__(self):
+        return self.dev.value
+
+    @property
+    def falling_edge_callback(self):
+        return self._falling_edge_callback
+
+    @falling_edge_callback.setter
+    def falling_edge_callback(self, value: Optional[Callable]):
+        self._falling_edge_callback = value
+
+    @property
+    def rising_edge_callback(self):
+        return self._rising_edge_callback
+
+    @rising_edge_callback.setter
+    def rising_edge_callback(self, value: Optional[Callable]):
+        self._rising_edge_callback = value
+
+    def _call_soon_wrapper(self, rising):
+        edge_ns = time.monotonic_ns()
+        callback = self._rising_edge_callback if rising else self._falling_edge_callback
+        if self.monitor is not None and callback is not None:
+            self.post(self.monitor.run_edge, self.name, edge_ns, lambda: self._edge(rising, edge_ns))
+            return
+        self.post(self._edge, rising, edge_ns)
+
+    def _edge(self, rising, edge_ns):
+        # The loop's clock is time.monotonic(), so the edge keeps the time gpio saw it.
+        self._notify_edge(rising, edge_ns / 1e9)
+        callback = self._rising_edge_callback if rising else self._falling_edge_callback
+        if callback is not None:
+            callback()
+
+
+# Where the lift is wired to on the raspberry pi. The outputs drive relays that are active
+# low, and the inputs are switches to ground, using the pi's pull ups.
+OUTPUT_PINS = {
+    'drive_lift_up': "BOARD7",
+    'drive_lift_down': "BOARD11",
+    'lock_door_top': "BOARD31",
+    'lock_door_bottom': "BOARD33",
+}
+# The outputs that are on from the start
+LOCKS = ('lock_door_top', 'lock_door_bottom')
+INPUT_PINS = {
+    'call_pb_top': "BOARD13",
+    'call_pb_bottom': "BOARD38",
+    'lower_limit': "BOARD15",
+    'upper_limit': "BOARD16",
+    'door_closed_level1': "BOARD18",
+    'door_closed_ground': "BOARD22",
+    'estop_top': "BOARD29",
+    'estop_bottom': "BOARD40",
+}
+
+
+class LiftPins:
+    '''The pins the lift is wired to on the raspberry pi. Needs to be created from the event
+    loop, as the InPins hand their edges to it.
+
+    The door locks are claimed on, so the doors are locked from the moment the pins are,
+    rather than once the lift logic starts.
+
+    If a LatencyMonitor is given every pin reports its edges and changes to it. bounce_time
+    is gpiozero's debouncing of every input. If a dispatcher is given the inputs hand their
+    edges to the loop through it.'''
+
+    def __init__(self, monitor: Optional['LatencyMonitor'] = None,
+                 output_pins: dict[str, str] = OUTPUT_PINS, input_pins: dict[str, str] = INPUT_PINS,
+                 bounce_time: Optional[float] = 0.01, dispatcher: Optional['EdgeDispatcher'] = None):
+        for name, pin in output_pins.items():
+            setattr(self, name, OutPin(pin, initial_value=name in LOCKS, active_high=False, monitor=monitor))
+        for name, pin in input_pins.items():
+            setattr(self, name, InPin(pin, pull_up=True, name=name, monitor=monitor, bounce_time=bounce_time,
+                dispatcher=dispatcher))
+
+    def model(self, safety_time, **kwargs) -> LiftLogicModel:
+        '''The model for the lift on these pins. Any other fields of LiftLogicModel (like name
+        and scheduler) can be passed on.'''
+        return LiftLogicModel(
+            estop1=self.estop_top,
+            estop2=self.estop_bottom,
+            lower_limit=self.lower_limit,
+            upper_limit=self.upper_limit,
+            upper_door_closed=self.door_closed_level1,
+            lower_door_closed=self.door_closed_ground,
+            raise_lift=self.drive_lift_up,
+            lower_lift=self.drive_lift_down,
+            lock_door_top=self.lock_door_top,
+            lock_door_bottom=self.lock_door_bottom,
+            safety_time=safety_time,
+            **kwargs,
+        )
+
+    def wire_up(self, llm: LiftLogicMachine, call_holdoff: float = 0, calls: Optional['RegisteredCalls'] = None):
+        '''Wire up the triggers to the lift logic. The model's inputs are used rather than
+        the pins, so if they have been wrapped (e.g. by cache_inputs()) the wrappers see the
+        edges first.
+
+        Presses of the call buttons within call_holdoff seconds of each other are one call.
+        With calls the buttons go through it, so a press while the car is moving is kept
+        until it arrives.'''
+        model = llm.model
+        if call_holdoff:
+            from .debounce import collapse
+        if calls is None:
+            call = lambda: llm.call()
+            if call_holdoff:
+                call = collapse(call, call_holdoff, name='call')
+            call_top = call_bottom = call
+        else:
+            call_top = lambda: calls.press('top')
+            call_bottom = lambda: calls.press('bottom')
+            if call_holdoff:
+                call_top = collapse(call_top, call_holdoff, name='call_top')
+                call_bottom = collapse(call_bottom, call_holdoff, name='call_bottom')
+        self.call_pb_top.falling_edge_callback = call_top
+        self.call_pb_bottom.falling_edge_callback = call_bottom
+        model.lower_limit.rising_edge_callback = lambda: llm.stop_lowering()
+        model.upper_limit.rising_edge_callback = lambda: llm.stop_rising()
+        model.upper_door_closed.falling_edge_callback = lambda: llm.door_opens()
+        model.lower_door_closed.falling_edge_callback = lambda: llm.door_opens()
+        model.estop1.rising_edge_callback = lambda: llm.estop_pressed()
+        model.estop2.rising_edge_callback = lambda: llm.estop_pressed()
@@ -0,0 +1,116 @@
+'''Running the controller as a real time process (see --realtime), so a busy pi adds less, and
+less variable, delay between a limit switch and the relay.
+
+Three steps, each of which is tried on its own and only logs a warning if it can't be done,
+usually for lack of privileges:
+
+- pin to one CPU, so the loop isn't moved between cores, losing its caches
+- SCHED_FIFO, so it runs as soon as it is woken, ahead of everything that isn't real time
+- mlockall(), so nothing it touches has to be paged back in first
+
+The CPU and scheduling policy are the calling thread's, and are inherited by threads it
+starts afterwards, so call enter_realtime() from the event loop's thread before starting the
+gpio threads, and after anything (like the logging thread) that shouldn't be real time.'''
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import time
+from typing import Optional
+
+from .latency import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+# From <sys/mman.h> on Linux
+MCL_CURRENT = 1
+MCL_FUTURE = 2
+
+
+def pin_to_cpu(cpu: Optional[int] = None) -> bool:
+    '''Run on cpu, by default the highest numbered one we are allowed, which is the least
+    likely to be busy with interrupts'''
+    if not hasattr(os, 'sched_setaffinity'):
+        logger.warning("Can't pin to a CPU on this system")
+        return False
+    if cpu is None:
+        cpu = max(os.sched_getaffinity(0))
+    try:
+        os.sched_setaffinity(0, {cpu})
+    except OSError as error:
+        logger.warning("Couldn't pin to CPU %d: %s", cpu, error)
+        return False
+    logger.info("Pinned to CPU %d", cpu)
+    return True
+
+
+def set_fifo(priority: int = 50) -> bool:
+    '''Ask for SCHED_FIFO at priority (1 to 99). Needs root, CAP_SYS_NICE, or an RLIMIT_RTPRIO
+    (LimitRTPRIO= in the service) of at least priority.'''
+    if not hasattr(os, 'sched_setscheduler'):
+        logger.warning("Can't ask for SCHED_FIFO on this system")
+        return False
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+    except PermissionError:
+        logger.warning("Not allowed SCHED_FIFO priority %d, needs root, CAP_SYS_NICE or LimitRTPRIO", priority)
+        return False
+    except OSError as error:
+        logger.warning("Couldn't get SCHED_FIFO priority %d: %s", priority, error)
+        return False
+    logger.info("Running SCHED_FIFO at priority %d", priority)
+    return True
+
+
+def lock_memory() -> bool:
+    '''mlockall() what is mapped now and in future. Needs root, CAP_IPC_LOCK, or a big enough
+    RLIMIT_MEMLOCK (LimitMEMLOCK= in the service), as once it has worked memory that can't be
+    locked can't be had at all.'''
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        mlockall = libc.mlockall
+    except (OSError, AttributeError) as error:
+        logger.warning("Can't lock memory on this system: %s", error)
+        return False
+    if mlockall(MCL_CURRENT | MCL_FUTURE) != 0:
+        error = ctypes.get_errno()
+        if error in (errno.EPERM, errno.ENOMEM):
+            logger.warning("Not allowed to lock memory (%s), needs root, CAP_IPC_LOCK or LimitMEMLOCK",
+                os.strerror(error))
+        else:
+            logger.warning("Couldn't lock memory: %s", os.strerror(error))
+        return False
+    logger.info("Memory locked")
+    return True
+
+
+def enter_realtime(cpu: Optional[int] = None, priority: int = 50) -> dict[str, bool]:
+    '''Take each of the steps, returning which worked'''
+    return {
+        'cpu': pin_to_cpu(cpu),
+        'fifo': set_fifo(priority),
+        'mlock': lock_memory(),
+    }
+
+
+def measure_jitter(duration: float = 1.0, interval: float = 0.001) -> LatencyHistogram:
+    '''How late sleeps of interval wake up, over duration seconds, in this thread'''
+    lateness = LatencyHistogram()
+    interval_ns = int(interval * 1e9)
+    end = time.monotonic_ns() + int(duration * 1e9)
+    while True:
+        started = time.monotonic_ns()
+        if started >= end:
+            return lateness
+        time.sleep(interval)
+        lateness.record(max(time.monotonic_ns() - started - interval_ns, 0))
+
+
+def self_test(duration: float = 5.0, cpu: Optional[int] = None, priority: int = 50) -> dict:
+    '''Measure the jitter of waking up, for duration seconds as we are and then for duration
+    seconds after entering real time, returning both summaries and which steps worked'''
+    before = measure_jitter(duration).summary()
+    steps = enter_realtime(cpu, priority)
+    after = measure_jitter(duration).summary()
+    return {'steps': steps, 'before': before, 'after': after}
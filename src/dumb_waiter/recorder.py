@@ -0,0 +1,223 @@
+'''A flight recorder for the lift: the last few thousand input edges, transitions and output
+changes, kept in memory and written to a file when something goes wrong.
+
+Records are two unsigned 64 bit slots in one preallocated array, the time.monotonic_ns() and
+a packed code, so recording one is a couple of stores with nothing to format or allocate.
+Names are only looked up when the file is decoded.
+
+The file is a magic number, a JSON header (the lift, why it was written, and the names of
+the inputs, outputs, events and states), then the records oldest first, 12 bytes each.'''
+import asyncio
+import json
+import logging
+import os
+import struct
+import time
+from array import array
+from time import monotonic_ns
+from typing import NamedTuple, Optional
+
+from .compiled import EVENTS, STATES
+from .io import Input, Output
+from .logic import LiftLogicModel
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'DWFR\x01'
+_RECORD = struct.Struct('<QI')
+
+# What a record is of
+EDGE, TRANSITION, OUTPUT = 1, 2, 3
+KINDS = {EDGE: 'edge', TRANSITION: 'transition', OUTPUT: 'output'}
+
+OUTPUTS = ('raise_lift', 'lower_lift', 'lock_door_top', 'lock_door_bottom')
+
+# Events that have the recorder written out
+DUMP_ON = ('safety_timeout', 'estop_pressed')
+
+
+class RecordedOutput(Output):
+    '''An output that records its changes in a FlightRecorder'''
+
+    def __init__(self, output: Output, recorder: 'FlightRecorder', index: int):
+        self.output = output
+        self.recorder = recorder
+        self._on = (OUTPUT << 24) | (index << 16) | 1
+        self._off = (OUTPUT << 24) | (index << 16)
+        self._value = bool(output.value)
+
+    @property
+    def value(self):
+        return self.output.value
+
+    def on(self):
+        if not self._value:
+            self._value = True
+            self.recorder.record(self._on)
+        self.output.on()
+
+    def off(self):
+        if self._value:
+            self._value = False
+            self.recorder.record(self._off)
+        self.output.off()
+
+
+class _Listener:
+    # Kept apart from FlightRecorder so python-statemachine can't hook any of its methods by name.
+    def __init__(self, recorder: 'FlightRecorder'):
+        self.recorder = recorder
+        self.events = {name: n for n, name in enumerate(EVENTS)}
+        self.states = {name: n for n, name in enumerate(STATES)}
+
+    def after_transition(self, event, source, target):
+        self.recorder.record((TRANSITION << 24) | (self.events[event] << 16)
+                             | (self.states[source.id] << 8) | self.states[target.id])
+        if event in DUMP_ON:
+            self.recorder._fault(event)
+
+
+class FlightRecorder:
+    '''Keeps the last capacity records (rounded up to a power of two) for one lift.
+
+    Use attach() to record a lift's inputs, transitions and outputs. With a directory it is
+    written there on a safety_timeout or estop, but no more than once every holdoff seconds,
+    and dump() writes it whenever asked (say on a signal).'''
+
+    def __init__(self, name: str = 'lift', capacity: int = 8192, directory: Optional[str] = None,
+                 holdoff: float = 5.0):
+        self.name = name
+        size = 1 << max(capacity - 1, 1).bit_length()
+        self.capacity = size
+        self.directory = directory
+        self.holdoff = holdoff
+        self.inputs: list[str] = []
+        self.count = 0
+        self._records = array('Q', bytes(16 * size))
+        self._mask = 2 * size - 1
+        self._last_dump: Optional[float] = None
+        # The last write dump_soon() started
+        self.writing: Optional[asyncio.Future] = None
+
+    def record(self, code: int):
+        i = (self.count << 1) & self._mask
+        records = self._records
+        records[i] = monotonic_ns()
+        records[i + 1] = code
+        self.count += 1
+
+    def attach(self, machine, inputs: dict[str, Input]):
+        '''Record the edges on inputs, and the transitions and output changes of machine'''
+        model: LiftLogicModel = machine.model
+        for name, pin in inputs.items():
+            index = len(self.inputs)
+            self.inputs.append(name)
+            rising = (EDGE << 24) | (index << 16) | 1
+            falling = (EDGE << 24) | (index << 16)
+            pin.tap_edges(lambda up, rising=rising, falling=falling: self.record(rising if up else falling))
+        for index, name in enumerate(OUTPUTS):
+            setattr(model, name, RecordedOutput(getattr(model, name), self, index))
+        machine.add_listener(_Listener(self))
+
+    def snapshot(self) -> list[tuple[int, int]]:
+        '''The records, oldest first, as (monotonic_ns, code)'''
+        records = self._records
+        pairs = [(records[i], records[i + 1]) for i in range(0, len(records), 2)]
+        if self.count < self.capacity:
+            return pairs[:self.count]
+        start = self.count & (self.capacity - 1)
+        return pairs[start:] + pairs[:start]
+
+    def encode(self, reason: str) -> bytes:
+        records = self.snapshot()
+        header = json.dumps({
+            'name': self.name,
+            'reason': reason,
+            'monotonic_ns': time.monotonic_ns(),
+            'time': time.time(),
+            'recorded': self.count,
+            'inputs': self.inputs,
+            'outputs': list(OUTPUTS),
+            'events': list(EVENTS),
+            'states': list(STATES),
+        }).encode()
+        body = b''.join(_RECORD.pack(t, code) for t, code in records)
+        return MAGIC + struct.pack('<I', len(header)) + header + body
+
+    def dump(self, reason: str) -> str:
+        '''Write what has been recorded to a new file in directory, returning its path'''
+        return self._write_file(reason, self.encode(reason))
+
+    def _fault(self, reason: str):
+        if self.directory is None:
+            return
+        now = time.monotonic()
+        if self._last_dump is not None and now - self._last_dump < self.holdoff:
+            return
+        self._last_dump = now
+        self.dump_soon(reason)
+
+    def dump_soon(self, reason: str) -> Optional[asyncio.Future]:
+        '''Like dump(), but the file is written from a thread if the event loop is running,
+        so the lift logic isn't held up by the disk. Returns the future for the write if so.'''
+        data = self.encode(reason)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is None:
+            self._write(reason, data)
+            return None
+        self.writing = loop.run_in_executor(None, self._write, reason, data)
+        return self.writing
+
+    def _write(self, reason: str, data: bytes):
+        try:
+            self._write_file(reason, data)
+        except OSError as error:
+            logger.error("Couldn't write the flight recorder for %s: %r", self.name, error)
+
+    def _write_file(self, reason: str, data: bytes) -> str:
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        path = os.path.join(self.directory, f'{self.name}-{stamp}-{reason}.dwfr')
+        n = 1
+        while os.path.exists(path):
+            path = os.path.join(self.directory, f'{self.name}-{stamp}-{reason}-{n}.dwfr')
+            n += 1
+        with open(path, 'wb') as f:
+            f.write(data)
+        logger.warning("Wrote the flight recorder for %s to %s", self.name, path)
+        return path
+
+
+class Record(NamedTuple):
+    time: float  # Seconds before the file was written
+    kind: str
+    description: str
+
+
+def decode(data: bytes) -> tuple[dict, list[Record]]:
+    '''Read a flight recorder file, returning its header and records'''
+    if not data.startswith(MAGIC):
+        raise ValueError('Not a flight recorder file')
+    offset = len(MAGIC)
+    (length,) = struct.unpack_from('<I', data, offset)
+    offset += 4
+    header = json.loads(data[offset:offset + length])
+    offset += length
+    if (len(data) - offset) % _RECORD.size:
+        raise ValueError('Flight recorder file is truncated')
+
+    records = []
+    for t, code in _RECORD.iter_unpack(data[offset:]):
+        kind, a, b, c = code >> 24, (code >> 16) & 0xff, (code >> 8) & 0xff, code & 0xff
+        if kind == EDGE:
+            description = f"{header['inputs'][a]} {'rising' if c else 'falling'}"
+        elif kind == TRANSITION:
+            description = f"{header['events'][a]}: {header['states'][b]} -> {header['states'][c]}"
+        elif kind == OUTPUT:
+            description = f"{header['outputs'][a]} {'on' if c else 'off'}"
+        else:
+            raise ValueError(f'Unknown record kind {kind}')
+        records.append(Record((t - header['monotonic_ns']) / 1e9, KINDS[kind], description))
+    return header, records
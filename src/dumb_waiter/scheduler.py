@@ -0,0 +1,79 @@
+import asyncio
+from typing import Callable, Hashable, Optional
+
+
+class Deadline:
+    '''Something to do at a time on the event loop's clock'''
+
+    __slots__ = ('key', 'when', 'callback', 'handle')
+
+    def __init__(self, key: Hashable, when: float, callback: Callable):
+        self.key = key
+        self.when = when
+        self.callback = callback
+        self.handle: Optional[asyncio.TimerHandle] = None
+
+    def __repr__(self):
+        return f'Deadline({self.key!r}, when={self.when:.3f})'
+
+
+class LiftScheduler:
+    '''Every deadline of one or more lifts (safety timeouts, holding doors, going idle, ...),
+    each a loop.call_at() handle rather than a task.
+
+    Deadlines are keyed, by convention (lift name, what), and there is only ever one for each
+    key: scheduling one replaces the last. A deadline only fires if it is still the one for its
+    key, so one that has been cancelled or replaced never fires, however close to its time it
+    was cancelled.'''
+
+    def __init__(self):
+        self._deadlines: dict[Hashable, Deadline] = {}
+
+    def schedule(self, key: Hashable, delay: float, callback: Callable) -> Deadline:
+        '''Call callback in delay seconds, instead of whatever was scheduled for key'''
+        self.cancel(key)
+        loop = asyncio.get_running_loop()
+        deadline = Deadline(key, loop.time() + delay, callback)
+        deadline.handle = loop.call_at(deadline.when, self._fire, deadline)
+        self._deadlines[key] = deadline
+        return deadline
+
+    def cancel(self, key: Hashable) -> bool:
+        '''Cancel the deadline for key, returning whether there was one'''
+        deadline = self._deadlines.pop(key, None)
+        if deadline is None:
+            return False
+        deadline.handle.cancel()
+        return True
+
+    def cancel_all(self):
+        for deadline in self._deadlines.values():
+            deadline.handle.cancel()
+        self._deadlines.clear()
+
+    def pending(self) -> dict[Hashable, float]:
+        '''The seconds left until each deadline, soonest first'''
+        if not self._deadlines:
+            return {}
+        now = asyncio.get_running_loop().time()
+        return {
+            deadline.key: deadline.when - now
+            for deadline in sorted(self._deadlines.values(), key=lambda d: d.when)
+        }
+
+    def __contains__(self, key: Hashable):
+        return key in self._deadlines
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def _fire(self, deadline: Deadline):
+        if self._deadlines.get(deadline.key) is not deadline:
+            return
+        loop = asyncio.get_running_loop()
+        if loop.time() < deadline.when:
+            # The loop runs timers up to its clock resolution early.
+            deadline.handle = loop.call_at(deadline.when, self._fire, deadline)
+            return
+        del self._deadlines[deadline.key]
+        deadline.callback()
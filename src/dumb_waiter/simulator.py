@@ -0,0 +1,219 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Optional
+
+from .fake import FakeLift
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class LiftPhysics:
+    '''The shape and timings of a simulated lift. Positions are in metres above the lower
+    limit switch, times are in seconds.'''
+
+    travel: float = 3.0  # Where the upper limit switch is
+    speed: float = 0.3
+    overtravel: float = 0.05  # How far past a limit switch the car can go before the buffer stops it
+    start_position: float = 1.5
+
+    door_open_delay: float = 2.0  # From the door unlocking until someone opens it
+    load_time: float = 5.0  # How long the door is held open
+    call_delay: float = 1.0  # From the door closing until the call button is pressed
+    recover_delay: float = 10.0  # From the lift stopping between floors until someone calls it again
+
+
+@dataclass
+class SimulationReport:
+    trips: int = 0
+    safety_timeouts: int = 0
+    faults: list[str] = field(default_factory=list)
+    elapsed: float = 0.0  # In virtual seconds
+
+    @property
+    def trips_per_hour(self) -> float:
+        if self.elapsed == 0:
+            return 0.0
+        return self.trips * 3600 / self.elapsed
+
+
+class _Listener:
+    # python-statemachine looks up callbacks on listeners by name, so this is kept separate
+    # from LiftSimulator to make sure none of the simulator's methods get hooked by accident.
+    def __init__(self, simulator: 'LiftSimulator'):
+        self.simulator = simulator
+
+    def on_enter_state(self, event, state):
+        self.simulator._entered(event, state.id)
+
+
+class LiftSimulator:
+    '''Moves a FakeLift's car in response to its motor outputs, and works its limit switches,
+    doors and call buttons the way the lift and the people using it would.
+
+    Everything is scheduled on the running event loop, so on a VirtualTimeLoop it runs as
+    fast as the state machine can be driven.'''
+
+    def __init__(self, lift: FakeLift, physics: Optional[LiftPhysics] = None):
+        self.lift = lift
+        self.physics = physics or LiftPhysics()
+        self.position = self.physics.start_position
+        self.direction = 0
+        self.report = SimulationReport()
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._since = 0.0
+        self._crossing: Optional[asyncio.TimerHandle] = None
+        self._actions: set[asyncio.TimerHandle] = set()
+        self._done: Optional[asyncio.Future] = None
+        self._target_trips = 0
+
+        lift.outputs['raise_lift'].change_callback = self._motor_changed
+        lift.outputs['lower_lift'].change_callback = self._motor_changed
+        lift.machine.add_listener(_Listener(self))
+
+    def start(self):
+        '''Put the switches where the car is. Needs to be called from the event loop.'''
+        self._loop = asyncio.get_running_loop()
+        self._since = self._loop.time()
+        self.lift.close_doors()
+        self._update_limits()
+
+    async def run(self, trips: int, timeout: Optional[float] = None) -> SimulationReport:
+        '''Keep the lift busy until it has made another `trips` trips, or `timeout` virtual
+        seconds have gone by.'''
+        if self._loop is None:
+            self.start()
+        loop = self._loop
+        started = loop.time()
+        self._target_trips = self.report.trips + trips
+        self._done = loop.create_future()
+        self._after(self.physics.call_delay, self._press_call, 'bottom')
+        if timeout is not None:
+            give_up = loop.call_later(timeout, self._finish)
+        try:
+            await self._done
+        finally:
+            if timeout is not None:
+                give_up.cancel()
+            for handle in self._actions:
+                handle.cancel()
+            self._actions.clear()
+            self.report.elapsed += loop.time() - started
+        return self.report
+
+    def _finish(self):
+        if self._done is not None and not self._done.done():
+            self._done.set_result(None)
+
+    def _after(self, delay, callback, *args):
+        def fire():
+            self._actions.discard(handle)
+            callback(*args)
+        handle = self._loop.call_later(delay, fire)
+        self._actions.add(handle)
+
+    # The car
+
+    def _now(self) -> float:
+        return self._loop.time()
+
+    def _position_now(self) -> float:
+        p = self.position + self.direction * self.physics.speed * (self._now() - self._since)
+        return min(max(p, -self.physics.overtravel), self.physics.travel + self.physics.overtravel)
+
+    def _motor_changed(self):
+        if self._loop is None:
+            return
+        raise_lift = self.lift.outputs['raise_lift'].value
+        lower_lift = self.lift.outputs['lower_lift'].value
+        self.position = self._position_now()
+        self._since = self._now()
+        if raise_lift and lower_lift:
+            self.report.faults.append(f'{self._now():.3f}: raise_lift and lower_lift both on')
+            self.direction = 0
+        elif raise_lift:
+            self.direction = 1
+        elif lower_lift:
+            self.direction = -1
+        else:
+            self.direction = 0
+        self._update_limits()
+
+    def _update_limits(self):
+        if self._crossing is not None:
+            self._crossing.cancel()
+            self._crossing = None
+        self.position = self._position_now()
+        self._since = self._now()
+
+        # Schedule the next change before touching the switches, as the state machine reacts
+        # to the switches straight away and may well turn the motor off (and call back into here).
+        delay = self._time_to_next_boundary()
+        if delay is not None:
+            self._crossing = self._loop.call_later(delay, self._update_limits)
+
+        top = self.physics.travel
+        if self.position >= top + self.physics.overtravel and self.direction > 0:
+            self.report.faults.append(f'{self._now():.3f}: car hit the top buffer')
+        if self.position <= -self.physics.overtravel and self.direction < 0:
+            self.report.faults.append(f'{self._now():.3f}: car hit the bottom buffer')
+        self._set_input('upper_limit', self.position >= top)
+        self._set_input('lower_limit', self.position <= 0)
+
+    def _time_to_next_boundary(self) -> Optional[float]:
+        top = self.physics.travel
+        overtravel = self.physics.overtravel
+        if self.direction > 0:
+            ahead = [b - self.position for b in (0.0, top, top + overtravel) if b > self.position]
+        elif self.direction < 0:
+            ahead = [self.position - b for b in (top, 0.0, -overtravel) if b < self.position]
+        else:
+            return None
+        if not ahead:
+            return None
+        # A little extra so the car is strictly past the boundary when we get there.
+        return min(ahead) / self.physics.speed + 1e-6
+
+    def _set_input(self, name, value):
+        if value:
+            self.lift.inputs[name].on()
+        else:
+            self.lift.inputs[name].off()
+
+    # The people using it
+
+    def _entered(self, event, state):
+        if self._done is None or self._done.done():
+            return
+        if state in ('stopped_at_top', 'stopped_at_bottom'):
+            self.report.trips += 1
+            if self.report.trips >= self._target_trips:
+                self._finish()
+                return
+            floor = 'top' if state == 'stopped_at_top' else 'bottom'
+            self._after(self.physics.door_open_delay, self._open_door, floor)
+        elif state == 'stopped' and event != 'initialise':
+            if event == 'safety_timeout':
+                self.report.safety_timeouts += 1
+            self._after(self.physics.recover_delay, self._press_call, 'bottom')
+
+    def _open_door(self, floor):
+        lock = 'lock_door_top' if floor == 'top' else 'lock_door_bottom'
+        if self.lift.outputs[lock].value:
+            # The car has gone, there is nothing to load.
+            return
+        self._set_input(self._door(floor), False)
+        self._after(self.physics.load_time, self._close_door, floor)
+
+    def _close_door(self, floor):
+        self._set_input(self._door(floor), True)
+        self._after(self.physics.call_delay, self._press_call, floor)
+
+    def _press_call(self, floor):
+        self.lift.press('call_top' if floor == 'top' else 'call_bottom')
+
+    @staticmethod
+    def _door(floor):
+        return 'upper_door_closed' if floor == 'top' else 'lower_door_closed'
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import tomllib
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from .calls import RegisteredCalls
+from .dispatcher import EdgeDispatcher
+from .input_state import InputState, cache_inputs
+from .latency import LatencyMonitor
+from .logic import LiftLogicMachine, LiftLogicModel
+from .pins import INPUT_PINS, OUTPUT_PINS, LiftPins
+from .scheduler import LiftScheduler
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class LiftConfig:
+    name: str
+    safety_time: float = 23
+    input_pins: dict[str, str] = field(default_factory=lambda: dict(INPUT_PINS))
+    output_pins: dict[str, str] = field(default_factory=lambda: dict(OUTPUT_PINS))
+
+
+def load_config(path: str) -> list[LiftConfig]:
+    '''Read the lifts from a TOML file like:
+
+        safety_time = 23            # for every lift that doesn't set its own
+
+        [[lift]]
+        name = "kitchen"
+        [lift.input_pins]
+        call_pb_top = "BOARD13"
+        ...
+        [lift.output_pins]
+        drive_lift_up = "BOARD7"
+        ...
+
+    A lift without input_pins or output_pins uses the pins in pins.py, which only works for
+    one lift on each pi.'''
+    with open(path, 'rb') as f:
+        config = tomllib.load(f)
+    return parse_config(config)
+
+
+def parse_config(config: dict) -> list[LiftConfig]:
+    lifts = []
+    for n, lift in enumerate(config.get('lift', [])):
+        lift = dict(lift)
+        lift.setdefault('name', f'lift{n}')
+        lift.setdefault('safety_time', config.get('safety_time', 23))
+        for pins, defaults in (('input_pins', INPUT_PINS), ('output_pins', OUTPUT_PINS)):
+            if pins in lift:
+                missing = set(defaults) - set(lift[pins])
+                if missing:
+                    raise ValueError(f"Lift {lift['name']} is missing {pins} {', '.join(sorted(missing))}")
+        lifts.append(LiftConfig(**lift))
+    if not lifts:
+        raise ValueError('No lifts configured')
+
+    names = [lift.name for lift in lifts]
+    if len(set(names)) != len(names):
+        raise ValueError(f'Lift names must be different, got {names}')
+    used = {}
+    for lift in lifts:
+        for pin in (*lift.input_pins.values(), *lift.output_pins.values()):
+            if pin in used:
+                raise ValueError(f'Pin {pin} is used by both {used[pin]} and {lift.name}')
+            used[pin] = lift.name
+    return lifts
+
+
+class Lift:
+    '''One lift of a Site, with its own pins, model, lift logic and input state.'''
+
+    def __init__(self, config: LiftConfig, pins, scheduler: LiftScheduler, compiled=False,
+                 hold_time: Optional[float] = None):
+        self.name = config.name
+        self.pins = pins
+        self.model: LiftLogicModel = pins.model(safety_time=config.safety_time, name=config.name,
+            scheduler=scheduler)
+        self.input_state: InputState = cache_inputs(self.model)
+        if compiled:
+            from .compiled import CompiledLiftLogic
+            self.machine = CompiledLiftLogic(self.model)
+        else:
+            self.machine = LiftLogicMachine(self.model)
+        self.calls: Optional[RegisteredCalls] = None
+        if hold_time is not None:
+            self.calls = RegisteredCalls(self.machine, hold_time=hold_time)
+
+    @property
+    def state(self) -> str:
+        return self.machine.current_state.id
+
+
+class Site:
+    '''Several lifts, run from one process on one event loop. Needs to be created from the
+    event loop.
+
+    All the lifts' edges reach the loop through one EdgeDispatcher, and all their deadlines
+    are kept in one LiftScheduler, under each lift's name. With a hold_time each lift's call
+    buttons go through a RegisteredCalls. Apart from that each lift is on its
+    own: an exception from one lift's callbacks is logged and doesn't stop the others.'''
+
+    def __init__(self, configs: list[LiftConfig], compiled=False, monitor: Optional[LatencyMonitor] = None,
+                 make_pins: Optional[Callable[..., LiftPins]] = None, hold_time: Optional[float] = None):
+        self.dispatcher = EdgeDispatcher(asyncio.get_running_loop())
+        self.scheduler = LiftScheduler()
+        if make_pins is None:
+            make_pins = LiftPins
+        self.lifts: dict[str, Lift] = {}
+        for config in configs:
+            pins = make_pins(monitor=monitor, output_pins=config.output_pins, input_pins=config.input_pins,
+                dispatcher=self.dispatcher)
+            self.lifts[config.name] = Lift(config, pins, self.scheduler, compiled=compiled, hold_time=hold_time)
+
+    def start(self):
+        for lift in self.lifts.values():
+            lift.pins.wire_up(lift.machine, calls=lift.calls)
+            lift.machine.initialise()
+
+    async def reconcile_forever(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            for lift in self.lifts.values():
+                try:
+                    lift.input_state.reconcile()
+                except Exception as exc:
+                    asyncio.get_running_loop().call_exception_handler({
+                        'message': f'Exception reconciling the inputs of {lift.name}',
+                        'exception': exc,
+                    })
@@ -0,0 +1,325 @@
+import asyncio
+import logging
+import os
+import re
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Each record is a header, then the topic, a nul, and the payload. The crc covers the
+# topic and payload, so a record torn by a crash or power cut is spotted and dropped.
+_HEADER = struct.Struct('<HBII')
+_MAGIC = 0x5744
+_BYTES_PAYLOAD = 1
+
+_SEGMENT = re.compile(r'^spool-(\d{8})\.log$')
+_DRAINED = re.compile(r'^spool-(\d{8})\.drained$')
+
+
+def encode(topic: str, payload: Union[str, bytes]) -> bytes:
+    flags = 0
+    if isinstance(payload, bytes):
+        flags |= _BYTES_PAYLOAD
+    else:
+        payload = str(payload).encode()
+    body = topic.encode() + b'\0' + payload
+    return _HEADER.pack(_MAGIC, flags, len(body), zlib.crc32(body)) + body
+
+
+def decode(data: bytes, offset: int = 0):
+    '''Yield (offset after the record, topic, payload) for each good record, stopping at the
+    first bad one'''
+    while offset + _HEADER.size <= len(data):
+        magic, flags, length, crc = _HEADER.unpack_from(data, offset)
+        start = offset + _HEADER.size
+        body = data[start:start + length]
+        if magic != _MAGIC or len(body) != length or zlib.crc32(body) != crc:
+            return
+        topic, _, payload = body.partition(b'\0')
+        offset = start + length
+        yield offset, topic.decode(), payload if flags & _BYTES_PAYLOAD else payload.decode()
+
+
+class Spool:
+    '''Messages waiting to be published, kept on disk so they survive a broker outage, a
+    restart, or the power going off.
+
+    The spool is a directory of segment files, each up to half of max_bytes. Messages are
+    appended to the newest one. When it is full a new one is started, and the oldest segments
+    are thrown away (losing the oldest messages) to keep the directory under max_bytes, even
+    while the spool is being drained. The segment being appended to is kept open, and is only
+    fsynced every sync_interval seconds (or sync_every messages), as SD cards don't cope well
+    with lots of small syncs. A crash can lose the last sync_interval of messages, and leave a
+    torn record at the end, which is dropped.
+
+    All the reading, writing and syncing is done, in order, by the spool's own thread, so a
+    slow SD card doesn't hold up the event loop: append() only hands the message over. The
+    count of messages waiting is kept on the event loop. Outside an event loop everything is
+    done straight away. The spool is read when it is made, to count what is waiting.
+
+    How far each segment has been drained is saved next to it after every batch, so a restart
+    carries on from there. Delivery is still at least once: a batch that was sent, but not
+    saved as sent before a crash, is sent again.'''
+
+    def __init__(self, directory: str, max_bytes: int = 4 * 1024 * 1024, sync_interval: float = 1.0,
+                 sync_every: int = 500):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.segment_bytes = max_bytes // 2
+        self.sync_interval = sync_interval
+        self.sync_every = sync_every
+        os.makedirs(directory, exist_ok=True)
+
+        # Messages not yet drained, only changed on the event loop.
+        self.pending = 0
+        self.dropped = 0
+        self._sync_handle: Optional[asyncio.TimerHandle] = None
+        self._draining = False
+        self._closed = False
+        self._thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix='spool')
+
+        # Only used from the spool's thread once it is made: the segments, how far through
+        # each draining has got, and the messages written since the last sync.
+        self._drained_to: dict[int, int] = {}
+        self._unsynced = 0
+        self._segments = sorted(
+            int(m.group(1)) for m in map(_SEGMENT.match, os.listdir(directory)) if m)
+        for segment in self._segments:
+            self.pending += self._recover(segment)
+        # Drained offsets of segments that have already gone
+        for name in os.listdir(directory):
+            m = _DRAINED.match(name)
+            if m and int(m.group(1)) not in self._segments:
+                os.remove(os.path.join(directory, name))
+        if not self._segments:
+            self._segments.append(0)
+        self._file = open(self._path(self._segments[-1]), 'ab')
+
+    def _path(self, segment: int) -> str:
+        return os.path.join(self.directory, f'spool-{segment:08d}.log')
+
+    def _drained_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f'spool-{segment:08d}.drained')
+
+    def _save_drained(self, segment: int, offset: int):
+        path = self._drained_path(segment)
+        with open(f'{path}.tmp', 'w') as f:
+            f.write(str(offset))
+        os.replace(f'{path}.tmp', path)
+
+    def _load_drained(self, segment: int) -> int:
+        try:
+            with open(self._drained_path(segment)) as f:
+                return int(f.read())
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as error:
+            logger.warning("Sending all of spool segment %d again, its drained offset couldn't be read: %r",
+                segment, error)
+            return 0
+
+    def _recover(self, segment: int) -> int:
+        '''Count the good records in a segment that haven't been drained, cutting off anything
+        after the last one'''
+        path = self._path(segment)
+        with open(path, 'rb') as f:
+            data = f.read()
+        drained = self._load_drained(segment)
+        ends = [end for end, _, _ in decode(data)]
+        end = ends[-1] if ends else 0
+        if drained and drained not in ends:
+            logger.warning("Sending all of %s again, its drained offset %d isn't between records", path, drained)
+            drained = 0
+        if drained:
+            self._drained_to[segment] = drained
+        count = sum(1 for e in ends if e > drained)
+        if end != len(data):
+            logger.warning("Dropping %d bytes of torn records from the end of %s", len(data) - end, path)
+            with open(path, 'r+b') as f:
+                f.truncate(end)
+        return count
+
+    def __len__(self):
+        return self.pending
+
+    def _run(self, loop: Optional[asyncio.AbstractEventLoop], done: Optional[Callable], function, *args):
+        '''Run function on the spool's thread, then done(its result) on the event loop. Without
+        a loop both are run straight away.'''
+        if loop is None:
+            result = function(*args)
+            if done is not None:
+                done(result)
+            return
+        future = loop.run_in_executor(self._thread, function, *args)
+        future.add_done_callback(lambda future: self._ran(future, done))
+
+    def _ran(self, future: asyncio.Future, done: Optional[Callable]):
+        try:
+            result = future.result()
+        except Exception as error:
+            logger.error("Spool write failed: %r", error)
+            return
+        if done is not None:
+            done(result)
+
+    def append(self, topic: str, payload: Union[str, bytes]):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        self.pending += 1
+        self._run(loop, self._lost, self._write, encode(topic, payload))
+        if loop is not None and self._sync_handle is None:
+            self._sync_handle = loop.call_later(self.sync_interval, self.sync)
+
+    def _lost(self, lost: int):
+        if lost:
+            self.pending -= lost
+            self.dropped += lost
+
+    def _write(self, record: bytes) -> int:
+        '''Returns how many messages were thrown away to make room'''
+        lost = 0
+        if self._file.tell() + len(record) > self.segment_bytes and self._file.tell() > 0:
+            lost = self._rotate()
+        self._file.write(record)
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every:
+            self._sync()
+        return lost
+
+    def sync(self):
+        if self._sync_handle is not None:
+            self._sync_handle.cancel()
+            self._sync_handle = None
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        self._run(loop, None, self._sync)
+
+    def _sync(self):
+        if self._unsynced == 0:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def _rotate(self) -> int:
+        '''Start a new segment, throwing the oldest away while there wouldn't be room for the
+        new one to fill up. Returns how many undrained messages were thrown away.'''
+        self._sync()
+        self._file.close()
+        lost = 0
+        while len(self._segments) > 1 and self._size() + self.segment_bytes > self.max_bytes:
+            oldest = self._segments.pop(0)
+            count = self._count(oldest)
+            logger.warning("Spool full, dropping %d messages", count)
+            lost += count
+            self._remove(oldest)
+        self._segments.append(self._segments[-1] + 1)
+        self._file = open(self._path(self._segments[-1]), 'ab')
+        return lost
+
+    def _size(self) -> int:
+        return sum(os.path.getsize(self._path(segment)) for segment in self._segments)
+
+    def _count(self, segment: int) -> int:
+        with open(self._path(segment), 'rb') as f:
+            return sum(1 for _ in decode(f.read(), self._drained_to.get(segment, 0)))
+
+    def _remove(self, segment: int):
+        self._drained_to.pop(segment, None)
+        for path in (self._path(segment), self._drained_path(segment)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    async def _call(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._thread, function, *args)
+
+    async def drain(self, send: Callable[[str, Union[str, bytes]], Awaitable], batch: int = 100) -> int:
+        '''Send everything in the spool, oldest first, batch messages at a time. Messages
+        appended while draining are sent too. If send raises, draining stops there, and the
+        next drain carries on from that batch. Returns how many were sent.'''
+        if self._draining:
+            return 0
+        self._draining = True
+        sent = 0
+        try:
+            while self.pending:
+                before = self.pending
+                segments, lost = await self._call(self._start_pass)
+                self._lost(lost)
+                this_pass = 0
+                for segment in segments:
+                    this_pass += await self._drain_segment(segment, send, batch)
+                    await self._call(self._finish, segment)
+                if this_pass == 0:
+                    logger.warning("Spool thought it had %d messages, but found none", before)
+                    self.pending = max(self.pending - before, 0)
+                sent += this_pass
+        finally:
+            self._draining = False
+        return sent
+
+    def _start_pass(self) -> tuple[list[int], int]:
+        '''The segments to drain, and how many messages were thrown away to start a new one'''
+        # Anything appended from now on goes into a new segment, so the old ones can be read
+        # without them changing underneath us.
+        lost = self._rotate() if self._file.tell() > 0 else 0
+        return self._segments[:-1], lost
+
+    def _read(self, segment: int) -> Optional[list]:
+        '''The undrained records in a segment, or None if it has been thrown away'''
+        if segment not in self._segments:
+            return None
+        with open(self._path(segment), 'rb') as f:
+            data = f.read()
+        return list(decode(data, self._drained_to.get(segment, 0)))
+
+    def _mark_drained(self, segment: int, offset: int) -> bool:
+        '''Whether the segment was still there, rather than thrown away (and its messages
+        counted as dropped) while they were sent'''
+        if segment not in self._segments:
+            return False
+        self._drained_to[segment] = offset
+        self._save_drained(segment, offset)
+        return True
+
+    def _finish(self, segment: int):
+        if segment in self._segments:
+            self._segments.remove(segment)
+            self._remove(segment)
+
+    async def _drain_segment(self, segment: int, send, batch: int) -> int:
+        records = await self._call(self._read, segment)
+        sent = 0
+        for start in range(0, len(records or ()), batch):
+            chunk = records[start:start + batch]
+            await asyncio.gather(*(send(topic, payload) for _, topic, payload in chunk))
+            sent += len(chunk)
+            if not await self._call(self._mark_drained, segment, chunk[-1][0]):
+                break
+            self.pending -= len(chunk)
+        return sent
+
+    def close(self):
+        '''Write out and sync everything appended, and close the files. Waits for the spool's
+        thread, so is for shutting down.'''
+        if self._closed:
+            return
+        self._closed = True
+        if self._sync_handle is not None:
+            self._sync_handle.cancel()
+            self._sync_handle = None
+        self._thread.submit(self._close)
+        self._thread.shutdown(wait=True)
+
+    def _close(self):
+        self._sync()
+        self._file.close()
@@ -0,0 +1,52 @@
+'''Timing how long the lift takes to start, and where the time goes (see --startup-profile).
+
+Imports nothing heavy, so it can be imported first and time everything else.'''
+import logging
+import os
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+def process_age() -> Optional[float]:
+    '''Seconds since this process was started, to 1/CLK_TCK of a second, if the system says'''
+    try:
+        with open('/proc/self/stat') as f:
+            # The command name can have spaces in, but it is the only field in brackets.
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return max(uptime - int(fields[19]) / os.sysconf('SC_CLK_TCK'), 0.0)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupTimer:
+    '''Marks the end of each phase of starting up. The first phase is from the process
+    starting to the timer being made, which is mostly the interpreter starting.'''
+
+    def __init__(self, first: str = 'python started'):
+        now = time.monotonic()
+        age = process_age()
+        self.started = now - age if age is not None else now
+        self.marks: list[tuple[str, float]] = [(first, now)]
+
+    def mark(self, phase: str):
+        '''phase has just finished'''
+        self.marks.append((phase, time.monotonic()))
+
+    def since_start(self, phase: str) -> float:
+        '''Seconds from the process starting to the end of phase'''
+        return dict(self.marks)[phase] - self.started
+
+    def report(self) -> list[str]:
+        lines = []
+        last = self.started
+        for phase, when in self.marks:
+            lines.append(f'{phase:>24} {(when - last) * 1000:8.1f} ms {(when - self.started) * 1000:8.1f} ms')
+            last = when
+        return lines
+
+    def log(self):
+        logger.info('Startup, each phase and from the start:\n%s', '\n'.join(self.report()))
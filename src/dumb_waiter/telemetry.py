@@ -0,0 +1,152 @@
+import asyncio
+import json
+import logging
+from typing import Optional
+
+from .io import Input
+from .logic import MODEL_INPUTS, LiftLogicModel
+
+logger = logging.getLogger(__name__)
+
+MODEL_OUTPUTS = ('raise_lift', 'lower_lift', 'lock_door_top', 'lock_door_bottom')
+
+
+class LatestValueQueue:
+    '''Telemetry waiting to be published, keeping only the latest value for each topic.
+
+    put() never waits, so the lift logic can call it. A value for a topic that is already
+    waiting replaces it, keeping its place in the queue. If max_topics are already waiting the
+    oldest is dropped to make room.'''
+
+    def __init__(self, max_topics: int = 256):
+        self.max_topics = max_topics
+        self._pending: dict[str, str] = {}
+        self._ready = asyncio.Event()
+        # Values replaced or dropped before they were published
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def put(self, topic: str, payload: str):
+        if topic in self._pending:
+            self.dropped += 1
+        elif len(self._pending) >= self.max_topics:
+            del self._pending[next(iter(self._pending))]
+            self.dropped += 1
+        self._pending[topic] = payload
+        self._ready.set()
+
+    def take(self, count: int) -> list[tuple[str, str]]:
+        '''Take up to count of the longest waiting values'''
+        batch = []
+        for topic in self._pending:
+            if len(batch) == count:
+                break
+            batch.append((topic, self._pending[topic]))
+        for topic, _ in batch:
+            del self._pending[topic]
+        if not self._pending:
+            self._ready.clear()
+        return batch
+
+    async def wait(self):
+        '''Wait until there is something to take'''
+        await self._ready.wait()
+
+
+class TelemetryPublisher:
+    '''Publishes what is put in a LatestValueQueue through Comms, batch_size messages at a
+    time, at no more than rate messages a second on average.
+
+    While comms can't take messages (the broker isn't connected, and there is no spool)
+    nothing is taken from the queue, so once it can the latest value of everything is
+    published.'''
+
+    def __init__(self, comms, queue: LatestValueQueue, rate: float = 20.0, batch_size: int = 10,
+                 prefix: str = 'dumbwaiter'):
+        self.comms = comms
+        self.queue = queue
+        self.rate = rate
+        self.batch_size = batch_size
+        self.prefix = prefix
+        self.published = 0
+
+    async def run(self):
+        while True:
+            await self.queue.wait()
+            if not self.comms.accepting:
+                await asyncio.sleep(1)
+                continue
+            await self.publish_batch()
+
+    async def publish_batch(self):
+        batch = self.queue.take(self.batch_size)
+        results = await asyncio.gather(
+            *(self.comms.send(f'{self.prefix}/{topic}', payload) for topic, payload in batch),
+            return_exceptions=True)
+        for (topic, _), result in zip(batch, results):
+            if isinstance(result, Exception):
+                logger.warning("Failed to publish %s: %r", topic, result)
+            else:
+                self.published += 1
+        # Anything put in while this batch waits out the rate limit is coalesced.
+        await asyncio.sleep(len(batch) / self.rate)
+
+
+class LiftTelemetry:
+    '''Puts a lift's state, inputs and outputs into a LatestValueQueue, under <lift name>/state,
+    <lift name>/input/<name> and <lift name>/output/<name>.
+
+    Add it as a listener to the lift logic so every transition is published, and run
+    watch_inputs() to also publish input edges that don't cause a transition.'''
+
+    def __init__(self, model: LiftLogicModel, queue: LatestValueQueue):
+        self.model = model
+        self.queue = queue
+        self.inputs: dict[str, Input] = {name: getattr(model, name) for name in MODEL_INPUTS}
+
+    def after_transition(self, target):
+        self.queue.put(f'{self.model.name}/state', target.id)
+        self.put_outputs()
+        self.put_inputs()
+
+    def put_inputs(self):
+        for name, pin in self.inputs.items():
+            self.queue.put(f'{self.model.name}/input/{name}', json.dumps(bool(pin())))
+
+    def put_outputs(self):
+        for name in MODEL_OUTPUTS:
+            output = getattr(self.model, name)
+            self.queue.put(f'{self.model.name}/output/{name}', json.dumps(bool(output.value)))
+
+    async def watch_inputs(self):
+        async def watch(name, pin):
+            with pin.edges() as edges:
+                async for edge in edges:
+                    self.queue.put(f'{self.model.name}/input/{name}', json.dumps(edge.rising))
+        await asyncio.gather(*(watch(name, pin) for name, pin in self.inputs.items()))
+
+
+def start_telemetry(machine, comms, rate: float = 20.0,
+                    queue: Optional[LatestValueQueue] = None) -> LatestValueQueue:
+    '''Publish the lift's telemetry through comms, from tasks on the running loop'''
+    return start_site_telemetry([machine], comms, rate=rate, queue=queue)
+
+
+def start_site_telemetry(machines, comms, rate: float = 20.0,
+                         queue: Optional[LatestValueQueue] = None) -> LatestValueQueue:
+    '''Publish the telemetry of several lifts, through one queue and publisher'''
+    if queue is None:
+        queue = LatestValueQueue(max_topics=256 * len(machines))
+    for machine in machines:
+        telemetry = LiftTelemetry(machine.model, queue)
+        machine.add_listener(telemetry)
+        if machine.current_state is not None:
+            queue.put(f'{machine.model.name}/state', machine.current_state.id)
+        telemetry.put_outputs()
+        telemetry.put_inputs()
+        asyncio.create_task(telemetry.watch_inputs())
+    publisher = TelemetryPublisher(comms, queue, rate=rate)
+    asyncio.create_task(publisher.run())
+    return queue
@@ -0,0 +1,246 @@
+'''Learns how long the car takes to go up and down, and from that how long each direction's
+safety timeout needs to be.
+
+LiftLogicModel.safety_time has to allow for the slowest trip, in either direction, with
+margin to spare, so a jammed car runs its motor for a long time before it is stopped. Once
+enough trips have been timed, TripTimes sets the model's safety_time_up and
+safety_time_down to a margin over the quantile of the trip times, and so a jam is noticed in
+seconds. safety_time stays as the longest either can be.'''
+import asyncio
+import json
+import logging
+import os
+from bisect import insort
+from typing import Optional
+
+from .logic import LiftLogicModel
+
+logger = logging.getLogger(__name__)
+
+# Which stop ends a whole trip in each direction, from one floor to the other
+_TRIPS = {
+    ('stopped_at_bottom', 'rising', 'stop_rising'): 'up',
+    ('stopped_at_top', 'lowering', 'stop_lowering'): 'down',
+}
+
+
+class P2Quantile:
+    '''Estimates the p quantile of a stream of values in constant space, with the P² algorithm
+    (Jain and Chlamtac, 1985). It keeps five markers, at the minimum, p/2, p, (1+p)/2 and the
+    maximum, nudging their heights along a parabola as values come in.'''
+
+    def __init__(self, p: float):
+        self.p = p
+        self.count = 0
+        # Marker heights, their positions, and where the positions should be
+        self.heights: list[float] = []
+        self.positions = [0, 1, 2, 3, 4]
+        self.desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+        self._increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x: float):
+        self.count += 1
+        q, n = self.heights, self.positions
+        if len(q) < 5:
+            insort(q, x)
+            return
+
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = next(i for i in range(4) if q[i] <= x < q[i + 1])
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self._increments[i]
+
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self._parabolic(i, d)
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = height
+                n[i] += d
+
+    def _parabolic(self, i: int, d: int) -> float:
+        q, n = self.heights, self.positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+
+    @property
+    def value(self) -> Optional[float]:
+        if not self.heights:
+            return None
+        if len(self.heights) < 5:
+            # Too few for the markers, so just pick from what we have.
+            return self.heights[min(int(self.p * len(self.heights)), len(self.heights) - 1)]
+        return self.heights[2]
+
+    def to_dict(self) -> dict:
+        return {
+            'p': self.p,
+            'count': self.count,
+            'heights': self.heights,
+            'positions': self.positions,
+            'desired': self.desired,
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> 'P2Quantile':
+        estimator = cls(state['p'])
+        estimator.count = int(state['count'])
+        estimator.heights = [float(h) for h in state['heights']]
+        estimator.positions = [int(n) for n in state['positions']]
+        estimator.desired = [float(n) for n in state['desired']]
+        if len(estimator.heights) > 5 or len(estimator.positions) != 5 or len(estimator.desired) != 5:
+            raise ValueError(f'Not a P2Quantile: {state!r}')
+        return estimator
+
+
+class TripTimes:
+    '''Times each whole trip of the car, and once min_trips have been timed in a direction sets
+    that direction's safety time to margin times the quantile of its trip times. That is never
+    less than minimum or more than the model's safety_time.
+
+    Add it as a listener to the lift logic. Only trips from one floor to the other that end at
+    the limit switch are timed, not ones that were stopped or started part way.
+
+    So a trip cut short by the learnt safety time is never timed, and if the car has got slower
+    the estimate could never catch up. After max_timeouts of those in a row in a direction, its
+    trip times are forgotten, so it goes back to the model's safety_time and learns afresh.
+
+    With a path the estimates are saved there after each trip, and loaded from there if it
+    exists, so they survive a restart. They are written from a thread, so the lift logic
+    isn't held up by the disk.'''
+
+    def __init__(self, model: LiftLogicModel, path: Optional[str] = None, quantile: float = 0.99,
+                 margin: float = 1.5, minimum: float = 3.0, min_trips: int = 20, max_timeouts: int = 2):
+        self.model = model
+        self.path = path
+        self.quantile = quantile
+        self.margin = margin
+        self.minimum = minimum
+        self.min_trips = min_trips
+        self.max_timeouts = max_timeouts
+        # Safety timeouts in a row while moving on a learnt safety time, in each direction
+        self.timeouts = {'up': 0, 'down': 0}
+        self.estimates = {'up': P2Quantile(quantile), 'down': P2Quantile(quantile)}
+        # Where the car started from and when, while it is moving
+        self._started: Optional[tuple[str, float]] = None
+        # The task writing the estimates, and whether they have changed since it started
+        self.writing: Optional[asyncio.Task] = None
+        self._unsaved = False
+        if path is not None and os.path.exists(path):
+            self.load()
+        self.apply()
+
+    def after_transition(self, event, source, target):
+        if target.id in ('rising', 'lowering') and source.id != target.id:
+            self._started = (source.id, asyncio.get_running_loop().time())
+            return
+        if self._started is None:
+            return
+        (floor, started), self._started = self._started, None
+        if event == 'safety_timeout':
+            self._timed_out('up' if source.id == 'rising' else 'down')
+            return
+        direction = _TRIPS.get((floor, source.id, event))
+        if direction is None:
+            return
+        duration = asyncio.get_running_loop().time() - started
+        self.timeouts[direction] = 0
+        self.estimates[direction].add(duration)
+        logger.debug("Trip %s took %.2fs", direction, duration)
+        self.apply()
+        if self.path is not None:
+            self.save_soon()
+
+    def _timed_out(self, direction: str):
+        learnt = getattr(self.model, f'safety_time_{direction}')
+        if learnt is None:
+            return
+        self.timeouts[direction] += 1
+        logger.warning("%s timed out going %s after the learnt %.1fs (%d in a row)",
+            self.model.name, direction, learnt, self.timeouts[direction])
+        if self.timeouts[direction] < self.max_timeouts:
+            return
+        logger.warning("Forgetting the trip times going %s for %s, and going back to the %ss safety time",
+            direction, self.model.name, self.model.safety_time)
+        self.timeouts[direction] = 0
+        self.estimates[direction] = P2Quantile(self.quantile)
+        self.apply()
+        if self.path is not None:
+            self.save_soon()
+
+    def safety_time(self, direction: str) -> Optional[float]:
+        '''The learnt safety time in one direction, or None if there haven't been enough trips'''
+        estimate = self.estimates[direction]
+        if estimate.count < self.min_trips:
+            return None
+        return min(max(estimate.value * self.margin, self.minimum), self.model.safety_time)
+
+    def apply(self):
+        for direction in ('up', 'down'):
+            learnt = self.safety_time(direction)
+            name = f'safety_time_{direction}'
+            if learnt is not None and getattr(self.model, name) is None:
+                logger.info("Learnt a %.1fs safety time going %s for %s", learnt, direction, self.model.name)
+            setattr(self.model, name, learnt)
+
+    def save(self):
+        self._write_file(self._encode())
+
+    def save_soon(self):
+        '''Like save(), but if the event loop is running the file is written from a thread,
+        after the current callback. Only one write is in progress at a time, and changes
+        made during it are written once it is done.'''
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.save()
+            return
+        self._unsaved = True
+        if self.writing is None or self.writing.done():
+            self.writing = loop.create_task(self._write_unsaved())
+
+    async def _write_unsaved(self):
+        loop = asyncio.get_running_loop()
+        while self._unsaved:
+            self._unsaved = False
+            data = self._encode()
+            try:
+                await loop.run_in_executor(None, self._write_file, data)
+            except OSError as error:
+                logger.error("Couldn't save the trip times to %s: %r", self.path, error)
+
+    def _encode(self) -> str:
+        return json.dumps({direction: estimate.to_dict() for direction, estimate in self.estimates.items()})
+
+    def _write_file(self, data: str):
+        # Written to one side and then moved, so a crash part way doesn't lose what we had.
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as f:
+            f.write(data)
+        os.replace(temporary, self.path)
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+            estimates = {direction: P2Quantile.from_dict(state[direction]) for direction in ('up', 'down')}
+        except (OSError, ValueError, KeyError, TypeError) as error:
+            logger.warning("Ignoring the trip times in %s, they couldn't be read: %r", self.path, error)
+            return
+        for direction, estimate in estimates.items():
+            if estimate.p != self.quantile:
+                logger.warning("Ignoring the %s trip times in %s, they are for quantile %s not %s",
+                    direction, self.path, estimate.p, self.quantile)
+                continue
+            self.estimates[direction] = estimate
@@ -0,0 +1,42 @@
+import asyncio
+import selectors
+
+
+class _VirtualTimeSelector(selectors.DefaultSelector):
+    '''A selector that never sleeps for a timer. When the event loop asks it to wait for the next
+    timer it moves the virtual clock forward instead, so the timer is due straight away.'''
+
+    def __init__(self, loop: 'VirtualTimeLoop'):
+        super().__init__()
+        self._loop = loop
+
+    def select(self, timeout=None):
+        # A timeout of None means there are no timers at all, so the only thing that can wake
+        # the loop is real I/O (e.g. call_soon_threadsafe from another thread). Block for that.
+        if timeout is None or timeout <= 0:
+            return super().select(timeout)
+        events = super().select(0)
+        if not events:
+            self._loop.advance(timeout)
+        return events
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    '''An event loop whose clock only moves when there is nothing left to do but wait for the
+    next timer, and then it jumps straight to that timer.
+
+    asyncio.sleep(), loop.call_later() and anything built on them run in the order they would
+    in real time, but without the wait. A 23 second safety timeout takes microseconds. I/O and
+    threads are still real, if the loop is waiting on those with timers pending the virtual
+    clock will run ahead of the wall clock.'''
+
+    def __init__(self, start: float = 0.0):
+        self._virtual_time = start
+        super().__init__(selector=_VirtualTimeSelector(self))
+
+    def time(self) -> float:
+        return self._virtual_time
+
+    def advance(self, seconds: float) -> None:
+        '''Move the virtual clock forward'''
+        self._virtual_time += seconds
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from .io import Output
+from .latency import LatencyHistogram
+from .notify import sd_notify
+
+logger = logging.getLogger(__name__)
+
+
+def systemd_watchdog_interval() -> Optional[float]:
+    '''How often systemd wants to hear from us, in seconds, if the service has WatchdogSec'''
+    usec = os.environ.get('WATCHDOG_USEC')
+    pid = os.environ.get('WATCHDOG_PID')
+    if not usec or (pid and int(pid) != os.getpid()):
+        return None
+    return int(usec) / 1e6
+
+
+class LoopLagMonitor:
+    '''Watches how late the event loop is running things, as every safety reaction depends on
+    it running the pins' callbacks promptly.
+
+    Every interval seconds it measures how late its own sleep woke up, into a histogram. A
+    thread notices if the loop hasn't woken it for stall seconds, and logs what the loop is
+    stuck in while it still is. Only while the lag is under threshold is systemd's watchdog
+    petted, and heartbeat (say the trigger of an external relay watchdog that drops the motor
+    power) toggled, so a wedged controller is restarted, and the motor stopped.
+
+    systemd is petted at half the service's WatchdogSec, the heartbeat every pet_interval.'''
+
+    def __init__(self, interval: float = 0.1, stall: float = 0.5, threshold: float = 1.0,
+                 heartbeat: Optional[Output] = None, pet_interval: float = 0.5):
+        self.interval = interval
+        self.stall = stall
+        self.threshold = threshold
+        self.heartbeat = heartbeat
+        self.pet_interval = pet_interval
+        self.lag = LatencyHistogram()
+        self.stalls = 0
+        self.pets = 0
+        watchdog = systemd_watchdog_interval()
+        self.systemd_interval = watchdog / 2 if watchdog is not None else None
+        self._beat = time.monotonic()
+        self._loop_thread: Optional[int] = None
+        self._stopped = threading.Event()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        thread = threading.Thread(target=self._watch, name='loop-lag', daemon=True)
+        thread.start()
+        last_systemd = last_heartbeat = loop.time()
+        try:
+            while True:
+                expected = loop.time() + self.interval
+                await asyncio.sleep(self.interval)
+                now = loop.time()
+                self._beat = time.monotonic()
+                lag = max(now - expected, 0.0)
+                self.lag.record(int(lag * 1e9))
+                if lag > self.stall:
+                    logger.warning("The event loop was stalled for %.3fs", lag)
+                if lag > self.threshold:
+                    # Let the watchdogs go hungry this time round.
+                    continue
+                if self.systemd_interval is not None and now - last_systemd >= self.systemd_interval:
+                    last_systemd = now
+                    sd_notify('WATCHDOG=1')
+                    self.pets += 1
+                if self.heartbeat is not None and now - last_heartbeat >= self.pet_interval:
+                    last_heartbeat = now
+                    if self.heartbeat.value:
+                        self.heartbeat.off()
+                    else:
+                        self.heartbeat.on()
+        finally:
+            self._stopped.set()
+
+    def _watch(self):
+        reported = None
+        while not self._stopped.wait(self.stall / 4):
+            beat = self._beat
+            if beat == reported or time.monotonic() - beat <= self.stall:
+                continue
+            reported = beat
+            self.stalls += 1
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = ''.join(traceback.format_stack(frame)) if frame is not None else 'unknown\n'
+            logger.error("The event loop has been stuck for over %.1fs, in:\n%s", self.stall, stack.rstrip())
+
+    def log_summary(self):
+        s = self.lag.summary()
+        logger.info("Event loop lag: count=%d p50=%.0fus p99=%.0fus max=%.0fus, %d stalls",
+            s['count'], s['p50_us'], s['p99_us'], s['max_us'], self.stalls)
+
+    async def report_forever(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            self.log_summary()
@@ -1,10 +1,14 @@
 import asyncio
+import argparse
 import sys
 import logging
+import time
 
 from dumb_waiter.logic import LiftLogicMachine, LiftLogicModel
-from dumb_waiter.io import Input, Output
+from dumb_waiter.fake import FakeDigitalInput, FakeDigitalOutput, FakeLift
 from dumb_waiter.util import ainput
+from dumb_waiter.simulator import LiftSimulator
+from dumb_waiter.virtual_time import VirtualTimeLoop
 
 async def main():
 
@@ -87,54 +91,34 @@ async def main():
             inputs[input_].off()
             continue
 
-class FakeDigitalInput(Input):
-    def __init__(self, initial=False):
-        self.var = initial
-
-    def __call__(self):
-        return self.var
-
-    
-    # I need a wait to change the fake input, hence below methods.
-    def toggle(self):
-        old_var = self.var
-        self.var = not self.var
-        if self.falling_edge_callback is not None:
-            if old_var == True:
-                self.falling_edge_callback()
-        if self.rising_edge_callback is not None:
-            if old_var == False:
-                self.rising_edge_callback()
-
-    def on(self):
-        if self.var == True:
-            return
-        self.var = True
-        if self.rising_edge_callback is not None:
-            self.rising_edge_callback()
-
-    def off(self):
-        if self.var == False:
-            return
-        self.var = False
-        if self.falling_edge_callback is not None:
-            self.falling_edge_callback()
-
-class FakeDigitalOutput(Output):
-    def __init__(self, name):
-        self.name = name
-        self.var = False
-
-    @property
-    def value(self):
-        return self.var
-
-    def on(self):
-        self.var = True
-
-    def off(self):
-        self.var = False
+
+async def simulate(trips, safety_time):
+    lift = FakeLift(safety_time=safety_time)
+    lift.machine.initialise()
+    sim = LiftSimulator(lift)
+
+    started = time.perf_counter()
+    report = await sim.run(trips=trips, timeout=trips * 3600)
+    wall_time = time.perf_counter() - started
+
+    print(f"{report.trips} trips in {report.elapsed / 3600:.1f} simulated hours "
+        f"({wall_time:.2f} s real time, {report.trips / wall_time:.0f} trips per second)")
+    print(f"Trips per hour: {report.trips_per_hour:.1f}")
+    print(f"Safety timeouts: {report.safety_timeouts}")
+    for fault in report.faults[:10]:
+        print(f"Fault: {fault}")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(prog='fake lift')
+    parser.add_argument('--simulate', type=int, metavar='TRIPS',
+        help="""Instead of taking commands from stdin, simulate the lift making TRIPS trips""")
+    parser.add_argument('--safety-time', type=float, default=23)
+    args = parser.parse_args(sys.argv[1:])
+
+    if args.simulate:
+        logging.basicConfig(level=logging.WARNING)
+        with asyncio.Runner(loop_factory=VirtualTimeLoop) as runner:
+            runner.run(simulate(args.simulate, args.safety_time))
+    else:
+        asyncio.run(main())
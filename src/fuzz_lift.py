@@ -0,0 +1,48 @@
+import argparse
+import logging
+import sys
+
+from dumb_waiter.fuzz import check_sequence, load_failure, run_campaign
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        prog='fuzz_lift',
+        description='Fire random events and input changes at the lift logic, checking it stays safe',)
+    parser.add_argument('--runs', type=int, default=10000)
+    parser.add_argument('--steps', type=int, default=50, help='Steps in each random sequence')
+    parser.add_argument('--jobs', type=int, default=None, help='Processes to use, defaults to one per CPU')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--safety-time', type=float, default=5)
+    parser.add_argument('--out', default='fuzz-failures', help='Directory to save failing sequences in')
+    parser.add_argument('--replay', metavar='FILE', help='Run a saved failure again and print each step')
+    args = parser.parse_args(argv[1:])
+
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.replay:
+        steps, safety_time = load_failure(args.replay)
+        for step in steps:
+            print(step)
+        result = check_sequence(steps, safety_time)
+        print(f"Result: {result.violation}")
+        raise SystemExit(0 if result.violation is None else 1)
+
+    report = run_campaign(
+        runs=args.runs,
+        length=args.steps,
+        jobs=args.jobs,
+        seed=args.seed,
+        safety_time=args.safety_time,
+        out_dir=args.out,
+    )
+    print(f"{report.runs} runs, {report.transitions} transitions in {report.wall_time:.2f} s "
+        f"({report.transitions_per_second:.0f} transitions per second)")
+    print(f"{len(report.failures)} failures")
+    for failure in report.failures:
+        print(f"seed {failure['seed']}: {failure['message']}, shrunk to {len(failure['shrunk'])} steps")
+    raise SystemExit(0 if not report.failures else 1)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,62 @@
+'''What-if analysis for a fleet of lifts: how trips per hour, waits and safety timeouts change
+with safety_time, and with how long people take to use the lift.'''
+import argparse
+import logging
+import sys
+import time
+
+import numpy as np
+
+from dumb_waiter.fleet import FleetSimulator, cross_check
+from dumb_waiter.simulator import LiftPhysics
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        prog='sim_fleet',
+        description='Simulate many lifts at once, for each of a range of settings',)
+    parser.add_argument('--lifts', type=int, default=1000)
+    parser.add_argument('--hours', type=float, default=24)
+    parser.add_argument('--safety-time', type=float, nargs='+', default=[23],
+        help='safety_time values to try, in seconds')
+    parser.add_argument('--speed', type=float, default=LiftPhysics.speed, help='m/s')
+    parser.add_argument('--travel', type=float, default=LiftPhysics.travel, help='m')
+    parser.add_argument('--load-time', type=float, default=LiftPhysics.load_time,
+        help='Seconds the door is held open')
+    parser.add_argument('--call-delay', type=float, default=LiftPhysics.call_delay,
+        help='Seconds from the door closing to the lift being called')
+    parser.add_argument('--random-delays', action='store_true',
+        help='Draw how long people take from exponential distributions')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cross-check', type=int, metavar='LIFTS', default=0,
+        help='First check this many lifts with random settings against LiftSimulator')
+    args = parser.parse_args(argv[1:])
+
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.cross_check:
+        started = time.perf_counter()
+        differences = cross_check(args.cross_check, duration=3600, seed=args.seed)
+        print(f"Cross checked {args.cross_check} lifts for an hour in {time.perf_counter() - started:.1f} s, "
+            f"{len(differences)} differ")
+        for difference in differences:
+            print(difference)
+        if differences:
+            raise SystemExit(1)
+
+    physics = LiftPhysics(speed=args.speed, travel=args.travel, start_position=args.travel / 2,
+        load_time=args.load_time, call_delay=args.call_delay)
+    print(f"{'safety_time':>11} {'trips/h':>8} {'wait p50':>8} {'p95':>6} {'p99':>6} "
+        f"{'timeouts/1000 trips':>19} {'s':>6}")
+    for safety_time in args.safety_time:
+        sim = FleetSimulator(args.lifts, physics, safety_time, random_delays=args.random_delays,
+            rng=np.random.default_rng(args.seed))
+        started = time.perf_counter()
+        summary = sim.run(args.hours * 3600).summary()
+        print(f"{safety_time:11.1f} {summary['trips_per_hour']:8.1f} {summary['wait_p50']:8.1f} "
+            f"{summary['wait_p95']:6.1f} {summary['wait_p99']:6.1f} "
+            f"{summary['safety_timeouts_per_1000_trips']:19.2f} {time.perf_counter() - started:6.1f}")
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,52 @@
+from unittest import IsolatedAsyncioTestCase
+import asyncio
+
+from dumb_waiter.fake import FakeLift
+from dumb_waiter.virtual_time import VirtualTimeLoop
+
+
+class VirtualTimeTestCase(IsolatedAsyncioTestCase):
+    '''Runs each test on a VirtualTimeLoop, so asyncio.sleep() in a test (or in the code under
+    test) returns as soon as there is nothing else to do.'''
+
+    loop_factory = VirtualTimeLoop
+
+    # Python 3.13 added loop_factory to IsolatedAsyncioTestCase, earlier versions always use
+    # the default event loop. Setting up the runner ourselves works for both.
+    def _setupAsyncioRunner(self):
+        assert self._asyncioRunner is None, 'asyncio runner is already initialized'
+        self._asyncioRunner = asyncio.Runner(debug=True, loop_factory=self.loop_factory)
+
+    @property
+    def loop(self) -> VirtualTimeLoop:
+        return asyncio.get_running_loop()
+
+
+class LiftTestCase(VirtualTimeTestCase):
+    '''A FakeLift that has been initialised, ready for a test to drive its inputs.'''
+
+    safety_time = 23
+    doors_closed = True
+    # Set to have the call buttons go through RegisteredCalls
+    hold_time = None
+
+    def setUp(self):
+        self.lift = FakeLift(safety_time=self.safety_time, hold_time=self.hold_time)
+        self.inputs = self.lift.inputs
+        self.outputs = self.lift.outputs
+        self.llm = self.lift.machine
+        if self.doors_closed:
+            self.lift.close_doors()
+        self.llm.initialise()
+
+    async def settle(self, seconds=0.1):
+        '''Let anything that has been scheduled on the loop run'''
+        await asyncio.sleep(seconds)
+
+    def assertMotorStopped(self):
+        self.assertFalse(self.outputs['raise_lift'].value)
+        self.assertFalse(self.outputs['lower_lift'].value)
+
+    def assertDoorsLocked(self, locked=True):
+        self.assertEqual(self.outputs['lock_door_top'].value, locked)
+        self.assertEqual(self.outputs['lock_door_bottom'].value, locked)
@@ -0,0 +1,84 @@
+import asyncio
+import threading
+import unittest
+from unittest import IsolatedAsyncioTestCase
+
+from async_paho_mqtt_client import AsyncClient
+
+from dumb_waiter.fake import FakeLift
+
+
+class HangingClient:
+    '''Enough of a paho Client for AsyncClient, whose connect() hangs like one talking to a
+    broker that isn't answering, until released.'''
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.connects = 0
+
+    def will_set(self, *args, **kwargs):
+        pass
+
+    def connect(self, host, port=1883, keepalive=60):
+        self.connects += 1
+        self.release.wait()
+        raise ConnectionRefusedError()
+
+    def socket(self):
+        return None
+
+
+class TestNonBlockingConnect(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.paho = HangingClient()
+        self.client = AsyncClient(client=self.paho, host='broker', reconnect_interval=0.05,
+            connect_timeout=0.1)
+        await self.client.start()
+
+    async def asyncTearDown(self):
+        self.client.stop()
+        self.paho.release.set()
+        self.client._reconnector_loop.cancel()
+        await asyncio.sleep(0)
+
+    async def test_lift_runs_while_connect_hangs(self):
+        lift = FakeLift()
+        lift.close_doors()
+        lift.machine.initialise()
+        await asyncio.sleep(0.05)
+        self.assertFalse(self.client.connected)
+
+        lift.press('call_top')
+        self.assertEqual(lift.state, 'lowering')
+        lift.inputs['lower_limit'].on()
+        self.assertEqual(lift.state, 'stopped_at_bottom')
+
+        # The loop isn't held up either, timers run on time
+        started = asyncio.get_running_loop().time()
+        await asyncio.sleep(0.01)
+        self.assertLess(asyncio.get_running_loop().time() - started, 0.05)
+        lift.model.scheduler.cancel_all()
+
+    async def test_hung_attempt_is_not_repeated(self):
+        await asyncio.sleep(0.5)
+        self.assertFalse(self.client.connected)
+        self.assertEqual(self.paho.connects, 1)
+        self.assertGreater(self.client._reconnect_attempts, 1)
+
+
+class TestBackoff(unittest.TestCase):
+
+    def test_doubles_with_jitter_up_to_the_max(self):
+        client = AsyncClient(client=HangingClient(), reconnect_interval=1, max_reconnect_interval=30,
+            loop=asyncio.new_event_loop())
+        for attempts, limit in ((0, 1), (1, 2), (3, 8), (10, 30)):
+            client._reconnect_attempts = attempts
+            delays = [client.reconnect_delay() for _ in range(100)]
+            self.assertTrue(all(limit / 2 <= d <= limit for d in delays), (attempts, min(delays), max(delays)))
+            self.assertGreater(len(set(delays)), 1)
+        client.loop.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
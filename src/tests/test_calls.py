@@ -0,0 +1,104 @@
+import unittest
+
+from .harness import LiftTestCase
+
+
+class TestRegisteredCalls(LiftTestCase):
+    hold_time = 5
+
+    async def asyncSetUp(self):
+        # Get the car to the bottom.
+        self.lift.press('call_bottom')
+        self.inputs['lower_limit'].on()
+        self.assertEqual(self.lift.state, 'stopped_at_bottom')
+
+    def tearDown(self):
+        self.lift.model.scheduler.cancel_all()
+        super().tearDown()
+
+    def arrive_at_top(self):
+        self.inputs['lower_limit'].off()
+        self.inputs['upper_limit'].on()
+        self.assertEqual(self.lift.state, 'stopped_at_top')
+
+    async def test_call_while_moving_is_served_after_arriving(self):
+        self.lift.press('call_bottom')
+        self.assertEqual(self.lift.state, 'rising')
+        await self.settle(3)
+        self.lift.press('call_bottom')
+        # The car keeps going.
+        self.assertEqual(self.lift.state, 'rising')
+        self.assertEqual(self.lift.calls.registered, {'bottom'})
+
+        self.arrive_at_top()
+        self.assertDoorsLocked(False)
+        await self.settle(4.9)
+        self.assertEqual(self.lift.state, 'stopped_at_top')
+        await self.settle(0.2)
+        self.assertEqual(self.lift.state, 'lowering')
+        self.assertEqual(self.lift.calls.registered, set())
+
+    async def test_call_from_where_it_is_going(self):
+        self.lift.press('call_bottom')
+        self.lift.press('call_top')
+        self.assertEqual(self.lift.state, 'rising')
+        self.arrive_at_top()
+        await self.settle(10)
+        self.assertEqual(self.lift.state, 'stopped_at_top')
+
+    async def test_waits_for_the_door_to_close(self):
+        self.lift.press('call_bottom')
+        self.lift.press('call_bottom')
+        self.arrive_at_top()
+        self.inputs['upper_door_closed'].off()
+        await self.settle(10)
+        self.assertEqual(self.lift.state, 'stopped_at_top')
+        self.assertEqual(self.lift.calls.registered, {'bottom'})
+
+        self.inputs['upper_door_closed'].on()
+        await self.settle(1.1)
+        self.assertEqual(self.lift.state, 'lowering')
+
+    async def test_pressing_again_goes_straight_away(self):
+        self.lift.press('call_bottom')
+        self.lift.press('call_bottom')
+        self.arrive_at_top()
+        self.assertIsNotNone(self.lift.calls.pending)
+        self.lift.press('call_top')
+        self.assertEqual(self.lift.state, 'lowering')
+        self.assertIsNone(self.lift.calls.pending)
+
+    async def test_estop_forgets_calls(self):
+        self.lift.press('call_bottom')
+        self.lift.press('call_bottom')
+        self.inputs['estop1'].on()
+        self.assertEqual(self.lift.state, 'stopped')
+        self.inputs['estop1'].off()
+        self.assertEqual(self.lift.calls.registered, set())
+        await self.settle(30)
+        self.assertEqual(self.lift.state, 'stopped')
+        self.assertMotorStopped()
+
+    async def test_door_opening_still_stops_the_car(self):
+        self.lift.press('call_bottom')
+        self.lift.press('call_bottom')
+        self.inputs['lower_door_closed'].off()
+        self.assertEqual(self.lift.state, 'stopped')
+        self.assertMotorStopped()
+        self.assertEqual(self.lift.calls.registered, set())
+
+
+class TestUnregisteredCalls(LiftTestCase):
+
+    async def test_call_while_moving_stops_the_car(self):
+        self.lift.press('call_bottom')
+        self.inputs['lower_limit'].on()
+        self.lift.press('call_bottom')
+        self.assertEqual(self.lift.state, 'rising')
+        self.lift.press('call_top')
+        self.assertEqual(self.lift.state, 'stopped')
+        self.assertIsNone(self.lift.calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import json
+import unittest
+from types import SimpleNamespace
+
+from dumb_waiter.commands import CommandChannel
+from dumb_waiter.fake import FakeLift
+
+from .harness import LiftTestCase
+
+
+class TestCommandChannel(LiftTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.now = 1000.0
+        self.channel = CommandChannel(self.llm, max_age=0.5, clock=lambda: self.now)
+
+    def tearDown(self):
+        self.lift.model.scheduler.cancel_all()
+
+    def send(self, command, id='1', sent_at=None, topic=None):
+        payload = json.dumps({'id': id, 'sent_at': self.now if sent_at is None else sent_at})
+        message = SimpleNamespace(topic=topic or f'dumbwaiter/lift/command/{command}', payload=payload.encode())
+        return self.channel.handle(message.topic, message.payload)
+
+    async def test_call(self):
+        self.assertEqual(self.send('call'), 'dispatched')
+        self.assertEqual(self.lift.state, 'lowering')
+
+    async def test_stop_is_an_estop(self):
+        self.send('call', id='1')
+        self.assertEqual(self.send('stop', id='2'), 'dispatched')
+        self.assertEqual(self.lift.state, 'stopped')
+        self.assertMotorStopped()
+
+    async def test_duplicate_ignored(self):
+        self.send('call', id='1')
+        self.assertEqual(self.send('call', id='1'), 'duplicate')
+        # A second call would have stopped the lift
+        self.assertEqual(self.lift.state, 'lowering')
+
+    async def test_stale_ignored(self):
+        self.assertEqual(self.send('call', sent_at=self.now - 2), 'stale')
+        self.assertEqual(self.lift.state, 'stopped')
+
+    async def test_future_ignored(self):
+        with self.assertLogs('dumb_waiter.commands', 'WARNING'):
+            self.assertEqual(self.send('call', sent_at=self.now + 2), 'future')
+        self.assertEqual(self.lift.state, 'stopped')
+        # A clock a little ahead of ours is fine.
+        self.assertEqual(self.send('call', sent_at=self.now + 0.05), 'dispatched')
+
+    async def test_stop_is_never_refused(self):
+        for n, sent_at in enumerate((self.now - 2, self.now + 2, self.now)):
+            self.send('call', id=f'call{n}')
+            self.assertEqual(self.lift.state, 'lowering')
+            with self.subTest(sent_at=sent_at):
+                self.assertEqual(self.send('stop', id='stop', sent_at=sent_at), 'dispatched')
+                self.assertEqual(self.lift.state, 'stopped')
+                self.assertMotorStopped()
+        self.send('call', id='call3')
+        self.assertEqual(self.channel.handle('dumbwaiter/lift/command/stop', b'not json'), 'dispatched')
+        self.assertEqual(self.lift.state, 'stopped')
+
+    async def test_bad_commands(self):
+        self.assertEqual(self.send('open_door'), 'unknown')
+        self.assertEqual(self.send('call', topic='dumbwaiter/other_lift/command/call'), 'unknown')
+        self.assertEqual(self.channel.handle('dumbwaiter/lift/command/call', b'not json'), 'invalid')
+        self.assertEqual(self.channel.handle('dumbwaiter/lift/command/call', b'{"id": 1}'), 'invalid')
+
+    async def test_not_allowed(self):
+        # Before the lift is initialised nothing is allowed
+        channel = CommandChannel(FakeLift().machine, clock=lambda: self.now)
+        payload = json.dumps({'id': '1', 'sent_at': self.now}).encode()
+        self.assertEqual(channel.handle('dumbwaiter/lift/command/stop', payload), 'not_allowed')
+
+    async def test_latency_measured(self):
+        self.send('call', id='1', sent_at=self.now - 0.1)
+        self.send('call', id='2', sent_at=self.now - 5)
+        summary = self.channel.summary()
+        self.assertEqual(summary['dispatch']['count'], 2)
+        self.assertEqual(summary['age']['count'], 2)
+        self.assertEqual(summary['results'], {'dispatched': 1, 'stale': 1})
+
+    async def test_paho_message_callback(self):
+        message = SimpleNamespace(topic='dumbwaiter/lift/command/call',
+            payload=json.dumps({'id': 'x', 'sent_at': self.now}).encode())
+        self.channel.on_message(None, None, message)
+        self.assertEqual(self.lift.state, 'lowering')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+
+from statemachine.exceptions import TransitionNotAllowed
+
+from dumb_waiter.compiled import CompiledLiftLogic, EVENTS, INPUTS, STATES
+from dumb_waiter.fake import FakeDigitalInput, FakeDigitalOutput, FakeLift
+from dumb_waiter.logic import LiftLogicMachine, LiftLogicModel
+
+from .harness import LiftTestCase, VirtualTimeTestCase
+
+
+def fake_model(mask):
+    inputs = {name: FakeDigitalInput(bool(mask & (1 << bit))) for bit, name in enumerate(INPUTS)}
+    outputs = {name: FakeDigitalOutput(name) for name in FakeLift.output_names}
+    return LiftLogicModel(**inputs, **outputs)
+
+
+def outcome(model, machine, event):
+    '''Fire the event, and return everything we can see of what happened'''
+    try:
+        getattr(machine, event)()
+        raised = None
+    except TransitionNotAllowed as error:
+        raised = str(error)
+    return (
+        raised,
+        machine.current_state.id,
+        model.state,
+        tuple(getattr(model, name).value for name in FakeLift.output_names),
+        tuple(model.scheduler.pending()),
+    )
+
+
+class TestCompiledEquivalence(VirtualTimeTestCase):
+
+    async def test_every_state_event_and_input(self):
+        for state in STATES:
+            for event in EVENTS:
+                for mask in range(1 << len(INPUTS)):
+                    results = []
+                    for machine_class in (LiftLogicMachine, CompiledLiftLogic):
+                        model = fake_model(mask)
+                        machine = machine_class(model, start_value=state)
+                        results.append(outcome(model, machine, event))
+                        model.scheduler.cancel_all()
+                    with self.subTest(state=state, event=event, mask=mask):
+                        self.assertEqual(results[0], results[1])
+
+    async def test_initial_state(self):
+        lifts = [FakeLift(), FakeLift(compiled=True)]
+        for lift in lifts:
+            self.assertEqual(lift.state, 'turned_on')
+        self.assertEqual(
+            [o.value for o in lifts[0].outputs.values()],
+            [o.value for o in lifts[1].outputs.values()])
+
+
+class CompiledLiftTestCase(LiftTestCase):
+
+    def setUp(self):
+        self.lift = FakeLift(safety_time=self.safety_time, compiled=True)
+        self.inputs = self.lift.inputs
+        self.outputs = self.lift.outputs
+        self.llm = self.lift.machine
+        self.lift.close_doors()
+        self.llm.initialise()
+
+
+class TestCompiledTrips(CompiledLiftTestCase):
+
+    async def test_round_trip(self):
+        self.lift.press('call_top')
+        self.inputs['lower_limit'].on()
+        self.assertEqual(self.lift.state, 'stopped_at_bottom')
+        self.assertDoorsLocked(False)
+        self.lift.press('call_top')
+        self.assertEqual(self.lift.state, 'rising')
+        self.assertDoorsLocked()
+        self.inputs['lower_limit'].off()
+        self.inputs['upper_limit'].on()
+        self.assertEqual(self.lift.state, 'stopped_at_top')
+        self.assertMotorStopped()
+
+    async def test_safety_timeout(self):
+        self.lift.press('call_top')
+        await self.settle(self.safety_time * 1.1)
+        self.assertEqual(self.lift.state, 'stopped')
+        self.assertMotorStopped()
+
+    async def test_not_allowed(self):
+        with self.assertRaises(TransitionNotAllowed):
+            self.llm.stop_rising()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import asyncio
+import unittest
+
+from dumb_waiter.debounce import Debounce, DebouncedInput, collapse
+from dumb_waiter.fake import FakeDigitalInput, FakeDigitalOutput
+from dumb_waiter.logic import LiftLogicMachine, LiftLogicModel
+
+from .harness import VirtualTimeTestCase
+
+
+class TestDebouncedInput(VirtualTimeTestCase):
+
+    def make(self, window, glitch=0.0):
+        self.pin = FakeDigitalInput()
+        self.input = DebouncedInput(self.pin, Debounce(window, glitch=glitch))
+        self.edges = []
+        self.input.rising_edge_callback = lambda: self.edges.append((True, self.loop.time()))
+        self.input.falling_edge_callback = lambda: self.edges.append((False, self.loop.time()))
+
+    async def chatter(self, times=5, gap=0.001):
+        for _ in range(times):
+            self.pin.on()
+            await asyncio.sleep(gap)
+            self.pin.off()
+            await asyncio.sleep(gap)
+
+    async def test_first_edge_goes_straight_through(self):
+        self.make(0.05)
+        start = self.loop.time()
+        self.pin.on()
+        self.assertEqual(self.edges, [(True, start)])
+        self.assertTrue(self.input())
+
+    async def test_chatter_is_one_press(self):
+        self.make(0.05)
+        await self.chatter()
+        await asyncio.sleep(0.1)
+        self.assertEqual([rising for rising, _ in self.edges], [True, False])
+        self.assertFalse(self.input())
+
+    async def test_ends_up_at_the_real_level(self):
+        self.make(0.05)
+        await self.chatter()
+        self.pin.on()
+        await asyncio.sleep(0.1)
+        self.assertEqual([rising for rising, _ in self.edges], [True])
+        self.assertTrue(self.input())
+
+    async def test_glitch_is_ignored(self):
+        self.make(0.05, glitch=0.005)
+        self.pin.on()
+        await asyncio.sleep(0.002)
+        self.pin.off()
+        await asyncio.sleep(0.1)
+        self.assertEqual(self.edges, [])
+
+    async def test_glitch_delays_real_edge(self):
+        self.make(0.05, glitch=0.005)
+        start = self.loop.time()
+        self.pin.on()
+        await asyncio.sleep(0.1)
+        self.assertEqual(len(self.edges), 1)
+        self.assertAlmostEqual(self.edges[0][1] - start, 0.005)
+
+    async def test_no_window_passes_everything(self):
+        self.make(0)
+        await self.chatter(times=3, gap=0)
+        self.assertEqual(len(self.edges), 6)
+
+
+class TestCollapse(VirtualTimeTestCase):
+
+    async def test_double_call_does_not_stop_the_lift(self):
+        inputs = {name: FakeDigitalInput() for name in (
+            'estop1', 'estop2', 'lower_limit', 'upper_limit', 'upper_door_closed', 'lower_door_closed')}
+        inputs['upper_door_closed'].var = True
+        inputs['lower_door_closed'].var = True
+        outputs = {name: FakeDigitalOutput(name) for name in (
+            'raise_lift', 'lower_lift', 'lock_door_top', 'lock_door_bottom')}
+        llm = LiftLogicMachine(LiftLogicModel(safety_time=23, **inputs, **outputs))
+        llm.initialise()
+
+        call = collapse(lambda: llm.call(), 1.0, name='call')
+        call()
+        await asyncio.sleep(0.3)
+        call()
+        self.assertEqual(llm.current_state.id, 'lowering')
+        await asyncio.sleep(1)
+        call()
+        self.assertEqual(llm.current_state.id, 'stopped')
+
+
+if __name__ == '__main__':
+    unittest.main()
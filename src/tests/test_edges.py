@@ -0,0 +1,68 @@
+import asyncio
+import unittest
+from unittest import IsolatedAsyncioTestCase
+
+from dumb_waiter.fake import FakeDigitalInput
+from dumb_waiter.input_state import InputState
+
+
+class TestEdges(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.input = FakeDigitalInput()
+
+    async def test_wait_for_edge(self):
+        waiter = asyncio.create_task(self.input.wait_for_edge())
+        await asyncio.sleep(0)
+        self.input.on()
+        edge = await waiter
+        self.assertTrue(edge.rising)
+        self.assertAlmostEqual(edge.time, asyncio.get_running_loop().time(), places=2)
+
+    async def test_wait_for_falling_edge(self):
+        waiter = asyncio.create_task(self.input.wait_for_edge(rising=False))
+        await asyncio.sleep(0)
+        self.input.on()
+        await asyncio.sleep(0)
+        self.assertFalse(waiter.done())
+        self.input.off()
+        self.assertFalse((await waiter).rising)
+
+    async def test_several_waiters_and_the_callback(self):
+        fired = []
+        self.input.rising_edge_callback = lambda: fired.append(True)
+        waiters = [asyncio.create_task(self.input.wait_for_edge()) for _ in range(3)]
+        await asyncio.sleep(0)
+        self.input.on()
+        edges = await asyncio.gather(*waiters)
+        self.assertEqual(len(set(edges)), 1)
+        self.assertEqual(fired, [True])
+
+    async def test_cancelled_waiter_is_forgotten(self):
+        waiter = asyncio.create_task(self.input.wait_for_edge())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        self.assertEqual(self.input._edge_waiters, [])
+        self.input.on()
+
+    async def test_stream_keeps_every_edge(self):
+        with self.input.edges() as edges:
+            self.input.on()
+            self.input.off()
+            self.input.toggle()
+            received = [await anext(edges) for _ in range(3)]
+        self.assertEqual([edge.rising for edge in received], [True, False, True])
+        self.assertEqual(self.input._edge_streams, [])
+
+    async def test_cached_input_streams(self):
+        state = InputState()
+        cached = state.add('door', self.input)
+        with cached.edges() as edges:
+            self.input.on()
+            self.assertTrue((await anext(edges)).rising)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+
+import numpy as np
+
+from dumb_waiter.compiled import EVENTS, INPUTS, STATES
+from dumb_waiter.fleet import FleetSimulator, cross_check, transition_arrays
+from dumb_waiter.simulator import LiftPhysics
+
+
+def mask(*names):
+    return sum(1 << INPUTS.index(name) for name in names)
+
+
+class TestTransitionArrays(unittest.TestCase):
+
+    def test_matches_lift_logic(self):
+        target, enters = transition_arrays()
+        call = EVENTS.index('call')
+        at_bottom = mask('lower_limit', 'upper_door_closed', 'lower_door_closed')
+        self.assertEqual(STATES[target[STATES.index('stopped_at_bottom'), call, at_bottom]], 'rising')
+        self.assertTrue(enters[STATES.index('stopped_at_bottom'), call, at_bottom])
+        # Not allowed, without the lower limit
+        self.assertEqual(target[STATES.index('stopped_at_bottom'), call, mask('upper_door_closed')], -1)
+        # A door opening while stopped is an internal transition
+        door_opens = EVENTS.index('door_opens')
+        self.assertEqual(STATES[target[STATES.index('stopped_at_top'), door_opens, 0]], 'stopped_at_top')
+        self.assertFalse(enters[STATES.index('stopped_at_top'), door_opens, 0])
+
+
+class TestFleet(unittest.TestCase):
+
+    def test_round_trips(self):
+        report = FleetSimulator(100).run(3600)
+        self.assertEqual(report.safety_timeouts.sum(), 0)
+        self.assertEqual(report.faults.sum(), 0)
+        # Like LiftSimulator: 10 s of travel, plus 8 s to open the door, load and call.
+        np.testing.assert_allclose(report.trips_per_hour, 3600 / 18, atol=5)
+        self.assertEqual(report.wait_percentile(0.5), 10.5)
+
+    def test_settings_for_each_lift(self):
+        # The first lift's safety_time is shorter than the 10 s it takes to go from bottom to top.
+        report = FleetSimulator(2, safety_time=np.array([7, 23])).run(3600)
+        self.assertGreater(report.safety_timeouts[0], 0)
+        self.assertEqual(report.safety_timeouts[1], 0)
+        self.assertGreater(report.trips[1], report.trips[0])
+        self.assertGreater(report.summary()['safety_timeouts_per_lift_hour'], 0)
+
+    def test_random_delays_are_repeatable(self):
+        def run(seed):
+            sim = FleetSimulator(50, LiftPhysics(), random_delays=True, rng=np.random.default_rng(seed))
+            return sim.run(3600).trips
+
+        np.testing.assert_array_equal(run(1), run(1))
+        self.assertFalse(np.array_equal(run(1), run(2)))
+
+    def test_agrees_with_lift_simulator(self):
+        self.assertEqual(cross_check(20, 1800, seed=3), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
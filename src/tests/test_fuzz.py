@@ -0,0 +1,89 @@
+import logging
+import os
+import tempfile
+import unittest
+from unittest import TestCase
+
+from dumb_waiter.fuzz import check_sequence, load_failure, run_campaign, run_shard, save_failure, shrink
+
+
+def never_rise(lift):
+    if lift.outputs['raise_lift'].value:
+        return 'rising'
+
+
+class TestFuzz(TestCase):
+
+    def test_random_sequences_are_safe(self):
+        result = run_shard(shard=0, runs=200, length=50, seed=1, safety_time=5)
+        self.assertEqual(result.runs, 200)
+        self.assertGreater(result.transitions, 0)
+        self.assertEqual(result.failures, [])
+
+    def test_shard_leaves_logging_alone(self):
+        root = logging.getLogger()
+        level = root.level
+        root.setLevel(logging.DEBUG)
+        self.addCleanup(root.setLevel, level)
+        run_shard(shard=0, runs=1, length=5, seed=1, safety_time=5)
+        self.assertEqual(root.level, logging.DEBUG)
+
+    def test_violation_is_found(self):
+        steps = [
+            ('set', 'upper_door_closed', True),
+            ('set', 'lower_door_closed', True),
+            ('event', 'call'),
+            ('set', 'lower_limit', True),
+            ('event', 'call'),
+        ]
+        violation = check_sequence(steps, 5, invariants=[never_rise]).violation
+        self.assertEqual(violation.step, 4)
+        self.assertEqual(violation.message, 'rising')
+
+    def test_shrink(self):
+        steps = [
+            ('set', 'estop1', True),
+            ('wait', 10),
+            ('set', 'upper_door_closed', True),
+            ('event', 'door_opens'),
+            ('set', 'estop1', False),
+            ('set', 'lower_door_closed', True),
+            ('event', 'call'),
+            ('wait', 0.5),
+            ('event', 'stop_rising'),
+            ('set', 'lower_limit', True),
+            ('set', 'upper_limit', False),
+            ('event', 'call'),
+            ('event', 'call'),
+        ]
+        shrunk = shrink(steps, 5, invariants=[never_rise])
+        self.assertEqual(shrunk, [
+            ('set', 'upper_door_closed', True),
+            ('set', 'lower_door_closed', True),
+            ('event', 'call'),
+            ('set', 'lower_limit', True),
+            ('event', 'call'),
+        ])
+
+    def test_save_and_load(self):
+        failure = {'seed': 3, 'message': 'rising', 'steps': [('event', 'call')], 'shrunk': [('event', 'call')]}
+        with tempfile.TemporaryDirectory() as out_dir:
+            path = save_failure(failure, 5, out_dir)
+            self.assertTrue(os.path.exists(path))
+            self.assertEqual(load_failure(path), ([('event', 'call')], 5))
+
+    def test_campaign(self):
+        report = run_campaign(runs=40, length=20, jobs=2, seed=7)
+        self.assertEqual(report.runs, 40)
+        self.assertEqual(report.failures, [])
+        self.assertGreater(report.transitions_per_second, 0)
+
+    def test_campaign_runs_exactly_as_many_as_asked(self):
+        for runs in (3, 11):
+            with self.subTest(runs=runs):
+                report = run_campaign(runs=runs, length=5, jobs=2, seed=7)
+                self.assertEqual(report.runs, runs)
+
+
+if __name__ == '__main__':
+    unittest.main()
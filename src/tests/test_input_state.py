@@ -0,0 +1,127 @@
+import asyncio
+import unittest
+from unittest import TestCase
+
+from dumb_waiter.fake import FakeDigitalInput, FakeLift
+from dumb_waiter.input_state import InputState
+from dumb_waiter.logic import MODEL_INPUTS
+
+from .harness import LiftTestCase
+
+
+class CountingInput(FakeDigitalInput):
+    reads = 0
+
+    def __call__(self):
+        self.reads += 1
+        return super().__call__()
+
+
+class TestInputState(TestCase):
+
+    def setUp(self):
+        self.state = InputState()
+        self.pin = CountingInput()
+        self.cached = self.state.add('door', self.pin)
+        self.edges = []
+        self.cached.rising_edge_callback = lambda: self.edges.append(('rising', self.cached()))
+        self.cached.falling_edge_callback = lambda: self.edges.append(('falling', self.cached()))
+
+    def test_edges_update_the_mask_before_the_callback(self):
+        self.pin.on()
+        self.pin.off()
+        self.assertEqual(self.edges, [('rising', True), ('falling', False)])
+
+    def test_reads_do_not_touch_the_pin(self):
+        reads = self.pin.reads
+        self.pin.on()
+        for _ in range(10):
+            self.assertTrue(self.cached())
+        self.assertEqual(self.pin.reads, reads)
+
+    def test_initial_level(self):
+        pin = FakeDigitalInput(True)
+        self.assertTrue(self.state.add('estop', pin)())
+        self.assertEqual(self.state.mask, 0b10)
+
+    def test_reconcile_fires_missed_edges(self):
+        self.pin.var = True
+        with self.assertLogs('dumb_waiter.input_state', 'WARNING'):
+            self.assertEqual(self.state.reconcile(), self.cached.bit)
+        self.assertTrue(self.cached())
+        self.assertEqual(self.edges, [('rising', True)])
+        self.assertEqual(self.state.reconcile(), 0)
+
+
+class TestCachedLift(LiftTestCase):
+
+    def setUp(self):
+        self.lift = FakeLift(safety_time=self.safety_time, cached=True)
+        self.inputs = self.lift.inputs
+        self.outputs = self.lift.outputs
+        self.llm = self.lift.machine
+        self.lift.close_doors()
+        self.llm.initialise()
+
+    async def test_mask_follows_inputs(self):
+        state = self.lift.input_state
+        closed = (1 << MODEL_INPUTS.index('upper_door_closed')) | (1 << MODEL_INPUTS.index('lower_door_closed'))
+        self.assertEqual(state.mask, closed)
+        self.inputs['estop2'].on()
+        self.assertEqual(state.mask, closed | 1 << MODEL_INPUTS.index('estop2'))
+
+    async def test_estop_stops_lift(self):
+        self.lift.press('call_top')
+        self.assertEqual(self.lift.state, 'lowering')
+        self.inputs['estop1'].on()
+        self.assertEqual(self.lift.state, 'stopped')
+        self.lift.press('call_top')
+        self.assertEqual(self.lift.state, 'stopped')
+        self.assertMotorStopped()
+
+    async def test_reconcile_carries_on_after_a_callback_raises(self):
+        state = self.lift.input_state
+        # Edges missed while stopped, the first of which the lift logic won't take.
+        self.inputs['lower_limit'].var = True
+        self.inputs['upper_door_closed'].var = False
+        self.inputs['estop1'].var = True
+        errors = []
+        self.loop.set_exception_handler(lambda loop, context: errors.append(context['exception']))
+        with self.assertLogs('dumb_waiter.input_state', 'WARNING'):
+            state.reconcile()
+        self.assertEqual(len(errors), 1)
+        self.assertIn('stop_lowering', str(errors[0]))
+        self.assertTrue(self.llm.model.estop1())
+        self.assertFalse(self.llm.model.upper_door_closed())
+        self.assertEqual(state.reconcile(), 0)
+        self.lift.press('call_top')
+        self.assertEqual(self.lift.state, 'stopped')
+        self.assertMotorStopped()
+
+    async def test_reconcile_forever_survives_a_callback_raising(self):
+        self.loop.set_exception_handler(lambda loop, context: None)
+        task = asyncio.create_task(self.lift.input_state.reconcile_forever(1))
+        self.inputs['lower_limit'].var = True
+        with self.assertLogs('dumb_waiter.input_state', 'WARNING'):
+            await self.settle(1.5)
+        self.inputs['estop1'].var = True
+        with self.assertLogs('dumb_waiter.input_state', 'WARNING'):
+            await self.settle(1)
+        self.assertFalse(task.done())
+        self.assertTrue(self.llm.model.estop1())
+        task.cancel()
+
+    async def test_compiled_uses_the_mask(self):
+        lift = FakeLift(cached=True, compiled=True)
+        self.assertIs(lift.machine._input_state, lift.input_state)
+        lift.close_doors()
+        lift.machine.initialise()
+        lift.press('call_top')
+        self.assertEqual(lift.state, 'lowering')
+        lift.inputs['lower_limit'].on()
+        self.assertEqual(lift.state, 'stopped_at_bottom')
+        lift.model.scheduler.cancel_all()
+
+
+if __name__ == '__main__':
+    unittest.main()
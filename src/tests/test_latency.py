@@ -0,0 +1,53 @@
+import unittest
+from unittest import TestCase
+
+from dumb_waiter.latency import LatencyHistogram, LatencyMonitor
+
+
+class TestLatencyHistogram(TestCase):
+
+    def test_empty(self):
+        h = LatencyHistogram()
+        self.assertEqual(h.percentile(0.99), 0)
+        self.assertEqual(h.summary()['count'], 0)
+
+    def test_percentiles(self):
+        h = LatencyHistogram()
+        for _ in range(99):
+            h.record(1000)
+        h.record(1_000_000)
+        self.assertEqual(h.count, 100)
+        self.assertEqual(h.max, 1_000_000)
+        # Buckets are powers of two, so the percentiles are upper bounds within a factor of 2.
+        self.assertGreaterEqual(h.percentile(0.5), 1000)
+        self.assertLess(h.percentile(0.5), 2000)
+        self.assertLess(h.percentile(0.99), 2000)
+        self.assertEqual(h.percentile(1.0), 1_000_000)
+
+
+class TestLatencyMonitor(TestCase):
+
+    def test_outputs_changed_by_an_edge_are_attributed_to_it(self):
+        monitor = LatencyMonitor()
+        monitor.run_edge('upper_limit', 0, monitor.output_changed)
+        self.assertEqual(monitor.dispatch['upper_limit'].count, 1)
+        self.assertEqual(monitor.edge_to_output['upper_limit'].count, 1)
+
+    def test_output_changes_outside_an_edge_are_ignored(self):
+        monitor = LatencyMonitor()
+        monitor.run_edge('call_pb_top', 0, lambda: None)
+        monitor.output_changed()
+        self.assertEqual(dict(monitor.edge_to_output), {})
+
+    def test_callback_exceptions_end_the_edge(self):
+        monitor = LatencyMonitor()
+        def fail():
+            raise RuntimeError()
+        with self.assertRaises(RuntimeError):
+            monitor.run_edge('estop_top', 0, fail)
+        monitor.output_changed()
+        self.assertEqual(dict(monitor.edge_to_output), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import asyncio
+import unittest
+from unittest import IsolatedAsyncioTestCase
+
+from dumb_waiter.lgpio_group import GroupLiftPins, bcm
+from dumb_waiter.logic import LiftLogicMachine
+from dumb_waiter.pins import INPUT_PINS
+
+
+class FakeLgpio:
+    '''Just enough of lgpio for GroupLiftPins, remembering every group write'''
+
+    SET_PULL_UP = 32
+
+    def __init__(self):
+        self.groups = {}
+        # Pulled up, so everything reads high until it is activated
+        self.levels = {}
+        self.writes = []
+
+    def gpiochip_open(self, chip):
+        return 1
+
+    def gpiochip_close(self, handle):
+        pass
+
+    def group_claim_input(self, handle, gpios, lFlags=0):
+        self.groups[gpios[0]] = gpios
+        for gpio in gpios:
+            self.levels[gpio] = 1
+
+    def group_claim_output(self, handle, gpios, levels):
+        self.groups[gpios[0]] = gpios
+        for gpio, level in zip(gpios, levels):
+            self.levels[gpio] = level
+
+    def group_free(self, handle, gpio):
+        del self.groups[gpio]
+
+    def group_read(self, handle, gpio):
+        gpios = self.groups[gpio]
+        return len(gpios), sum(self.levels[g] << n for n, g in enumerate(gpios))
+
+    def group_write(self, handle, gpio, bits, mask):
+        self.writes.append((gpio, bits, mask))
+        for n, g in enumerate(self.groups[gpio]):
+            if mask & (1 << n):
+                self.levels[g] = (bits >> n) & 1
+
+
+class TestGroupLiftPins(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.lgpio = FakeLgpio()
+        # The edges are fed in by the tests, rather than by the polling thread.
+        self.pins = GroupLiftPins(lgpio=self.lgpio, poll_interval=3600)
+        self.activate('door_closed_level1')
+        self.activate('door_closed_ground')
+        self.llm = LiftLogicMachine(self.pins.model(safety_time=23))
+        self.pins.wire_up(self.llm)
+        self.llm.initialise()
+        await asyncio.sleep(0)
+
+    async def asyncTearDown(self):
+        self.pins.close()
+
+    def drive(self, name, level):
+        self.lgpio.levels[bcm(INPUT_PINS[name])] = level
+        self.pins.inputs.update(self.pins.inputs._read())
+
+    def activate(self, name):
+        self.drive(name, 0)
+
+    def press(self, name):
+        self.drive(name, 0)
+        self.drive(name, 1)
+
+    async def test_doors_locked_at_start(self):
+        self.assertTrue(self.pins.lock_door_top.value)
+        self.assertTrue(self.pins.lock_door_bottom.value)
+        # The relays are active low
+        self.assertEqual(self.lgpio.levels[bcm("BOARD31")], 0)
+        self.assertEqual(self.lgpio.levels[bcm("BOARD33")], 0)
+
+    async def test_locks_are_claimed_on(self):
+        # So locking them when the lift logic starts doesn't need writing.
+        self.assertEqual(self.lgpio.writes, [])
+
+    async def test_both_locks_in_one_write(self):
+        self.press('call_pb_top')
+        await asyncio.sleep(0)
+        self.activate('lower_limit')
+        await asyncio.sleep(0)
+        _, _, mask = self.lgpio.writes[-1]
+        self.assertEqual(mask, 0b1100)
+
+    async def test_one_write_per_transition(self):
+        self.press('call_pb_top')
+        await asyncio.sleep(0)
+        self.assertTrue(self.pins.drive_lift_down.value)
+        self.assertEqual(len(self.lgpio.writes), 1)
+
+        # The motor stops straight away, and both doors unlock in one go after.
+        self.activate('lower_limit')
+        self.assertFalse(self.pins.drive_lift_down.value)
+        self.assertEqual(len(self.lgpio.writes), 2)
+        self.assertEqual(self.lgpio.writes[-1][2], 0b0010)
+        await asyncio.sleep(0)
+        self.assertFalse(self.pins.lock_door_top.value)
+        self.assertEqual(len(self.lgpio.writes), 3)
+        self.assertEqual(self.lgpio.writes[-1][2], 0b1100)
+
+    async def test_motor_off_does_not_wait_behind_other_callbacks(self):
+        self.press('call_pb_top')
+        await asyncio.sleep(0)
+        writes = len(self.lgpio.writes)
+        ran = []
+        asyncio.get_running_loop().call_soon(lambda: ran.append(self.lgpio.writes[-1][2]))
+        self.llm.estop_pressed()
+        self.assertEqual(len(self.lgpio.writes), writes + 1)
+        await asyncio.sleep(0)
+        self.assertEqual(ran, [0b0010])
+
+    async def test_inputs_read_from_the_last_group_read(self):
+        self.assertTrue(self.pins.door_closed_ground())
+        self.assertFalse(self.pins.call_pb_bottom())
+        self.lgpio.levels[bcm(INPUT_PINS['call_pb_bottom'])] = 0
+        self.assertFalse(self.pins.call_pb_bottom())
+        self.pins.inputs.update(self.pins.inputs._read())
+        self.assertTrue(self.pins.call_pb_bottom())
+
+
+if __name__ == '__main__':
+    unittest.main()
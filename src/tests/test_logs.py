@@ -0,0 +1,89 @@
+import io
+import logging
+import queue
+import threading
+import unittest
+from logging.handlers import QueueListener
+
+from dumb_waiter.fake import FakeLift
+from dumb_waiter.logs import JournalHandler, LazyQueueHandler
+
+from .harness import LiftTestCase
+
+
+class _Formatted:
+    '''Notes which thread it was formatted on'''
+
+    def __init__(self):
+        self.thread = None
+
+    def __str__(self):
+        self.thread = threading.current_thread()
+        return 'formatted'
+
+
+class TestLazyQueueHandler(unittest.TestCase):
+
+    def test_formatted_by_the_listener(self):
+        records = queue.SimpleQueue()
+        stream = io.StringIO()
+        listener = QueueListener(records, logging.StreamHandler(stream))
+        logger = logging.getLogger('test_logs.lazy')
+        logger.propagate = False
+        handler = LazyQueueHandler(records)
+        logger.addHandler(handler)
+        try:
+            listener.start()
+            argument = _Formatted()
+            logger.warning('Was %s', argument)
+            listener.stop()
+        finally:
+            logger.removeHandler(handler)
+        self.assertEqual(stream.getvalue(), 'Was formatted\n')
+        self.assertIsNotNone(argument.thread)
+        self.assertIsNot(argument.thread, threading.current_thread())
+
+
+class TestJournalHandler(unittest.TestCase):
+
+    def test_structured_fields(self):
+        sent = []
+        handler = JournalHandler(send=lambda message, **fields: sent.append((message, fields)))
+        logger = logging.getLogger('test_logs.journal')
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        logger.addHandler(handler)
+        try:
+            logger.info('Entering %s', 'rising', extra={'lift': 'kitchen', 'state': 'rising'})
+            logger.error('Plain')
+        finally:
+            logger.removeHandler(handler)
+        (message, fields), (plain, plain_fields) = sent
+        self.assertEqual(message, 'Entering rising')
+        self.assertEqual(fields['PRIORITY'], '6')
+        self.assertEqual(fields['LIFT'], 'kitchen')
+        self.assertEqual(fields['STATE'], 'rising')
+        self.assertEqual(fields['LOGGER'], 'test_logs.journal')
+        self.assertNotIn('EVENT', fields)
+        self.assertEqual(plain_fields['PRIORITY'], '3')
+        self.assertNotIn('LIFT', plain_fields)
+
+
+class TestUnsafeToMoveMessage(LiftTestCase):
+    doors_closed = False
+
+    async def test_reports_the_inputs_it_moved_on(self):
+        for compiled in (False, True):
+            with self.subTest(compiled=compiled):
+                lift = FakeLift(compiled=compiled)
+                lift.inputs['lower_door_closed'].on()
+                lift.machine.initialise()
+                with self.assertLogs('dumb_waiter.logic', 'INFO') as logs:
+                    lift.press('call_top')
+                self.assertEqual(lift.state, 'stopped')
+                self.assertIn('Not safe to move. Estops=[False False] lower_door_closed=True, '
+                    'upper_door_closed=False', logs.output[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,88 +1,84 @@
-from unittest import IsolatedAsyncioTestCase
-from dataclasses import dataclass
-import asyncio
-
-import dumb_waiter
-from dumb_waiter.io import OutputFactory, InputFactory
-
-@dataclass
-class FakePin:
-    value: int
-
-class SetupLiftReadyToMove(IsolatedAsyncioTestCase):
-    def lift_up(self, value):
-        self.move_lift = 'up' if value else 'stopped'
-
-    def lift_down(self, value):
-        self.move_lift = 'down' if value else 'stopped'
-
-    def lock_doors(self, value):
-        self.doors = 'locked' if value else 'unlocked'
-
-    def setUp(self):
-        self.move_lift = None
-        self.doors = None
-        ofact = OutputFactory(comms=None)
-        ifact = InputFactory(comms=None)
-        lift = dumb_waiter.lift(
-            raise_lift=ofact(name='Raise Lift', callback=self.lift_up),
-            lower_lift=ofact(name='Lower Lift', callback=self.lift_down),
-            lock_doors=ofact(name='Lock Doors', callback=self.lock_doors),
-            call_button=ifact(name='Call Button', default=FakePin(False), kind='Button'),
-            limit_top=ifact(name='Limit Top', default=None),
-            limit_bottom=ifact(name='Limit Bottom', default=None),
-            door_closed_level1=ifact(name='Door Closed Level1', default=None),
-            door_closed_ground=ifact(name='Door Closed Ground', default=None),
-            estop=ifact(name='EStop', default=None),
-        )
-        self.lift = lift
-        self.lift.estop(FakePin(False))
-        self.lift.door_closed_ground(FakePin(True))
-        self.lift.door_closed_level1(FakePin(True))
-
-class TestUnknownPosMoveDown(SetupLiftReadyToMove):
+import unittest
+
+from .harness import LiftTestCase
 
-    async def test_unknown_position_move_down(self):
-        asyncio.create_task(self.lift.main())
-        await asyncio.sleep(1)
-        self.lift.call_button(None)
-        await asyncio.sleep(1)
-        self.assertEqual(self.move_lift,'down')
 
+class TestUnknownPosMoveDown(LiftTestCase):
 
+    async def test_unknown_position_move_down(self):
+        self.lift.press('call_top')
+        await self.settle()
+        self.assertEqual(self.lift.state, 'lowering')
+        self.assertTrue(self.outputs['lower_lift'].value)
+        self.assertFalse(self.outputs['raise_lift'].value)
 
 
-class TestMoveUp(SetupLiftReadyToMove):
+class TestMoveUp(LiftTestCase):
 
     async def test_on_bottom_limit_move_up(self):
-        self.lift.limit_bottom(FakePin(True))
-        asyncio.create_task(self.lift.main())
-        await asyncio.sleep(1)
-        self.lift.call_button(None)
-        await asyncio.sleep(1)
-        self.assertEqual(self.move_lift,'up')
+        self.lift.press('call_bottom')
+        self.inputs['lower_limit'].on()
+        await self.settle()
+        self.assertEqual(self.lift.state, 'stopped_at_bottom')
+        self.assertMotorStopped()
+        self.assertDoorsLocked(False)
+
+        self.lift.press('call_bottom')
+        await self.settle()
+        self.assertEqual(self.lift.state, 'rising')
+        self.assertTrue(self.outputs['raise_lift'].value)
+        self.assertDoorsLocked()
 
-class TestMoveDown(SetupLiftReadyToMove):
 
-    async def test_on_top_limit_move_up(self):
-        self.lift.limit_top(FakePin(True))
-        asyncio.create_task(self.lift.main())
-        await asyncio.sleep(1)
-        self.lift.call_button(None)
-        await asyncio.sleep(1)
-        self.assertEqual(self.move_lift,'down')
+class TestMoveDown(LiftTestCase):
 
-class TestMoveTimeOut(SetupLiftReadyToMove):
+    async def test_on_top_limit_move_down(self):
+        self.lift.press('call_top')
+        self.inputs['lower_limit'].on()
+        self.lift.press('call_top')
+        self.inputs['lower_limit'].off()
+        self.inputs['upper_limit'].on()
+        await self.settle()
+        self.assertEqual(self.lift.state, 'stopped_at_top')
+
+        self.lift.press('call_top')
+        await self.settle()
+        self.assertEqual(self.lift.state, 'lowering')
+        self.assertTrue(self.outputs['lower_lift'].value)
+
+
+class TestMoveTimeOut(LiftTestCase):
 
     async def test_timeout(self):
-        test_timeout = 3
-        dumb_waiter.logic.SAFETY_TIME = test_timeout
-        self.lift.limit_top(FakePin(True))
-        asyncio.create_task(self.lift.main())
-        await asyncio.sleep(1)
-        self.lift.call_button(None)
-        await asyncio.sleep(test_timeout*1.1)
-        self.assertEqual(self.move_lift,'stopped')
+        self.lift.press('call_top')
+        await self.settle(self.safety_time * 0.9)
+        self.assertTrue(self.outputs['lower_lift'].value)
+
+        await self.settle(self.safety_time * 0.2)
+        self.assertEqual(self.lift.state, 'stopped')
+        self.assertMotorStopped()
+
+    async def test_timeout_cancelled_by_stop(self):
+        self.lift.press('call_top')
+        await self.settle(self.safety_time * 0.8)
+        self.inputs['lower_limit'].on()
+        self.lift.press('call_bottom')
+        self.inputs['lower_limit'].off()
+        await self.settle(self.safety_time * 0.5)
+        # The first trip's timer would have fired by now, it must not stop the second trip.
+        self.assertEqual(self.lift.state, 'rising')
+        self.assertTrue(self.outputs['raise_lift'].value)
+
+        await self.settle(self.safety_time * 0.6)
+        self.assertEqual(self.lift.state, 'stopped')
+        self.assertMotorStopped()
+
+    async def test_timeout_is_virtual(self):
+        self.lift.press('call_top')
+        start = self.loop.time()
+        await self.settle(self.safety_time * 1.1)
+        self.assertGreaterEqual(self.loop.time() - start, self.safety_time)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,49 +1,49 @@
-from unittest import IsolatedAsyncioTestCase
-import asyncio
-from dataclasses import dataclass
+import unittest
 
-import dumb_waiter
-from dumb_waiter.io import OutputFactory, InputFactory
+from .harness import LiftTestCase
 
-output = False
 
-@dataclass
-class FakePin:
-    value: int
-
-class TestDoorsOpen(IsolatedAsyncioTestCase):
+class TestDoorsOpen(LiftTestCase):
     '''i.e. the estop is showing it's off, but the doors are not shut'''
-
-    def output_fired(self):
-        output = True
-
-    def setUp(self):
-        ofact = OutputFactory(comms=None)
-        ifact = InputFactory(comms=None)
-        lift = dumb_waiter.lift(
-            raise_lift=ofact(name='Raise Lift', callback=self.output_fired),
-            lower_lift=ofact(name='Lower Lift', callback=self.output_fired),
-            lock_doors=ofact(name='Lock Doors', callback=self.output_fired),
-            call_button=ifact(name='Call Button', default=FakePin(False), kind='Button'),
-            limit_top=ifact(name='Limit Top', default=None),
-            limit_bottom=ifact(name='Limit Bottom', default=None),
-            door_closed_level1=ifact(name='Door Closed Level1', default=None),
-            door_closed_ground=ifact(name='Door Closed Ground', default=None),
-            estop=ifact(name='EStop', default=None),
-        )
-        self.lift = lift
-
-
+    doors_closed = False
 
     async def test_no_move_while_doors_open(self):
-        pb=FakePin(value=True)
-        estop=FakePin(value=True)
-        asyncio.create_task(self.lift.main())
-        self.lift.estop(estop)
-        await asyncio.sleep(1)
-        self.lift.call_button(pb)
-        await asyncio.sleep(1)
-        self.assertEqual(output,False)
+        self.lift.press('call_top')
+        await self.settle()
+        self.assertEqual(self.lift.state, 'stopped')
+        self.assertMotorStopped()
+
+    async def test_no_move_while_one_door_open(self):
+        self.inputs['lower_door_closed'].on()
+        self.lift.press('call_bottom')
+        await self.settle()
+        self.assertMotorStopped()
+
+
+class TestEstop(LiftTestCase):
+
+    async def test_no_move_while_estop_pressed(self):
+        self.inputs['estop2'].on()
+        self.lift.press('call_top')
+        await self.settle()
+        self.assertEqual(self.lift.state, 'stopped')
+        self.assertMotorStopped()
+
+    async def test_estop_stops_moving_lift(self):
+        self.lift.press('call_top')
+        await self.settle()
+        self.assertTrue(self.outputs['lower_lift'].value)
+        self.inputs['estop1'].on()
+        await self.settle()
+        self.assertEqual(self.lift.state, 'stopped')
+        self.assertMotorStopped()
+
+    async def test_door_opening_stops_moving_lift(self):
+        self.lift.press('call_top')
+        self.inputs['upper_door_closed'].off()
+        await self.settle()
+        self.assertEqual(self.lift.state, 'stopped')
+        self.assertMotorStopped()
 
 
 if __name__ == '__main__':
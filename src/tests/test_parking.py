@@ -0,0 +1,159 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+
+from dumb_waiter.parking import CallHistory, IdleParking
+
+from .harness import LiftTestCase
+
+NOON = time.mktime((2024, 1, 1, 12, 30, 0, 0, 1, -1))
+
+
+class TestCallHistory(unittest.TestCase):
+
+    def test_most_called_floor_for_the_hour(self):
+        history = CallHistory()
+        self.assertIsNone(history.likely(NOON))
+        for _ in range(3):
+            history.record('bottom', NOON)
+        history.record('top', NOON)
+        for _ in range(5):
+            history.record('top', NOON + 6 * 3600)
+        self.assertEqual(history.likely(NOON), 'bottom')
+        self.assertEqual(history.likely(NOON + 6 * 3600), 'top')
+        # Nothing near midnight
+        self.assertIsNone(history.likely(NOON + 12 * 3600))
+
+    def test_neighbouring_hours_count_for_half(self):
+        history = CallHistory()
+        for _ in range(4):
+            history.record('top', NOON - 3600)
+            history.record('top', NOON + 3600)
+        history.record('bottom', NOON)
+        history.record('bottom', NOON)
+        self.assertEqual(history.likely(NOON), 'top')
+
+    def test_old_calls_fade(self):
+        history = CallHistory(decay=0.5, min_calls=1)
+        for _ in range(10):
+            history.record('top', NOON)
+        for _ in range(3):
+            history.record('bottom', NOON)
+        self.assertEqual(history.likely(NOON), 'bottom')
+
+    def test_saved_and_loaded(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'lift.json')
+            history = CallHistory(path)
+            for _ in range(5):
+                history.record('top', NOON)
+            self.assertEqual(CallHistory(path).likely(NOON), 'top')
+
+            with open(path, 'w') as f:
+                f.write('[]')
+            with self.assertLogs('dumb_waiter.parking', 'WARNING'):
+                self.assertIsNone(CallHistory(path).likely(NOON))
+
+
+class TestIdleParking(LiftTestCase):
+
+    async def asyncSetUp(self):
+        self.history = CallHistory()
+        for _ in range(5):
+            self.history.record('bottom', NOON)
+        self.parking = IdleParking(self.llm, self.history, idle_time=60, clock=lambda: NOON)
+        # Get the car to the top.
+        self.lift.press('call_top')
+        self.inputs['lower_limit'].on()
+        self.lift.press('call_bottom')
+        self.inputs['lower_limit'].off()
+        self.inputs['upper_limit'].on()
+        self.assertEqual(self.lift.state, 'stopped_at_top')
+
+    def tearDown(self):
+        self.lift.model.scheduler.cancel_all()
+        super().tearDown()
+
+    async def test_parks_after_idle_time(self):
+        await self.settle(59)
+        self.assertEqual(self.lift.state, 'stopped_at_top')
+        await self.settle(2)
+        self.assertEqual(self.lift.state, 'lowering')
+        self.assertEqual(self.parking.parked, 1)
+
+        self.inputs['upper_limit'].off()
+        self.inputs['lower_limit'].on()
+        self.assertEqual(self.lift.state, 'stopped_at_bottom')
+        await self.settle(120)
+        self.assertEqual(self.lift.state, 'stopped_at_bottom')
+        self.assertEqual(self.parking.parked, 1)
+
+    async def test_door_opening_starts_the_wait_again(self):
+        await self.settle(50)
+        self.inputs['upper_door_closed'].off()
+        await self.settle(30)
+        self.inputs['upper_door_closed'].on()
+        await self.settle(20)
+        self.assertEqual(self.lift.state, 'stopped_at_top')
+        await self.settle(20)
+        self.assertEqual(self.lift.state, 'lowering')
+
+    async def test_stays_if_a_door_is_open(self):
+        self.inputs['upper_door_closed'].off()
+        await self.settle(300)
+        self.assertEqual(self.lift.state, 'stopped_at_top')
+        self.assertEqual(self.parking.parked, 0)
+
+    async def test_stays_at_the_likely_floor(self):
+        for _ in range(10):
+            self.history.record('top', NOON)
+        await self.settle(120)
+        self.assertEqual(self.lift.state, 'stopped_at_top')
+
+    async def test_learns_from_the_call_buttons(self):
+        watching = asyncio.create_task(self.parking.watch_calls(self.inputs['call_top'], self.inputs['call_bottom']))
+        await self.settle()
+        # The presses move the car about too, which doesn't matter here.
+        for _ in range(10):
+            self.inputs['call_top'].on()
+            self.inputs['call_top'].off()
+            await self.settle(0)
+        await self.settle()
+        watching.cancel()
+        self.assertEqual(self.history.likely(NOON), 'top')
+
+
+    async def test_chatter_is_one_call(self):
+        history = self.parking.history = CallHistory()
+        watching = asyncio.create_task(self.parking.watch_calls(self.inputs['call_top'], self.inputs['call_bottom'],
+            call_holdoff=1.0))
+        await self.settle()
+        for _ in range(3):
+            self.inputs['call_top'].on()
+            self.inputs['call_top'].off()
+            await self.settle(0.1)
+        await self.settle(2)
+        self.inputs['call_top'].on()
+        self.inputs['call_top'].off()
+        await self.settle()
+        watching.cancel()
+        hour = time.localtime(NOON).tm_hour
+        self.assertAlmostEqual(history.counts['top'][hour], 1 + history.decay)
+
+    async def test_saves_are_put_off(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'lift.json')
+            history = CallHistory(path, save_delay=10)
+            for _ in range(5):
+                history.record('top', NOON)
+            await self.settle(9)
+            self.assertFalse(os.path.exists(path))
+            await self.settle(2)
+            await history.writing
+            self.assertEqual(CallHistory(path).likely(NOON), 'top')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import asyncio
+import unittest
+from unittest import IsolatedAsyncioTestCase
+
+from gpiozero import Device
+from gpiozero.pins.mock import MockFactory
+
+from dumb_waiter.latency import LatencyMonitor
+from dumb_waiter.logic import LiftLogicMachine
+from dumb_waiter.pins import LiftPins
+
+
+class TestLiftPins(IsolatedAsyncioTestCase):
+    '''The real pin classes, on gpiozero's mock pins'''
+
+    async def asyncSetUp(self):
+        Device.pin_factory = MockFactory()
+        self.monitor = LatencyMonitor()
+        self.pins = LiftPins(monitor=self.monitor)
+        # The inputs are pulled up, so driving them low activates them.
+        self.pins.door_closed_level1.dev.pin.drive_low()
+        self.pins.door_closed_ground.dev.pin.drive_low()
+        self.llm = LiftLogicMachine(self.pins.model(safety_time=23))
+        self.pins.wire_up(self.llm)
+        self.llm.initialise()
+
+    async def asyncTearDown(self):
+        Device.pin_factory.close()
+        Device.pin_factory = None
+
+    async def test_doors_locked_at_start(self):
+        self.assertTrue(self.pins.lock_door_top.value)
+        self.assertTrue(self.pins.lock_door_bottom.value)
+        # The relays are active low
+        self.assertFalse(self.pins.lock_door_top.dev.pin.state)
+
+    async def test_doors_locked_before_the_lift_logic_starts(self):
+        pins = LiftPins(output_pins={'lock_door_top': 'BOARD35', 'lock_door_bottom': 'BOARD37'}, input_pins={})
+        self.assertTrue(pins.lock_door_top.value)
+        self.assertTrue(pins.lock_door_bottom.value)
+
+    async def test_edges_reach_the_lift_logic(self):
+        call = self.pins.call_pb_top.dev.pin
+        call.drive_low()
+        call.drive_high()
+        await asyncio.sleep(0.01)
+        self.assertTrue(self.pins.drive_lift_down.value)
+
+        self.pins.lower_limit.dev.pin.drive_low()
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.llm.current_state.id, 'stopped_at_bottom')
+        self.assertFalse(self.pins.drive_lift_down.value)
+
+    async def test_wait_for_edge_without_callback(self):
+        waiter = asyncio.create_task(self.pins.upper_limit.wait_for_edge())
+        await asyncio.sleep(0)
+        self.pins.upper_limit.dev.pin.drive_low()
+        edge = await asyncio.wait_for(waiter, timeout=1)
+        self.assertTrue(edge.rising)
+        # Stamped when gpio saw it, before the loop got it
+        self.assertLessEqual(edge.time, asyncio.get_running_loop().time())
+
+    async def test_latency_is_recorded(self):
+        call = self.pins.call_pb_top.dev.pin
+        call.drive_low()
+        call.drive_high()
+        await asyncio.sleep(0.01)
+        self.pins.lower_limit.dev.pin.drive_low()
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.monitor.dispatch['call_pb_top'].count, 1)
+        self.assertEqual(self.monitor.edge_to_output['call_pb_top'].count, 1)
+        # The motor stopping, and both doors unlocking
+        self.assertEqual(self.monitor.edge_to_output['lower_limit'].count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import errno
+import os
+import unittest
+from unittest import mock
+
+from dumb_waiter import realtime
+
+
+class _Libc:
+    def __init__(self, result, error=0):
+        self.result = result
+        self.error = error
+        self.flags = None
+
+    def mlockall(self, flags):
+        self.flags = flags
+        realtime.ctypes.set_errno(self.error)
+        return self.result
+
+
+@unittest.skipUnless(hasattr(os, 'sched_setscheduler'), 'Needs Linux scheduling calls')
+class TestRealtime(unittest.TestCase):
+    # The system calls are mocked, so the tests don't make themselves real time.
+
+    def test_all_steps(self):
+        libc = _Libc(0)
+        with mock.patch('os.sched_setaffinity') as setaffinity, \
+                mock.patch('os.sched_getaffinity', return_value={0, 1, 2, 3}), \
+                mock.patch('os.sched_setscheduler') as setscheduler, \
+                mock.patch('ctypes.CDLL', return_value=libc):
+            with self.assertLogs('dumb_waiter.realtime', 'INFO'):
+                steps = realtime.enter_realtime(priority=60)
+        self.assertEqual(steps, {'cpu': True, 'fifo': True, 'mlock': True})
+        setaffinity.assert_called_once_with(0, {3})
+        self.assertEqual(setscheduler.call_args.args[1], os.SCHED_FIFO)
+        self.assertEqual(setscheduler.call_args.args[2].sched_priority, 60)
+        self.assertEqual(libc.flags, realtime.MCL_CURRENT | realtime.MCL_FUTURE)
+
+    def test_falls_back_without_privileges(self):
+        with mock.patch('os.sched_setaffinity', side_effect=OSError(errno.EINVAL, 'Invalid argument')), \
+                mock.patch('os.sched_setscheduler', side_effect=PermissionError(errno.EPERM, 'Not permitted')), \
+                mock.patch('ctypes.CDLL', return_value=_Libc(-1, errno.EPERM)):
+            with self.assertLogs('dumb_waiter.realtime', 'WARNING') as logs:
+                steps = realtime.enter_realtime(cpu=7)
+        self.assertEqual(steps, {'cpu': False, 'fifo': False, 'mlock': False})
+        self.assertEqual(len(logs.output), 3)
+        self.assertIn('CAP_SYS_NICE', logs.output[1])
+        self.assertIn('CAP_IPC_LOCK', logs.output[2])
+
+
+class TestMeasureJitter(unittest.TestCase):
+
+    def test_counts_wakeups(self):
+        lateness = realtime.measure_jitter(duration=0.05, interval=0.001)
+        self.assertGreater(lateness.count, 5)
+        self.assertLessEqual(lateness.count, 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
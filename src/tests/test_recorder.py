@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+
+from dumb_waiter.recorder import FlightRecorder, MAGIC, decode
+
+from .harness import LiftTestCase
+
+
+class TestFlightRecorder(LiftTestCase):
+
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.recorder = FlightRecorder(directory=self.directory.name)
+        self.recorder.attach(self.llm, self.inputs)
+
+    def tearDown(self):
+        self.directory.cleanup()
+        super().tearDown()
+
+    def descriptions(self):
+        header, records = decode(self.recorder.encode('test'))
+        return [(record.kind, record.description) for record in records]
+
+    async def test_records_edges_transitions_and_outputs(self):
+        self.lift.press('call_top')
+        self.inputs['lower_limit'].on()
+        self.assertEqual(self.descriptions(), [
+            ('edge', 'call_top rising'),
+            ('edge', 'call_top falling'),
+            ('output', 'lower_lift on'),
+            ('transition', 'call: stopped -> lowering'),
+            ('edge', 'lower_limit rising'),
+            ('output', 'lower_lift off'),
+            ('output', 'lock_door_top off'),
+            ('output', 'lock_door_bottom off'),
+            ('transition', 'stop_lowering: lowering -> stopped_at_bottom'),
+        ])
+
+    async def test_times_are_before_the_dump(self):
+        self.lift.press('call_top')
+        header, records = decode(self.recorder.encode('test'))
+        self.assertEqual(header['reason'], 'test')
+        self.assertTrue(all(-1 < record.time <= 0 for record in records))
+        self.assertEqual([record.time for record in records], sorted(record.time for record in records))
+
+    def test_keeps_the_latest(self):
+        recorder = FlightRecorder(capacity=5)
+        self.assertEqual(recorder.capacity, 8)
+        recorder.inputs = ['a']
+        for n in range(20):
+            recorder.record(1 << 24 | n % 2)
+        header, records = decode(recorder.encode('test'))
+        self.assertEqual(header['recorded'], 20)
+        self.assertEqual(len(records), 8)
+        self.assertEqual(records[-1].description, 'a rising')
+        self.assertEqual(records[0].description, 'a falling')
+
+    async def test_dumped_on_safety_timeout(self):
+        self.lift.press('call_top')
+        await self.settle(self.safety_time + 1)
+        await self.recorder.writing
+        [name] = os.listdir(self.directory.name)
+        self.assertTrue(name.endswith('-safety_timeout.dwfr'))
+        with open(os.path.join(self.directory.name, name), 'rb') as f:
+            header, records = decode(f.read())
+        self.assertEqual(records[-1].description, 'safety_timeout: lowering -> stopped')
+
+    async def test_estops_close_together_dump_once(self):
+        self.lift.press('call_top')
+        self.inputs['estop1'].on()
+        self.inputs['estop1'].off()
+        self.inputs['estop2'].on()
+        await self.recorder.writing
+        self.assertEqual(len(os.listdir(self.directory.name)), 1)
+
+    def test_not_a_recording(self):
+        with self.assertRaises(ValueError):
+            decode(b'hello')
+        with self.assertRaises(ValueError):
+            decode(self.recorder.encode('test') + b'\0')
+        self.assertTrue(self.recorder.encode('test').startswith(MAGIC))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import asyncio
+import unittest
+
+from dumb_waiter.scheduler import LiftScheduler
+
+from .harness import LiftTestCase, VirtualTimeTestCase
+
+
+class TestLiftScheduler(VirtualTimeTestCase):
+
+    def setUp(self):
+        self.scheduler = LiftScheduler()
+        self.fired = []
+
+    async def test_fires_at_its_time(self):
+        start = self.loop.time()
+        self.scheduler.schedule('a', 2, lambda: self.fired.append(self.loop.time() - start))
+        await asyncio.sleep(3)
+        self.assertEqual(self.fired, [2])
+        self.assertEqual(len(self.scheduler), 0)
+
+    async def test_cancelled_never_fires(self):
+        self.scheduler.schedule('a', 1, lambda: self.fired.append('a'))
+        self.assertTrue(self.scheduler.cancel('a'))
+        self.assertFalse(self.scheduler.cancel('a'))
+        await asyncio.sleep(2)
+        self.assertEqual(self.fired, [])
+
+    async def test_cancelled_after_its_handle_is_due(self):
+        # Both handles are due in the same pass of the loop, the first cancels the second.
+        self.scheduler.schedule('stop', 1, lambda: self.scheduler.cancel('timeout'))
+        self.scheduler.schedule('timeout', 1, lambda: self.fired.append('timeout'))
+        await asyncio.sleep(2)
+        self.assertEqual(self.fired, [])
+
+    async def test_reschedule_replaces(self):
+        self.scheduler.schedule('a', 1, lambda: self.fired.append('first'))
+        self.scheduler.schedule('a', 2, lambda: self.fired.append('second'))
+        await asyncio.sleep(3)
+        self.assertEqual(self.fired, ['second'])
+
+    async def test_pending_soonest_first(self):
+        self.scheduler.schedule(('lift', 'idle'), 60, lambda: None)
+        self.scheduler.schedule(('lift', 'safety_timeout'), 23, lambda: None)
+        self.assertEqual(self.scheduler.pending(), {('lift', 'safety_timeout'): 23, ('lift', 'idle'): 60})
+        self.scheduler.cancel_all()
+        self.assertEqual(self.scheduler.pending(), {})
+
+
+class TestSafetyTimeout(LiftTestCase):
+
+    async def test_moving_schedules_the_safety_timeout(self):
+        self.lift.press('call_top')
+        self.assertEqual(self.lift.model.scheduler.pending(), {('lift', 'safety_timeout'): 23})
+        self.inputs['lower_limit'].on()
+        self.assertEqual(self.lift.model.scheduler.pending(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+
+from dumb_waiter.simulator import LiftPhysics, LiftSimulator
+
+from .harness import LiftTestCase
+
+
+class TestSimulatedTrips(LiftTestCase):
+
+    async def test_round_trips(self):
+        sim = LiftSimulator(self.lift)
+        report = await sim.run(trips=200, timeout=24 * 3600)
+        self.assertEqual(report.trips, 200)
+        self.assertEqual(report.safety_timeouts, 0)
+        self.assertEqual(report.faults, [])
+        # 10 s of travel, plus 8 s to open the door, load and call.
+        self.assertAlmostEqual(report.trips_per_hour, 3600 / 18, delta=5)
+        self.assertMotorStopped()
+
+    async def test_limit_switches_follow_the_car(self):
+        sim = LiftSimulator(self.lift)
+        await sim.run(trips=1)
+        self.assertEqual(self.lift.state, 'stopped_at_bottom')
+        self.assertTrue(self.inputs['lower_limit']())
+        self.assertFalse(self.inputs['upper_limit']())
+        self.assertAlmostEqual(sim.position, 0, places=3)
+
+        await sim.run(trips=1)
+        self.assertEqual(self.lift.state, 'stopped_at_top')
+        self.assertFalse(self.inputs['lower_limit']())
+        self.assertTrue(self.inputs['upper_limit']())
+        self.assertAlmostEqual(sim.position, sim.physics.travel, places=3)
+
+
+class TestSimulatedSafetyTimeout(LiftTestCase):
+    # Shorter than the 10 s it takes to go from bottom to top.
+    safety_time = 7
+
+    async def test_slow_lift_times_out(self):
+        sim = LiftSimulator(self.lift)
+        report = await sim.run(trips=3, timeout=3600)
+        self.assertGreater(report.safety_timeouts, 0)
+        self.assertMotorStopped()
+
+
+class TestSimulatedEstop(LiftTestCase):
+
+    async def test_estop_stops_car_between_floors(self):
+        sim = LiftSimulator(self.lift, LiftPhysics(start_position=2.0))
+        sim.start()
+        self.lift.press('call_bottom')
+        await self.settle(2)
+        self.inputs['estop1'].on()
+        await self.settle(10)
+        self.assertEqual(self.lift.state, 'stopped')
+        self.assertAlmostEqual(sim.position, 2.0 - 2 * sim.physics.speed, places=3)
+        self.assertFalse(self.inputs['lower_limit']())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import asyncio
+import os
+import unittest
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+from gpiozero import Device
+from gpiozero.pins.mock import MockFactory
+
+from dumb_waiter.dispatcher import EdgeDispatcher
+from dumb_waiter.site import Site, load_config, parse_config
+
+EXAMPLE = os.path.join(os.path.dirname(__file__), '..', '..', 'lifts.example.toml')
+
+
+class TestConfig(TestCase):
+
+    def test_example(self):
+        lifts = load_config(EXAMPLE)
+        self.assertEqual([lift.name for lift in lifts], ['kitchen', 'cellar'])
+        self.assertEqual([lift.safety_time for lift in lifts], [23, 15])
+        self.assertEqual(lifts[1].input_pins['estop_top'], 'BOARD21')
+
+    def test_one_lift_on_the_default_pins(self):
+        lifts = parse_config({'lift': [{'name': 'only'}]})
+        self.assertEqual(lifts[0].output_pins['drive_lift_up'], 'BOARD7')
+
+    def test_shared_pins_refused(self):
+        with self.assertRaisesRegex(ValueError, 'used by both a and b'):
+            parse_config({'lift': [{'name': 'a'}, {'name': 'b'}]})
+
+    def test_missing_pins_refused(self):
+        with self.assertRaisesRegex(ValueError, 'estop_bottom'):
+            parse_config({'lift': [{'name': 'a', 'input_pins': {'estop_top': 'BOARD3'}}]})
+
+    def test_same_names_refused(self):
+        lifts = load_config(EXAMPLE)
+        config = {'lift': [
+            {'name': 'a', 'input_pins': lifts[0].input_pins, 'output_pins': lifts[0].output_pins},
+            {'name': 'a', 'input_pins': lifts[1].input_pins, 'output_pins': lifts[1].output_pins},
+        ]}
+        with self.assertRaisesRegex(ValueError, 'different'):
+            parse_config(config)
+
+
+class TestEdgeDispatcher(IsolatedAsyncioTestCase):
+
+    async def test_in_order_with_one_wakeup(self):
+        dispatcher = EdgeDispatcher(asyncio.get_running_loop())
+        ran = []
+        def post_from_thread():
+            for n in range(100):
+                dispatcher.post(ran.append, n)
+        await asyncio.to_thread(post_from_thread)
+        await asyncio.sleep(0.01)
+        self.assertEqual(ran, list(range(100)))
+        self.assertLess(dispatcher.wakeups, 100)
+
+    async def test_exceptions_do_not_stop_the_rest(self):
+        loop = asyncio.get_running_loop()
+        errors = []
+        loop.set_exception_handler(lambda loop, context: errors.append(context['exception']))
+        dispatcher = EdgeDispatcher(loop)
+        ran = []
+        def fail():
+            raise RuntimeError()
+        dispatcher.post(fail)
+        dispatcher.post(ran.append, 1)
+        await asyncio.sleep(0.01)
+        self.assertEqual(ran, [1])
+        self.assertEqual(len(errors), 1)
+
+
+class TestSite(IsolatedAsyncioTestCase):
+    hold_time = None
+
+    async def asyncSetUp(self):
+        Device.pin_factory = MockFactory()
+        self.site = Site(load_config(EXAMPLE), hold_time=self.hold_time)
+        for lift in self.site.lifts.values():
+            lift.pins.door_closed_level1.dev.pin.drive_low()
+            lift.pins.door_closed_ground.dev.pin.drive_low()
+        await asyncio.sleep(0.01)
+        self.site.start()
+
+    async def asyncTearDown(self):
+        self.site.scheduler.cancel_all()
+        Device.pin_factory.close()
+        Device.pin_factory = None
+
+    async def test_lifts_are_independent(self):
+        kitchen = self.site.lifts['kitchen']
+        cellar = self.site.lifts['cellar']
+        call = kitchen.pins.call_pb_top.dev.pin
+        call.drive_low()
+        call.drive_high()
+        await asyncio.sleep(0.01)
+        self.assertEqual(kitchen.state, 'lowering')
+        self.assertEqual(cellar.state, 'stopped')
+        self.assertTrue(kitchen.pins.drive_lift_down.value)
+        self.assertFalse(cellar.pins.drive_lift_down.value)
+        self.assertEqual(list(self.site.scheduler.pending()), [('kitchen', 'safety_timeout')])
+
+        kitchen.pins.lower_limit.dev.pin.drive_low()
+        await asyncio.sleep(0.01)
+        self.assertEqual(kitchen.state, 'stopped_at_bottom')
+        self.assertTrue(cellar.pins.lock_door_top.value)
+        self.assertGreater(self.site.dispatcher.dispatched, 0)
+
+    async def test_reconcile_goes_on_to_the_other_lifts(self):
+        first, second = self.site.lifts.values()
+        def fail():
+            raise RuntimeError('broken')
+        first.input_state.reconcile = fail
+        # As if the second lift had missed its lower door closing.
+        door = second.model.lower_door_closed.bit
+        second.input_state.mask &= ~door
+        errors = []
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+        task = asyncio.create_task(self.site.reconcile_forever(0.01))
+        with self.assertLogs('dumb_waiter.input_state', 'WARNING'):
+            await asyncio.sleep(0.035)
+        self.assertFalse(task.done())
+        task.cancel()
+        self.assertGreaterEqual(len(errors), 2)
+        self.assertIn(first.name, errors[0]['message'])
+        self.assertTrue(second.input_state.mask & door)
+
+
+class TestSiteRegisteredCalls(TestSite):
+    hold_time = 0.05
+
+    async def test_call_while_moving_is_registered(self):
+        kitchen = self.site.lifts['kitchen']
+        call = kitchen.pins.call_pb_top.dev.pin
+        call.drive_low()
+        call.drive_high()
+        await asyncio.sleep(0.02)
+        self.assertEqual(kitchen.state, 'lowering')
+        call.drive_low()
+        call.drive_high()
+        await asyncio.sleep(0.02)
+        self.assertEqual(kitchen.state, 'lowering')
+        self.assertEqual(kitchen.calls.registered, {'top'})
+
+        kitchen.pins.lower_limit.dev.pin.drive_low()
+        await asyncio.sleep(0.02)
+        self.assertEqual(kitchen.state, 'stopped_at_bottom')
+        await asyncio.sleep(0.1)
+        self.assertEqual(kitchen.state, 'rising')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,250 @@
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+from dumb_waiter.comms import Comms
+from dumb_waiter.spool import Spool
+
+from .harness import VirtualTimeTestCase
+
+
+class TestSpool(TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+
+    def open(self, **kwargs) -> Spool:
+        spool = Spool(self.dir, **kwargs)
+        self.addCleanup(spool.close)
+        return spool
+
+    def drain(self, spool):
+        sent = []
+        async def send(topic, payload):
+            sent.append((topic, payload))
+        asyncio.run(spool.drain(send))
+        return sent
+
+    def test_survives_restart(self):
+        spool = self.open()
+        spool.append('lift/state', 'lowering')
+        spool.append('lift/raw', b'\x00\x01')
+        spool.close()
+
+        spool = self.open()
+        self.assertEqual(len(spool), 2)
+        self.assertEqual(self.drain(spool), [('lift/state', 'lowering'), ('lift/raw', b'\x00\x01')])
+        self.assertEqual(len(spool), 0)
+        spool.close()
+        self.assertEqual(len(self.open()), 0)
+
+    def test_torn_record_is_dropped(self):
+        spool = self.open()
+        spool.append('a', '1')
+        spool.append('b', '2')
+        spool.close()
+        path = os.path.join(self.dir, os.listdir(self.dir)[0])
+        with open(path, 'r+b') as f:
+            f.truncate(os.path.getsize(path) - 1)
+
+        spool = self.open()
+        self.assertEqual(len(spool), 1)
+        spool.append('c', '3')
+        self.assertEqual(self.drain(spool), [('a', '1'), ('c', '3')])
+
+    def test_bounded(self):
+        spool = self.open(max_bytes=2000)
+        for n in range(200):
+            spool.append('lift/state', f'{n:05d}')
+        spool.sync()
+        size = sum(os.path.getsize(os.path.join(self.dir, name)) for name in os.listdir(self.dir))
+        self.assertLessEqual(size, 2000)
+        self.assertGreater(spool.dropped, 0)
+        sent = self.drain(spool)
+        self.assertEqual(len(sent), 200 - spool.dropped)
+        # The newest are kept
+        self.assertEqual(sent[-1], ('lift/state', '00199'))
+
+    def test_failed_drain_carries_on_later(self):
+        spool = self.open()
+        for n in range(10):
+            spool.append('t', str(n))
+        sent = []
+        async def flaky(topic, payload):
+            if len(sent) == 5:
+                raise ConnectionError()
+            sent.append(payload)
+        with self.assertRaises(ConnectionError):
+            asyncio.run(spool.drain(flaky, batch=5))
+        self.assertEqual(len(spool), 5)
+        self.assertEqual([p for _, p in self.drain(spool)], [str(n) for n in range(5, 10)])
+
+    def test_restart_carries_on_from_a_partial_drain(self):
+        spool = self.open()
+        for n in range(10):
+            spool.append('t', str(n))
+        sent = []
+        async def flaky(topic, payload):
+            if len(sent) == 5:
+                raise ConnectionError()
+            sent.append(payload)
+        with self.assertRaises(ConnectionError):
+            asyncio.run(spool.drain(flaky, batch=5))
+        spool.close()
+
+        spool = self.open()
+        self.assertEqual(len(spool), 5)
+        self.assertEqual([p for _, p in self.drain(spool)], [str(n) for n in range(5, 10)])
+        spool.close()
+        self.assertEqual(len(self.open()), 0)
+        self.assertFalse([name for name in os.listdir(self.dir) if name.endswith('.drained')])
+
+    def test_fsync_is_batched(self):
+        spool = self.open(sync_every=50)
+        syncs = 0
+        real_fsync = os.fsync
+        def counting_fsync(fd):
+            nonlocal syncs
+            syncs += 1
+            real_fsync(fd)
+        os.fsync = counting_fsync
+        try:
+            for n in range(100):
+                spool.append('t', str(n))
+        finally:
+            os.fsync = real_fsync
+        self.assertEqual(syncs, 2)
+
+
+class TestSpoolOnTheLoop(IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+
+    def open(self, **kwargs) -> Spool:
+        spool = Spool(self.dir, **kwargs)
+        self.addCleanup(spool.close)
+        return spool
+
+    async def test_disk_is_only_touched_by_the_spools_thread(self):
+        spool = self.open(sync_every=10)
+        threads = set()
+        real_fsync = os.fsync
+        def fsync(fd):
+            threads.add(threading.get_ident())
+            real_fsync(fd)
+        os.fsync = fsync
+        try:
+            for n in range(20):
+                spool.append('t', str(n))
+            self.assertEqual(len(spool), 20)
+            sent = []
+            async def send(topic, payload):
+                sent.append(payload)
+            await spool.drain(send)
+        finally:
+            os.fsync = real_fsync
+        self.assertEqual(sent, [str(n) for n in range(20)])
+        self.assertTrue(threads)
+        self.assertNotIn(threading.get_ident(), threads)
+
+    async def test_bounded_while_draining(self):
+        spool = self.open(max_bytes=2000)
+        for n in range(10):
+            spool.append('lift/state', f'{n:05d}')
+        more = True
+        async def slow(topic, payload):
+            # Lots more is spooled while the first batch is on its way.
+            nonlocal more
+            if more:
+                more = False
+                for n in range(200):
+                    spool.append('lift/state', f'{n:05d}')
+            await asyncio.sleep(0)
+        spool.sync()
+        await spool.drain(slow, batch=1000)
+        spool.close()
+        size = sum(os.path.getsize(os.path.join(self.dir, name)) for name in os.listdir(self.dir))
+        self.assertLessEqual(size, 2000)
+        self.assertGreater(spool.dropped, 0)
+
+
+class FakeClient:
+    def __init__(self):
+        self.connected = False
+        self.published = []
+        self.on_connect = []
+
+    async def publish(self, topic, payload):
+        self.published.append((topic, payload))
+
+
+class TestCommsSpool(IsolatedAsyncioTestCase):
+
+    async def test_outage_is_spooled_and_drained_in_order(self):
+        with tempfile.TemporaryDirectory() as directory:
+            comms = Comms('localhost', spool=Spool(directory))
+            self.addCleanup(comms.spool.close)
+            client = comms.client = FakeClient()
+            await comms.send('a', '1')
+            await comms.send('b', '2')
+            self.assertEqual(client.published, [])
+
+            client.connected = True
+            await comms.send('c', '3')
+            self.assertEqual(client.published, [])
+            await comms.drain_spool()
+            await comms.send('d', '4')
+            self.assertEqual([t for t, _ in client.published], ['a', 'b', 'c', 'd'])
+            comms.spool.close()
+
+
+class FlakyClient(FakeClient):
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    async def publish(self, topic, payload):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('publish failed')
+        await super().publish(topic, payload)
+
+
+class TestCommsDrainRetry(VirtualTimeTestCase):
+
+    async def test_failed_drain_is_retried_while_connected(self):
+        with tempfile.TemporaryDirectory() as directory:
+            comms = Comms('localhost', spool=Spool(directory))
+            self.addCleanup(comms.spool.close)
+            client = comms.client = FlakyClient(failures=3)
+            await comms.send('a', '1')
+            client.connected = True
+            with self.assertLogs('dumb_waiter.comms', 'WARNING') as logs:
+                await comms.drain_spool()
+            self.assertEqual(len(logs.output), 3)
+            self.assertEqual(len(comms.spool), 0)
+            await comms.send('b', '2')
+            self.assertEqual(client.published, [('a', '1'), ('b', '2')])
+            comms.spool.close()
+
+    async def test_drain_stops_when_disconnected(self):
+        with tempfile.TemporaryDirectory() as directory:
+            comms = Comms('localhost', spool=Spool(directory))
+            self.addCleanup(comms.spool.close)
+            client = comms.client = FakeClient()
+            await comms.send('a', '1')
+            await comms.drain_spool()
+            self.assertEqual(len(comms.spool), 1)
+            comms.spool.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
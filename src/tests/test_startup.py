@@ -0,0 +1,65 @@
+import os
+import socket
+import tempfile
+import unittest
+from unittest import mock
+
+from dumb_waiter.notify import sd_notify
+from dumb_waiter.startup import StartupTimer, process_age
+
+
+class TestSdNotify(unittest.TestCase):
+
+    def test_sent_to_the_socket(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'notify')
+            with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as systemd:
+                systemd.bind(path)
+                with mock.patch.dict(os.environ, {'NOTIFY_SOCKET': path}):
+                    self.assertTrue(sd_notify('READY=1', 'STATUS=Doors locked'))
+                self.assertEqual(systemd.recv(100), b'READY=1\nSTATUS=Doors locked')
+
+    def test_abstract_socket(self):
+        name = f'dumb_waiter_test_{os.getpid()}'
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as systemd:
+            systemd.bind('\0' + name)
+            with mock.patch.dict(os.environ, {'NOTIFY_SOCKET': '@' + name}):
+                self.assertTrue(sd_notify('READY=1'))
+            self.assertEqual(systemd.recv(100), b'READY=1')
+
+    def test_not_run_by_systemd(self):
+        with mock.patch.dict(os.environ):
+            os.environ.pop('NOTIFY_SOCKET', None)
+            self.assertFalse(sd_notify('READY=1'))
+
+    def test_nobody_listening(self):
+        with mock.patch.dict(os.environ, {'NOTIFY_SOCKET': '/nonexistent/notify'}):
+            with self.assertLogs('dumb_waiter.notify', 'WARNING'):
+                self.assertFalse(sd_notify('READY=1'))
+
+
+class TestStartupTimer(unittest.TestCase):
+
+    def test_phases(self):
+        with mock.patch('dumb_waiter.startup.time.monotonic', side_effect=[10.0, 10.5, 10.75]), \
+                mock.patch('dumb_waiter.startup.process_age', return_value=0.25):
+            timer = StartupTimer()
+            timer.mark('imports')
+            timer.mark('doors locked')
+        self.assertEqual(timer.since_start('doors locked'), 1.0)
+        report = timer.report()
+        self.assertEqual([line.split() for line in report], [
+            ['python', 'started', '250.0', 'ms', '250.0', 'ms'],
+            ['imports', '500.0', 'ms', '750.0', 'ms'],
+            ['doors', 'locked', '250.0', 'ms', '1000.0', 'ms'],
+        ])
+
+    @unittest.skipUnless(os.path.exists('/proc/self/stat'), 'Needs /proc')
+    def test_process_age(self):
+        age = process_age()
+        self.assertIsNotNone(age)
+        self.assertGreaterEqual(age, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
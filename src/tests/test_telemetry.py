@@ -0,0 +1,136 @@
+import asyncio
+import unittest
+from unittest import TestCase
+
+from dumb_waiter.fake import FakeLift
+from dumb_waiter.telemetry import LatestValueQueue, LiftTelemetry, TelemetryPublisher, start_telemetry
+
+from .harness import VirtualTimeTestCase
+
+
+class FakeComms:
+    '''Comms talking to a broker that takes delay seconds to take each message'''
+
+    def __init__(self, delay=0.0, connected=True):
+        self.delay = delay
+        self.connected = connected
+        self.sent = []
+
+    @property
+    def accepting(self):
+        return self.connected
+
+    async def send(self, topic, payload):
+        await asyncio.sleep(self.delay)
+        self.sent.append((topic, payload))
+
+
+class TestLatestValueQueue(TestCase):
+
+    def test_keeps_only_the_latest(self):
+        queue = LatestValueQueue()
+        queue.put('a', '1')
+        queue.put('b', '1')
+        queue.put('a', '2')
+        self.assertEqual(queue.take(10), [('a', '2'), ('b', '1')])
+        self.assertEqual(queue.dropped, 1)
+
+    def test_bounded(self):
+        queue = LatestValueQueue(max_topics=2)
+        for topic in 'abc':
+            queue.put(topic, topic)
+        self.assertEqual(queue.take(10), [('b', 'b'), ('c', 'c')])
+        self.assertEqual(queue.dropped, 1)
+
+    def test_take_in_batches(self):
+        queue = LatestValueQueue()
+        for topic in 'abc':
+            queue.put(topic, topic)
+        self.assertEqual(len(queue.take(2)), 2)
+        self.assertEqual(len(queue), 1)
+
+
+class TestTelemetry(VirtualTimeTestCase):
+
+    def setUp(self):
+        self.lift = FakeLift()
+        self.lift.close_doors()
+
+    def tearDown(self):
+        self.lift.model.scheduler.cancel_all()
+
+    async def test_transitions_are_published(self):
+        comms = FakeComms()
+        start_telemetry(self.lift.machine, comms)
+        self.lift.machine.initialise()
+        self.lift.press('call_top')
+        await asyncio.sleep(5)
+        sent = dict(comms.sent)
+        self.assertEqual(sent['dumbwaiter/lift/state'], 'lowering')
+        self.assertEqual(sent['dumbwaiter/lift/output/lower_lift'], 'true')
+        self.assertEqual(sent['dumbwaiter/lift/input/upper_door_closed'], 'true')
+
+    async def test_input_edges_are_published(self):
+        comms = FakeComms()
+        start_telemetry(self.lift.machine, comms)
+        self.lift.machine.initialise()
+        await asyncio.sleep(5)
+        self.lift.inputs['lower_door_closed'].off()
+        await asyncio.sleep(5)
+        self.assertEqual(comms.sent[-1], ('dumbwaiter/lift/input/lower_door_closed', 'false'))
+
+    async def test_slow_broker_gets_latest_values(self):
+        queue = LatestValueQueue()
+        comms = FakeComms(delay=1)
+        publisher = TelemetryPublisher(comms, queue, rate=10, batch_size=10)
+        self.lift.machine.add_listener(LiftTelemetry(self.lift.model, queue))
+        task = asyncio.create_task(publisher.run())
+        self.lift.machine.initialise()
+        for _ in range(50):
+            self.lift.press('call_top')
+        # Nothing waits for the broker
+        self.assertEqual(comms.sent, [])
+        self.assertLessEqual(len(queue), 11)
+        await asyncio.sleep(30)
+        task.cancel()
+        states = [payload for topic, payload in comms.sent if topic == 'dumbwaiter/lift/state']
+        self.assertEqual(states[-1], self.lift.state)
+        self.assertLess(len(comms.sent), 50)
+
+    async def test_rate_limit(self):
+        queue = LatestValueQueue()
+        comms = FakeComms()
+        publisher = TelemetryPublisher(comms, queue, rate=10, batch_size=5)
+        for n in range(40):
+            queue.put(f'topic{n}', 'x')
+        task = asyncio.create_task(publisher.run())
+        await asyncio.sleep(2.01)
+        task.cancel()
+        self.assertLessEqual(len(comms.sent), 25)
+
+    async def test_nothing_taken_while_disconnected(self):
+        queue = LatestValueQueue()
+        comms = FakeComms(connected=False)
+        task = asyncio.create_task(TelemetryPublisher(comms, queue).run())
+        queue.put('a', '1')
+        await asyncio.sleep(5)
+        self.assertEqual(len(queue), 1)
+        comms.connected = True
+        await asyncio.sleep(5)
+        task.cancel()
+        self.assertEqual(comms.sent, [('dumbwaiter/a', '1')])
+
+    async def test_compiled_lift_logic(self):
+        lift = FakeLift(compiled=True)
+        lift.close_doors()
+        comms = FakeComms()
+        start_telemetry(lift.machine, comms)
+        lift.machine.initialise()
+        lift.press('call_bottom')
+        await asyncio.sleep(5)
+        lift.model.scheduler.cancel_all()
+        self.assertEqual(dict(comms.sent)['dumbwaiter/lift/state'], 'lowering')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,181 @@
+import json
+import os
+import random
+import tempfile
+import unittest
+
+from dumb_waiter.simulator import LiftSimulator
+from dumb_waiter.trip_times import P2Quantile, TripTimes
+
+from .harness import LiftTestCase
+
+
+class TestP2Quantile(unittest.TestCase):
+
+    def test_estimates_quantiles(self):
+        rng = random.Random(1)
+        values = [rng.gauss(10, 1) for _ in range(20000)]
+        for p in (0.5, 0.9, 0.99):
+            with self.subTest(p=p):
+                estimate = P2Quantile(p)
+                for value in values:
+                    estimate.add(value)
+                exact = sorted(values)[int(p * len(values))]
+                self.assertAlmostEqual(estimate.value, exact, delta=0.05)
+
+    def test_few_values(self):
+        estimate = P2Quantile(0.99)
+        self.assertIsNone(estimate.value)
+        for value in (3, 1, 2):
+            estimate.add(value)
+        self.assertEqual(estimate.value, 3)
+
+    def test_carries_on_after_a_round_trip(self):
+        rng = random.Random(2)
+        a = P2Quantile(0.9)
+        for _ in range(100):
+            a.add(rng.random())
+        b = P2Quantile.from_dict(json.loads(json.dumps(a.to_dict())))
+        for _ in range(100):
+            value = rng.random()
+            a.add(value)
+            b.add(value)
+        self.assertEqual(a.value, b.value)
+        self.assertEqual(b.count, 200)
+
+
+class TestTripTimes(LiftTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'lift.json')
+
+    def tearDown(self):
+        self.lift.model.scheduler.cancel_all()
+        self.directory.cleanup()
+        super().tearDown()
+
+    async def test_learns_each_direction(self):
+        trip_times = TripTimes(self.lift.model, self.path, min_trips=10)
+        self.llm.add_listener(trip_times)
+        sim = LiftSimulator(self.lift)
+        # Only the first trip, from part way down, is not a whole trip.
+        await sim.run(trips=19, timeout=24 * 3600)
+        self.assertIsNone(self.lift.model.safety_time_up)
+        await sim.run(trips=2, timeout=3600)
+
+        # 10 s each way, with a margin of 1.5
+        self.assertAlmostEqual(self.lift.model.safety_time_up, 15, places=2)
+        self.assertAlmostEqual(self.lift.model.safety_time_down, 15, places=2)
+        self.assertEqual(trip_times.estimates['up'].count, 10)
+        self.assertEqual(trip_times.estimates['down'].count, 10)
+
+    async def test_jam_is_noticed_sooner(self):
+        self.llm.add_listener(TripTimes(self.lift.model, min_trips=10))
+        sim = LiftSimulator(self.lift)
+        await sim.run(trips=21, timeout=24 * 3600)
+        self.assertEqual(self.lift.state, 'stopped_at_bottom')
+
+        # The car jams, and doesn't get to the top.
+        sim.physics.speed = 0.01
+        started = self.loop.time()
+        self.lift.press('call_bottom')
+        self.assertEqual(self.lift.state, 'rising')
+        await self.settle(16)
+        self.assertEqual(self.lift.state, 'stopped')
+        self.assertAlmostEqual(self.loop.time() - started, 15 + 0.1, delta=1.1)
+
+    async def test_forgets_after_timing_out_in_a_row(self):
+        trip_times = TripTimes(self.lift.model, self.path, min_trips=10)
+        self.llm.add_listener(trip_times)
+        sim = LiftSimulator(self.lift)
+        await sim.run(trips=21, timeout=24 * 3600)
+        self.assertEqual(self.lift.state, 'stopped_at_bottom')
+
+        # The car has got slower going up, and no longer makes it in the learnt time.
+        speed = sim.physics.speed
+        sim.physics.speed = speed / 2
+        self.lift.press('call_bottom')
+        with self.assertLogs('dumb_waiter.trip_times', 'WARNING') as logs:
+            await self.settle(16)
+        self.assertEqual(self.lift.state, 'stopped')
+        self.assertEqual(len(logs.output), 1)
+        self.assertAlmostEqual(self.lift.model.safety_time_up, 15, places=2)
+
+        # Back down, and up again.
+        sim.physics.speed = speed
+        self.lift.press('call_bottom')
+        await self.settle(16)
+        self.assertEqual(self.lift.state, 'stopped_at_bottom')
+        sim.physics.speed = speed / 2
+        self.lift.press('call_bottom')
+        with self.assertLogs('dumb_waiter.trip_times', 'WARNING') as logs:
+            await self.settle(16)
+        self.assertEqual(self.lift.state, 'stopped')
+        self.assertIn('Forgetting', logs.output[-1])
+        self.assertIsNone(self.lift.model.safety_time_up)
+        self.assertEqual(trip_times.estimates['up'].count, 0)
+        await trip_times.writing
+        self.assertEqual(TripTimes(self.lift.model, self.path, min_trips=10).estimates['up'].count, 0)
+        self.assertAlmostEqual(self.lift.model.safety_time_down, 15, places=2)
+
+    async def test_bounded_by_safety_time(self):
+        trip_times = TripTimes(self.lift.model, min_trips=10, margin=3)
+        self.llm.add_listener(trip_times)
+        await LiftSimulator(self.lift).run(trips=21, timeout=24 * 3600)
+        self.assertEqual(self.lift.model.safety_time_up, self.lift.model.safety_time)
+        self.assertEqual(trip_times.safety_time('down'), self.lift.model.safety_time)
+
+    async def test_stopped_trips_are_not_timed(self):
+        trip_times = TripTimes(self.lift.model)
+        self.llm.add_listener(trip_times)
+        sim = LiftSimulator(self.lift)
+        await sim.run(trips=1)
+        self.assertEqual(self.lift.state, 'stopped_at_bottom')
+        self.lift.press('call_bottom')
+        await self.settle(5)
+        self.lift.press('call_bottom')
+        self.assertEqual(self.lift.state, 'stopped')
+        self.lift.press('call_bottom')
+        await self.settle(60)
+        self.assertEqual(self.lift.state, 'stopped_at_bottom')
+        self.assertEqual(trip_times.estimates['up'].count, 0)
+        self.assertEqual(trip_times.estimates['down'].count, 0)
+
+    async def test_survives_a_restart(self):
+        trip_times = TripTimes(self.lift.model, self.path, min_trips=10)
+        self.llm.add_listener(trip_times)
+        await LiftSimulator(self.lift).run(trips=21, timeout=24 * 3600)
+        await trip_times.writing
+
+        self.lift.model.safety_time_up = None
+        restarted = TripTimes(self.lift.model, self.path, min_trips=10)
+        self.assertEqual(restarted.estimates['up'].count, 10)
+        self.assertAlmostEqual(self.lift.model.safety_time_up, 15, places=2)
+
+    async def test_saved_off_the_event_loop(self):
+        trip_times = TripTimes(self.lift.model, self.path)
+        trip_times.save_soon()
+        trip_times.save_soon()
+        self.assertFalse(os.path.exists(self.path))
+        first = trip_times.writing
+        await first
+        self.assertTrue(os.path.exists(self.path))
+        trip_times.estimates['up'].add(10)
+        trip_times.save_soon()
+        self.assertIsNot(trip_times.writing, first)
+        await trip_times.writing
+        self.assertEqual(TripTimes(self.lift.model, self.path).estimates['up'].count, 1)
+
+    async def test_unreadable_file_is_ignored(self):
+        with open(self.path, 'w') as f:
+            f.write('{"up": ')
+        with self.assertLogs('dumb_waiter.trip_times', 'WARNING'):
+            trip_times = TripTimes(self.lift.model, self.path)
+        self.assertEqual(trip_times.estimates['up'].count, 0)
+        self.assertIsNone(self.lift.model.safety_time_up)
+
+
+if __name__ == '__main__':
+    unittest.main()
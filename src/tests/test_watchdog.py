@@ -0,0 +1,95 @@
+import asyncio
+import os
+import socket
+import tempfile
+import time
+import unittest
+from unittest import IsolatedAsyncioTestCase, mock
+
+from dumb_waiter.fake import FakeDigitalOutput
+from dumb_waiter.watchdog import LoopLagMonitor, systemd_watchdog_interval
+
+
+def block(seconds):
+    time.sleep(seconds)
+
+
+class TestLoopLagMonitor(IsolatedAsyncioTestCase):
+    # These run on a real event loop, as they are about it being held up.
+
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(self.directory.name, 'notify')
+        self.systemd = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.systemd.bind(path)
+        self.systemd.setblocking(False)
+        environ = mock.patch.dict(os.environ, {'NOTIFY_SOCKET': path, 'WATCHDOG_USEC': '40000'})
+        environ.start()
+        self.addCleanup(environ.stop)
+        self.heartbeat = FakeDigitalOutput('heartbeat')
+        self.beats = 0
+        self.heartbeat.change_callback = self.beat
+        self.monitor = LoopLagMonitor(interval=0.005, stall=0.1, threshold=0.05,
+            heartbeat=self.heartbeat, pet_interval=0.02)
+        self.task = asyncio.create_task(self.monitor.run())
+
+    async def asyncTearDown(self):
+        self.task.cancel()
+        self.systemd.close()
+        self.directory.cleanup()
+
+    def beat(self):
+        self.beats += 1
+
+    def pets(self) -> int:
+        pets = 0
+        while True:
+            try:
+                self.assertEqual(self.systemd.recv(100), b'WATCHDOG=1')
+            except BlockingIOError:
+                return pets
+            pets += 1
+
+    async def test_pets_while_keeping_up(self):
+        self.assertEqual(self.monitor.systemd_interval, 0.02)
+        await asyncio.sleep(0.2)
+        self.assertGreater(self.pets(), 3)
+        self.assertGreater(self.beats, 3)
+        self.assertEqual(self.monitor.stalls, 0)
+        self.assertLess(self.monitor.lag.percentile(0.5), 50_000_000)
+
+    async def test_stall_is_logged_with_its_stack_and_not_petted(self):
+        await asyncio.sleep(0.05)
+        self.pets()
+        beats = self.beats
+        with self.assertLogs('dumb_waiter.watchdog', 'WARNING') as logs:
+            asyncio.get_running_loop().call_soon(block, 0.3)
+            await asyncio.sleep(0.01)
+        self.assertEqual(self.pets(), 0)
+        self.assertEqual(self.beats, beats)
+        self.assertEqual(self.monitor.stalls, 1)
+        self.assertGreaterEqual(self.monitor.lag.max, 250_000_000)
+        stuck, stalled = logs.output
+        self.assertIn('stuck', stuck)
+        self.assertIn('in block', stuck)
+        self.assertIn('stalled for', stalled)
+
+        await asyncio.sleep(0.1)
+        self.assertGreater(self.pets(), 0)
+
+
+class TestSystemdWatchdogInterval(unittest.TestCase):
+
+    def test_interval(self):
+        with mock.patch.dict(os.environ, {'WATCHDOG_USEC': '5000000'}):
+            os.environ.pop('WATCHDOG_PID', None)
+            self.assertEqual(systemd_watchdog_interval(), 5.0)
+        with mock.patch.dict(os.environ, {'WATCHDOG_USEC': '5000000', 'WATCHDOG_PID': str(os.getpid() + 1)}):
+            self.assertIsNone(systemd_watchdog_interval())
+        with mock.patch.dict(os.environ):
+            os.environ.pop('WATCHDOG_USEC', None)
+            self.assertIsNone(systemd_watchdog_interval())
+
+
+if __name__ == '__main__':
+    unittest.main()